@@ -1,6 +1,7 @@
 import functools
 import logging
 import sys
+from datetime import datetime
 from pathlib import Path
 from ssl import SSLError
 from typing import Any, Callable, Optional
@@ -19,6 +20,9 @@ from evernote_backup.cli_app_click_util import (
 )
 from evernote_backup.cli_app_util import ProgramTerminatedError
 from evernote_backup.log_util import get_time_txt, init_logging
+from evernote_backup.note_exporter import EXPORT_FORMATS
+from evernote_backup.note_exporter_archive import ARCHIVE_FORMATS
+from evernote_backup.note_storage import STORAGE_PROFILES
 from evernote_backup.version import __version__
 
 opt_user = click.option(
@@ -83,6 +87,16 @@ opt_database = click.option(
     help="Database file where notes are stored.",
 )
 
+opt_storage_profile = click.option(
+    "--storage-profile",
+    type=click.Choice(list(STORAGE_PROFILES)),
+    help=(
+        "Database performance profile, overrides the one saved in database."
+        " 'fast' enables WAL journal, only use it with local disks."
+        " 'network' is for databases on network shares. (Advanced option)"
+    ),
+)
+
 opt_backend = click.option(
     "--backend",
     default=config_defaults.BACKEND,
@@ -119,8 +133,13 @@ def handle_errors(f: Callable) -> Callable:
             )
         except EDAMSystemException as e:
             if e.errorCode == EDAMErrorCode.RATE_LIMIT_REACHED:
-                time_left = get_time_txt(e.rateLimitDuration)
-                logger.critical(f"Rate limit reached. Restart program in {time_left}.")
+                if e.rateLimitDuration is None:
+                    logger.critical("Rate limit reached. Restart program later.")
+                else:
+                    time_left = get_time_txt(e.rateLimitDuration)
+                    logger.critical(
+                        f"Rate limit reached. Restart program in {time_left}."
+                    )
             else:
                 logger.exception("Evernote server error")
         except TApplicationException as e:
@@ -188,6 +207,7 @@ def cli(quiet: bool, verbose: bool, log: Path) -> None:
 @opt_network_retry_count
 @opt_use_system_ssl_ca
 @opt_api_data
+@opt_storage_profile
 @handle_errors
 def init_db(
     database: Path,
@@ -201,6 +221,7 @@ def init_db(
     network_retry_count: int,
     use_system_ssl_ca: bool,
     api_data: Optional[str],
+    storage_profile: Optional[str],
 ) -> None:
     """Initialize storage & log in to Evernote."""
 
@@ -216,6 +237,7 @@ def init_db(
         network_retry_count=network_retry_count,
         use_system_ssl_ca=use_system_ssl_ca,
         custom_api_data=api_data,
+        storage_profile=storage_profile,
     )
 
 
@@ -228,6 +250,23 @@ def init_db(
     show_default=True,
     help="Max entries per sync chunk. (Advanced option)",
 )
+@click.option(
+    "--chunk-prefetch-depth",
+    default=config_defaults.SYNC_CHUNK_PREFETCH_DEPTH,
+    show_default=True,
+    type=click.IntRange(0, config_defaults.SYNC_CHUNK_PREFETCH_DEPTH_SANE_LIMIT),
+    help=(
+        "Number of sync chunks to fetch in background while processing"
+        " the current one, 0 to disable. (Advanced option)"
+    ),
+)
+@click.option(
+    "--chunk-prefetch-memory-limit",
+    default=config_defaults.SYNC_CHUNK_PREFETCH_MEMORY_LIMIT,
+    show_default=True,
+    type=click.IntRange(1),
+    help="Memory limit in MB for prefetched sync chunks. (Advanced option)",
+)
 @click.option(
     "--max-download-workers",
     default=config_defaults.SYNC_MAX_DOWNLOAD_WORKERS,
@@ -248,6 +287,24 @@ def init_db(
         " (Advanced option)"
     ),
 )
+@click.option(
+    "--engine",
+    default=config_defaults.SYNC_ENGINE,
+    show_default=True,
+    type=click.Choice(["threads", "asyncio"]),
+    help=(
+        "Download engine. 'asyncio' runs up to '--max-download-workers' downloads"
+        " concurrently without spawning a thread for each. (Advanced option)"
+    ),
+)
+@click.option(
+    "--pipelined",
+    is_flag=True,
+    help=(
+        "Start downloading notes while sync chunks are still being fetched."
+        " Only for 'threads' engine. (Advanced option)"
+    ),
+)
 @opt_network_retry_count
 @opt_use_system_ssl_ca
 @click.option(
@@ -256,28 +313,39 @@ def init_db(
     help="Download tasks and reminders on sync.",
 )
 @opt_token_one_off
+@opt_storage_profile
 @handle_errors
 def sync(
     database: Path,
     max_chunk_results: int,
+    chunk_prefetch_depth: int,
+    chunk_prefetch_memory_limit: int,
     max_download_workers: int,
     download_cache_memory_limit: int,
+    engine: str,
+    pipelined: bool,
     network_retry_count: int,
     use_system_ssl_ca: bool,
     include_tasks: bool,
     token: Optional[str],
+    storage_profile: Optional[str],
 ) -> None:
     """Sync local database with Evernote, downloading all notes."""
 
     cli_app.sync(
         database=database,
         max_chunk_results=max_chunk_results,
+        chunk_prefetch_depth=chunk_prefetch_depth,
+        chunk_prefetch_memory_limit=chunk_prefetch_memory_limit,
         max_download_workers=max_download_workers,
         download_cache_memory_limit=download_cache_memory_limit,
+        engine=engine,
+        pipelined=pipelined,
         network_retry_count=network_retry_count,
         use_system_ssl_ca=use_system_ssl_ca,
         include_tasks=include_tasks,
         token=token,
+        storage_profile=storage_profile,
     )
 
 
@@ -333,11 +401,104 @@ def sync(
     help="Export notes with specific tag(s). (Can be used multiple times)",
     multiple=True,
 )
+@click.option(
+    "--stack",
+    "stacks",
+    help=(
+        "Export notes from notebooks in specific stack(s). (Can be used multiple times)"
+    ),
+    multiple=True,
+)
+@click.option(
+    "--created-after",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    help="Export notes created on or after this date (UTC).",
+)
+@click.option(
+    "--created-before",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    help="Export notes created before this date (UTC).",
+)
+@click.option(
+    "--updated-after",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    help="Export notes updated on or after this date (UTC).",
+)
+@click.option(
+    "--updated-before",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    help="Export notes updated before this date (UTC).",
+)
+@click.option(
+    "--incremental",
+    is_flag=True,
+    help=(
+        "Only rewrite files whose notes changed since previous incremental export,"
+        " and delete files of notes that are gone."
+        " Files written are tracked in '.export-manifest.json' in output directory."
+    ),
+)
+@click.option(
+    "--workers",
+    default=config_defaults.EXPORT_WORKERS,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help=(
+        "Number of processes to export notes with."
+        " Values above 1 spread notebooks (or notes in '--single-notes' mode)"
+        " across CPU cores."
+    ),
+)
+@click.option(
+    "--format",
+    "export_format",
+    default=config_defaults.EXPORT_FORMAT,
+    show_default=True,
+    type=click.Choice(EXPORT_FORMATS),
+    help=(
+        "Export file format. 'markdown' and 'html' write one file per note,"
+        " with attachments saved as plain files into '_resources' directory."
+        " 'jsonl' writes one JSON record per note into 'notes.jsonl'."
+    ),
+)
+@click.option(
+    "--jsonl-resource-bodies",
+    is_flag=True,
+    help=(
+        "Include base64 encoded attachment bodies into 'jsonl' export,"
+        " otherwise attachments are referenced by hash only."
+    ),
+)
+@click.option(
+    "--jsonl-shard-size",
+    default=config_defaults.EXPORT_JSONL_SHARD_SIZE,
+    show_default=True,
+    type=click.IntRange(min=0),
+    help=(
+        "Start new 'jsonl' file once current one reaches this size, in MB."
+        " 0 to write all notes into one file."
+    ),
+)
+@click.option(
+    "--archive",
+    "archive_path",
+    help=(
+        "Write export into a single compressed archive instead of a directory."
+        " Format is picked by extension (.tar.gz, .tar.zst, .zip),"
+        " use '-' to stream archive to standard output."
+    ),
+)
+@click.option(
+    "--archive-format",
+    type=click.Choice(ARCHIVE_FORMATS),
+    help="Archive format, required when streaming archive to standard output.",
+)
 @click.argument(
     "output_path",
-    required=True,
+    required=False,
     type=DIR_ONLY,
 )
+@opt_storage_profile
 @handle_errors
 def export(
     database: Path,
@@ -349,7 +510,20 @@ def export(
     overwrite: bool,
     notebooks: tuple[str],
     tags: tuple[str],
-    output_path: Path,
+    stacks: tuple[str],
+    created_after: Optional[datetime],
+    created_before: Optional[datetime],
+    updated_after: Optional[datetime],
+    updated_before: Optional[datetime],
+    incremental: bool,
+    workers: int,
+    export_format: str,
+    jsonl_resource_bodies: bool,
+    jsonl_shard_size: int,
+    archive_path: Optional[str],
+    archive_format: Optional[str],
+    output_path: Optional[Path],
+    storage_profile: Optional[str],
 ) -> None:
     """Export all notes from local database into ENEX files."""
 
@@ -364,6 +538,19 @@ def export(
         notebooks=notebooks,
         tags=tags,
         output_path=output_path,
+        storage_profile=storage_profile,
+        workers=workers,
+        incremental=incremental,
+        archive_path=archive_path,
+        archive_format=archive_format,
+        export_format=export_format,
+        jsonl_resource_bodies=jsonl_resource_bodies,
+        jsonl_shard_size=jsonl_shard_size,
+        stacks=stacks,
+        created_after=created_after,
+        created_before=created_before,
+        updated_after=updated_after,
+        updated_before=updated_before,
     )
 
 
@@ -448,6 +635,56 @@ def manage_check(
     )
 
 
+@manage.command("recompress")
+@opt_database
+@click.option(
+    "--codec",
+    default=config_defaults.STORAGE_CODEC,
+    show_default=True,
+    type=click.Choice(["lzma", "zlib", "zstd"]),
+    help=(
+        "Storage codec to convert existing data to and use for new data."
+        " 'lzma' is the most compact, 'zlib' is much faster,"
+        " 'zstd' requires 'zstandard' package, see 'evernote-backup[zstd]' extra."
+    ),
+)
+@handle_errors
+def manage_recompress(
+    database: Path,
+    codec: str,
+) -> None:
+    """Convert stored notes to another compression format"""
+
+    cli_app.manage_recompress(
+        database=database,
+        codec=codec,
+    )
+
+
+@manage.command("tune")
+@opt_database
+@click.option(
+    "--profile",
+    "storage_profile",
+    type=click.Choice(list(STORAGE_PROFILES)),
+    help=(
+        "Save and apply database performance profile."
+        " Without this option, only current settings are reported."
+    ),
+)
+@handle_errors
+def manage_tune(
+    database: Path,
+    storage_profile: Optional[str],
+) -> None:
+    """Show or change database performance settings"""
+
+    cli_app.manage_tune(
+        database=database,
+        storage_profile=storage_profile,
+    )
+
+
 @manage.command("list")
 @opt_database
 @click.option(
@@ -476,5 +713,82 @@ def manage_list(
     )
 
 
+@manage.command("search")
+@opt_database
+@click.option(
+    "--notebook",
+    "-n",
+    "notebooks",
+    help="Search notes in specific notebook(s). (Can be used multiple times)",
+    multiple=True,
+)
+@click.option(
+    "--tag",
+    "-t",
+    "tags",
+    help="Search notes with specific tag(s). (Can be used multiple times)",
+    multiple=True,
+)
+@click.option(
+    "--date-from",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    help="Search notes updated on or after this date (UTC).",
+)
+@click.option(
+    "--date-to",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    help="Search notes updated on or before this date (UTC).",
+)
+@click.option(
+    "--include-trash",
+    is_flag=True,
+    help="Include notes from trash into search.",
+)
+@click.option(
+    "--limit",
+    default=config_defaults.SEARCH_RESULTS_LIMIT,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Maximum number of results to show.",
+)
+@click.argument("query", required=True)
+@handle_errors
+def manage_search(  # noqa: WPS211
+    database: Path,
+    notebooks: tuple[str, ...],
+    tags: tuple[str, ...],
+    date_from: Optional[datetime],
+    date_to: Optional[datetime],
+    include_trash: bool,
+    limit: int,
+    query: str,
+) -> None:
+    """Full-text search in note titles, text, tags and attachments
+
+    QUERY uses SQLite FTS5 syntax, e.g. 'invoice AND 2023', '"exact phrase"',
+    'title:receipt' or 'recip*'.
+    """
+
+    cli_app.manage_search(
+        database=database,
+        query=query,
+        notebooks=notebooks,
+        tags=tags,
+        date_from=date_from,
+        date_to=date_to,
+        include_trash=include_trash,
+        limit=limit,
+    )
+
+
+@manage.command("reindex")
+@opt_database
+@handle_errors
+def manage_reindex(database: Path) -> None:
+    """Rebuild full-text search index from stored notes"""
+
+    cli_app.manage_reindex(database=database)
+
+
 def main() -> None:
     cli()
@@ -1,8 +1,12 @@
 import logging
+from contextlib import ExitStack
+from datetime import datetime
 from pathlib import Path
 from ssl import SSLError
 from typing import Optional
 
+import click
+
 from evernote_backup.cli_app_auth import (
     get_auth_token,
     get_ping_client,
@@ -18,12 +22,27 @@ from evernote_backup.cli_app_util import (
     DatabaseCorruptError,
     DatabaseEmptyError,
     ProgramTerminatedError,
+    get_timestamp,
+    is_output_to_terminal,
 )
 from evernote_backup.config import CURRENT_DB_VERSION
 from evernote_backup.evernote_client_util_ssl import log_ssl_debug_info
 from evernote_backup.note_checker import NoteChecker
 from evernote_backup.note_exporter import NoteExporter
+from evernote_backup.note_exporter_archive import (
+    ArchiveFormatError,
+    ArchiveWriter,
+    get_archive_format,
+    open_archive,
+)
 from evernote_backup.note_lister import NoteLister
+from evernote_backup.note_searcher import NoteSearcher
+from evernote_backup.note_storage import (
+    CodecNotAvailableError,
+    NoteFilter,
+    SqliteStorage,
+    get_codec,
+)
 from evernote_backup.note_synchronizer import NoteSynchronizer, WrongAuthUserError
 
 logger = logging.getLogger(__name__)
@@ -41,6 +60,7 @@ def init_db(
     network_retry_count: int,
     use_system_ssl_ca: bool,
     custom_api_data: Optional[str],
+    storage_profile: Optional[str],
 ) -> None:
     if not force:
         raise_on_existing_database(database)
@@ -66,7 +86,7 @@ def init_db(
         is_jwt_needed=False,
     )
 
-    storage = initialize_storage(database, force)
+    storage = initialize_storage(database, force, storage_profile)
 
     new_user = note_client.user
 
@@ -77,6 +97,9 @@ def init_db(
     storage.config.set_config_value("backend", backend)
     storage.config.set_config_value("last_connection_tasks", "0")
 
+    if storage_profile:
+        storage.config.set_config_value("storage_profile", storage_profile)
+
     logger.info(f"Successfully initialized database for {new_user}!")
 
 
@@ -134,17 +157,33 @@ def reauth(
 def sync(
     database: Path,
     max_chunk_results: int,
+    chunk_prefetch_depth: int,
+    chunk_prefetch_memory_limit: int,
     max_download_workers: int,
     download_cache_memory_limit: int,
+    engine: str,
+    pipelined: bool,
     network_retry_count: int,
     use_system_ssl_ca: bool,
     include_tasks: bool,
     token: Optional[str],
+    storage_profile: Optional[str],
 ) -> None:
-    storage = get_storage(database)
+    if pipelined and engine != "threads":
+        raise ProgramTerminatedError(
+            "'--pipelined' sync is only supported with 'threads' engine!"
+        )
+
+    storage = get_storage(database, storage_profile)
 
     raise_on_old_database_version(storage)
 
+    # Fail before downloading anything, not on first note write
+    try:
+        storage.get_write_codec()
+    except CodecNotAvailableError as e:
+        raise ProgramTerminatedError(e)
+
     backend = storage.config.get_config_value("backend")
     auth_token = token or storage.config.get_config_value("auth_token")
 
@@ -157,6 +196,8 @@ def sync(
         use_system_ssl_ca=use_system_ssl_ca,
         max_chunk_results=max_chunk_results,
         is_jwt_needed=is_jwt_needed,
+        chunk_prefetch_depth=chunk_prefetch_depth,
+        chunk_prefetch_memory_limit=chunk_prefetch_memory_limit,
     )
 
     note_synchronizer = NoteSynchronizer(
@@ -165,6 +206,8 @@ def sync(
         max_download_workers,
         download_cache_memory_limit,
         include_tasks,
+        engine,
+        pipelined,
     )
 
     try:
@@ -188,23 +231,161 @@ def export(
     overwrite: bool,
     notebooks: tuple[str],
     tags: tuple[str],
-    output_path: Path,
+    output_path: Optional[Path],
+    storage_profile: Optional[str],
+    workers: int = 1,
+    incremental: bool = False,
+    archive_path: Optional[str] = None,
+    archive_format: Optional[str] = None,
+    export_format: str = "enex",
+    jsonl_resource_bodies: bool = False,
+    jsonl_shard_size: int = 0,
+    stacks: tuple[str, ...] = (),
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    updated_after: Optional[datetime] = None,
+    updated_before: Optional[datetime] = None,
 ) -> None:
-    storage = get_storage(database)
+    if (output_path is None) == (archive_path is None):
+        raise ProgramTerminatedError("Specify either OUTPUT_PATH or '--archive'.")
+
+    if export_format == "jsonl":
+        if incremental:
+            raise ProgramTerminatedError(
+                "'--incremental' can't be used with '--format jsonl'."
+            )
+
+        if workers > 1:
+            raise ProgramTerminatedError(
+                "'--workers' can't be used with '--format jsonl'."
+            )
+
+    storage = get_storage(database, storage_profile)
 
     raise_on_old_database_version(storage)
 
+    note_filter = NoteFilter(
+        tags=tags,
+        created_after=get_timestamp(created_after),
+        created_before=get_timestamp(created_before),
+        updated_after=get_timestamp(updated_after),
+        updated_before=get_timestamp(updated_before),
+    )
+
+    if archive_path is None:
+        _export(
+            storage=storage,
+            target_dir=output_path or Path(),
+            single_notes=single_notes,
+            include_trash=include_trash,
+            no_export_date=no_export_date,
+            add_guid=add_guid,
+            add_metadata=add_metadata,
+            overwrite=overwrite,
+            notebooks=notebooks,
+            stacks=stacks,
+            note_filter=note_filter,
+            workers=workers,
+            incremental=incremental,
+            export_format=export_format,
+            jsonl_resource_bodies=jsonl_resource_bodies,
+            jsonl_shard_size=jsonl_shard_size,
+        )
+        return
+
+    if export_format != "enex":
+        raise ProgramTerminatedError(
+            f"'--format {export_format}' can't be used with '--archive'."
+        )
+
+    if incremental:
+        raise ProgramTerminatedError("'--incremental' can't be used with '--archive'.")
+
+    if workers > 1:
+        raise ProgramTerminatedError("'--workers' can't be used with '--archive'.")
+
+    try:
+        archive_format = get_archive_format(archive_path, archive_format)
+    except ArchiveFormatError as e:
+        raise ProgramTerminatedError(e)
+
+    try:
+        with ExitStack() as stack:
+            if archive_path == "-":
+                if is_output_to_terminal():
+                    raise ProgramTerminatedError(
+                        "Refusing to write archive to terminal,"
+                        " redirect standard output to a file or pipe."
+                    )
+                archive_file = click.get_binary_stream("stdout")
+            else:
+                archive_file = stack.enter_context(Path(archive_path).open("wb"))
+
+            try:
+                archive = stack.enter_context(
+                    open_archive(archive_file, archive_format)
+                )
+            except ArchiveFormatError as e:
+                raise ProgramTerminatedError(e)
+
+            _export(
+                storage=storage,
+                target_dir=Path(),
+                single_notes=single_notes,
+                include_trash=include_trash,
+                no_export_date=no_export_date,
+                add_guid=add_guid,
+                add_metadata=add_metadata,
+                overwrite=overwrite,
+                notebooks=notebooks,
+                stacks=stacks,
+                note_filter=note_filter,
+                archive=archive,
+            )
+    except BaseException:
+        # Unfinished archive is never finalized, but file must not be left either
+        if archive_path != "-":
+            Path(archive_path).unlink(missing_ok=True)
+        raise
+
+
+def _export(  # noqa: WPS211
+    storage: SqliteStorage,
+    target_dir: Path,
+    single_notes: bool,
+    include_trash: bool,
+    no_export_date: bool,
+    add_guid: bool,
+    add_metadata: bool,
+    overwrite: bool,
+    notebooks: tuple[str],
+    stacks: tuple[str, ...],
+    note_filter: NoteFilter,
+    workers: int = 1,
+    incremental: bool = False,
+    archive: Optional[ArchiveWriter] = None,
+    export_format: str = "enex",
+    jsonl_resource_bodies: bool = False,
+    jsonl_shard_size: int = 0,
+) -> None:
     exporter = NoteExporter(
         storage=storage,
-        target_dir=output_path,
+        target_dir=target_dir,
         single_notes=single_notes,
         export_trash=include_trash,
         no_export_date=no_export_date,
         add_guid=add_guid,
         add_metadata=add_metadata,
         filter_notebooks=notebooks,
-        filter_tags=tags,
+        filter_stacks=stacks,
+        note_filter=note_filter,
         overwrite=overwrite,
+        workers=workers,
+        incremental=incremental,
+        archive=archive,
+        export_format=export_format,
+        add_resource_bodies=jsonl_resource_bodies,
+        jsonl_shard_size=jsonl_shard_size,
     )
 
     try:
@@ -275,6 +456,60 @@ def manage_check(
     logger.info("All notes have been checked!")
 
 
+def manage_recompress(
+    database: Path,
+    codec: str,
+) -> None:
+    storage = get_storage(database)
+
+    raise_on_old_database_version(storage)
+
+    try:
+        storage_codec = get_codec(codec)
+    except CodecNotAvailableError as e:
+        raise ProgramTerminatedError(e)
+
+    storage.config.set_config_value("storage_codec", storage_codec.name)
+
+    logger.info(f"Recompressing database with '{storage_codec.name}' codec...")
+
+    try:
+        count_notes = storage.notes.recompress_notes(storage_codec)
+        count_tasks = storage.tasks.recompress_tasks(storage_codec)
+        count_reminders = storage.reminders.recompress_reminders(storage_codec)
+    except CodecNotAvailableError as e:
+        raise ProgramTerminatedError(e)
+
+    logger.info(f"Recompressed notes: {count_notes}")
+    logger.info(f"Recompressed tasks: {count_tasks}")
+    logger.info(f"Recompressed reminders: {count_reminders}")
+
+
+def manage_tune(
+    database: Path,
+    storage_profile: Optional[str],
+) -> None:
+    storage = get_storage(database)
+
+    raise_on_old_database_version(storage)
+
+    if storage_profile:
+        storage.apply_profile(storage_profile)
+        storage.config.set_config_value("storage_profile", storage_profile)
+
+        logger.info(f"Storage profile set to '{storage_profile}'")
+
+    try:
+        current_profile = storage.config.get_config_value("storage_profile")
+    except KeyError:
+        current_profile = "not set"
+
+    logger.info(f"Storage profile: {current_profile}")
+
+    for setting_name, setting_value in storage.get_storage_settings().items():
+        logger.info(f"{setting_name}: {setting_value}")
+
+
 def manage_list(
     database: Path,
     notebook: Optional[str],
@@ -287,3 +522,47 @@ def manage_list(
     checker = NoteLister(storage, notebook, is_list_all)
 
     checker.list_notebooks()
+
+
+def manage_search(  # noqa: WPS211
+    database: Path,
+    query: str,
+    notebooks: tuple[str, ...],
+    tags: tuple[str, ...],
+    date_from: Optional[datetime],
+    date_to: Optional[datetime],
+    include_trash: bool,
+    limit: int,
+) -> None:
+    storage = get_storage(database)
+
+    raise_on_old_database_version(storage)
+
+    searcher = NoteSearcher(
+        storage=storage,
+        filter_notebooks=notebooks,
+        filter_tags=tags,
+        date_from=date_from,
+        date_to=date_to,
+        include_trash=include_trash,
+        limit=limit,
+    )
+
+    searcher.search(query)
+
+
+def manage_reindex(database: Path) -> None:
+    storage = get_storage(database)
+
+    raise_on_old_database_version(storage)
+
+    logger.info("Rebuilding full-text search index...")
+
+    count_notes = storage.notes.rebuild_search_index()
+
+    if not storage.is_search_available():
+        raise ProgramTerminatedError(
+            "Full-text search index can't be created, SQLite build lacks FTS5 support."
+        )
+
+    logger.info(f"Indexed notes: {count_notes}")
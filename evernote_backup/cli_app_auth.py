@@ -19,6 +19,8 @@ def get_sync_client(
     use_system_ssl_ca: bool,
     max_chunk_results: int,
     is_jwt_needed: bool,
+    chunk_prefetch_depth: int = 0,
+    chunk_prefetch_memory_limit: int = 64,
 ) -> EvernoteClientSync:
     logger.info(f"Authorizing auth token, {backend} backend...")
 
@@ -30,6 +32,8 @@ def get_sync_client(
         network_error_retry_count=network_error_retry_count,
         cafile=cafile,
         max_chunk_results=max_chunk_results,
+        chunk_prefetch_depth=chunk_prefetch_depth,
+        chunk_prefetch_memory_limit=chunk_prefetch_memory_limit,
     )
 
     try:
@@ -1,5 +1,7 @@
 import logging
+import sqlite3
 from pathlib import Path
+from typing import Optional
 
 from evernote_backup.cli_app_util import ProgramTerminatedError
 from evernote_backup.note_storage import (
@@ -11,16 +13,36 @@ from evernote_backup.note_storage import (
 logger = logging.getLogger(__name__)
 
 
-def get_storage(database_path: Path) -> SqliteStorage:
+def get_storage(
+    database_path: Path, storage_profile: Optional[str] = None
+) -> SqliteStorage:
     logger.info(f"Reading database {database_path.name}...")
 
     try:
-        return SqliteStorage(database_path)
+        storage = SqliteStorage(database_path)
     except FileNotFoundError:
         raise ProgramTerminatedError(
             f"Database file {database_path} does not exist. Initialize database first!"
         )
 
+    apply_storage_profile(storage, storage_profile)
+
+    return storage
+
+
+def apply_storage_profile(
+    storage: SqliteStorage, storage_profile: Optional[str]
+) -> None:
+    """Apply profile selected for this run, or the one saved in database"""
+
+    if storage_profile is None:
+        try:
+            storage_profile = storage.config.get_config_value("storage_profile")
+        except (KeyError, sqlite3.DatabaseError):
+            return
+
+    storage.apply_profile(storage_profile)
+
 
 def raise_on_old_database_version(storage: SqliteStorage) -> None:
     try:
@@ -39,7 +61,9 @@ def raise_on_existing_database(database_path: Path) -> None:
         )
 
 
-def initialize_storage(database_path: Path, force: bool) -> SqliteStorage:
+def initialize_storage(
+    database_path: Path, force: bool, storage_profile: Optional[str] = None
+) -> SqliteStorage:
     logger.info(f"Initializing database {database_path.name}...")
 
     if force:
@@ -48,6 +72,6 @@ def initialize_storage(database_path: Path, force: bool) -> SqliteStorage:
     else:
         raise_on_existing_database(database_path)
 
-    initialize_db(database_path)
+    initialize_db(database_path, storage_profile or "default")
 
-    return get_storage(database_path)
+    return get_storage(database_path, storage_profile)
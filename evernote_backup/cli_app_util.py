@@ -3,6 +3,7 @@ import io
 import os
 import sys
 from collections.abc import Iterable, Iterator, Sequence
+from datetime import datetime, timezone
 from typing import Optional, TextIO
 
 import click
@@ -22,6 +23,15 @@ class DatabaseCorruptError(Exception):
     """Raise when database is corrupt"""
 
 
+def get_timestamp(date: Optional[datetime]) -> Optional[int]:
+    """Evernote timestamp (milliseconds) of date given in UTC"""
+
+    if date is None:
+        return None
+
+    return int(date.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
 def get_api_data(backend: str, custom_api_data: Optional[str]) -> tuple[str, str]:
     if not custom_api_data:
         if backend.startswith("china"):
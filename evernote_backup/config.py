@@ -1,4 +1,4 @@
 API_DATA_YINXIANG = b"WFgyaS4uNmJ4bWN+OHp2ZTEpbGtvNDg6MW0wPmM9ZmFn"
 API_DATA_EVERNOTE = b"eW91c3V3dn9mYjF2az48bzM7Pm4wZzdlZzpk"
 
-CURRENT_DB_VERSION = 6
+CURRENT_DB_VERSION = 14
@@ -2,10 +2,19 @@ NETWORK_ERROR_RETRY_COUNT = 50
 OAUTH_LOCAL_PORT = 10500
 OAUTH_HOST = "localhost"
 SYNC_CHUNK_MAX_RESULTS = 200
+SYNC_CHUNK_PREFETCH_DEPTH = 0
+SYNC_CHUNK_PREFETCH_MEMORY_LIMIT = 64
 SYNC_MAX_DOWNLOAD_WORKERS = 5
 SYNC_DOWNLOAD_CACHE_MEMORY_LIMIT = 256
+SYNC_ENGINE = "threads"
 DATABASE_NAME = "en_backup.db"
+STORAGE_CODEC = "zlib"
+SEARCH_RESULTS_LIMIT = 20
+EXPORT_WORKERS = 1
+EXPORT_FORMAT = "enex"
+EXPORT_JSONL_SHARD_SIZE = 0
 BACKEND = "evernote"
 
 SYNC_CHUNK_MAX_RESULTS_SERVER_LIMIT = 256
 SYNC_MAX_DOWNLOAD_WORKERS_SANE_LIMIT = 256
+SYNC_CHUNK_PREFETCH_DEPTH_SANE_LIMIT = 16
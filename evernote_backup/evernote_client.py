@@ -12,6 +12,7 @@ from evernote.edam.error.ttypes import (
 from evernote.edam.userstore.constants import EDAM_VERSION_MAJOR, EDAM_VERSION_MINOR
 from requests_sse import EventSource, MessageEvent
 
+from evernote_backup.evernote_client_api_async import AsyncNoteStoreClient
 from evernote_backup.evernote_client_api_http import (
     NoteStoreClientRetryable,
     UserStoreClientRetryable,
@@ -121,6 +122,22 @@ class EvernoteClient(EvernoteClientBase):
             cafile=self.cafile,
         )
 
+    def get_async_note_store(
+        self,
+        shard: Optional[str] = None,
+    ) -> "AsyncNoteStoreClient":
+        token = str(self.token) if self.token else ""
+        shard = shard if shard else self.shard
+        note_store_uri = self._get_endpoint(f"edam/note/{shard}")
+
+        return AsyncNoteStoreClient(
+            auth_token=token,
+            store_url=note_store_uri,
+            user_agent=self.user_agent,
+            retry_max=self.network_error_retry_count,
+            cafile=self.cafile,
+        )
+
     def refresh_jwt_token(self) -> None:
         try:
             self._token_jwt = self.user_store.getNAPAccessToken()
@@ -0,0 +1,438 @@
+import asyncio
+import base64
+import functools
+import socket
+import ssl
+import urllib.request
+from http.client import HTTPException
+from typing import Any, Optional
+from urllib.parse import ParseResult, unquote, urlparse
+
+from evernote.edam.notestore import NoteStore
+from evernote.edam.notestore.ttypes import NoteResultSpec
+from evernote.edam.type.ttypes import Note, Resource
+from thrift.Thrift import TApplicationException, TMessageType
+from thrift.transport.TTransport import TMemoryBuffer
+
+from evernote_backup.evernote_client_api_http import (
+    DEFAULT_RETRY_BACKOFF_FACTOR,
+    DEFAULT_RETRY_DELAY,
+    DEFAULT_RETRY_MAX,
+    TBinaryProtocolHotfix,
+    get_ssl_context,
+)
+
+# In seconds, so one stalled socket fails its request instead of hanging sync
+ASYNC_CONNECT_TIMEOUT = 30.0
+# Longest pause between received bytes, not a limit on the whole response
+ASYNC_READ_TIMEOUT = 120.0
+ASYNC_READ_BLOCK_SIZE = 64 * 1024
+
+ASYNC_RETRY_EXCEPTIONS = (
+    HTTPException,
+    ConnectionError,
+    asyncio.IncompleteReadError,
+    asyncio.TimeoutError,
+)
+
+# Errors caused by the server dropping idle keep-alive connection
+ASYNC_STALE_CONNECTION_EXCEPTIONS = (
+    ConnectionResetError,
+    BrokenPipeError,
+    asyncio.IncompleteReadError,
+)
+
+StreamPair = tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+@functools.cache
+def _get_default_ssl_context() -> ssl.SSLContext:
+    return ssl.create_default_context()
+
+
+def _get_proxy_auth_header(proxy_url: ParseResult) -> Optional[str]:
+    if not proxy_url.username:
+        return None
+
+    credentials = f"{unquote(proxy_url.username)}:{unquote(proxy_url.password or '')}"
+
+    return f"Basic {base64.b64encode(credentials.encode()).decode()}"
+
+
+class AsyncHttpThriftClient:
+    """Non-blocking Thrift binary protocol over HTTP/1.1
+
+    Keeps idle keep-alive connections around, so concurrent calls
+    reuse them instead of doing TCP+TLS handshake every time.
+
+    Proxy from environment is used same as THttpClient does,
+    through CONNECT tunnel.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        user_agent: Optional[str] = None,
+        headers: Optional[dict[str, str]] = None,
+        cafile: Optional[str] = None,
+        connect_timeout: float = ASYNC_CONNECT_TIMEOUT,
+        read_timeout: float = ASYNC_READ_TIMEOUT,
+    ) -> None:
+        self.url = url
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+        parsed_url = urlparse(url)
+
+        self.scheme = parsed_url.scheme
+        self.host = str(parsed_url.hostname)
+        self.path = parsed_url.path or "/"
+
+        if self.scheme == "https":
+            self.port = parsed_url.port or 443
+            self.ssl_context: Optional[ssl.SSLContext] = (
+                get_ssl_context(cafile) if cafile else _get_default_ssl_context()
+            )
+        else:
+            self.port = parsed_url.port or 80
+            self.ssl_context = None
+
+        self._default_headers = {
+            "x-feature-version": "3",
+            "accept": "application/x-thrift",
+            "cache-control": "no-cache",
+            "User-Agent": user_agent or "Python/THttpClient",
+        }
+
+        if headers:
+            self._default_headers.update(headers)
+
+        self.proxy_host: Optional[str] = None
+        self.proxy_port = 0
+        self.proxy_auth: Optional[str] = None
+
+        proxy = urllib.request.getproxies().get(self.scheme)
+        if proxy and not urllib.request.proxy_bypass(self.host):
+            parsed_proxy = urlparse(proxy)
+
+            self.proxy_host = parsed_proxy.hostname
+            self.proxy_port = parsed_proxy.port or self.port
+            self.proxy_auth = _get_proxy_auth_header(parsed_proxy)
+
+        self._idle_connections: list[StreamPair] = []
+        self._seqid = 0
+
+    async def call(self, method_name: str, args: Any) -> Any:
+        request_body = self._serialize_call(method_name, args)
+
+        response_body = await self._post(request_body)
+
+        return self._deserialize_result(method_name, response_body)
+
+    async def close(self) -> None:
+        while self._idle_connections:
+            _, writer = self._idle_connections.pop()
+            writer.close()
+
+    async def _post(self, body: bytes) -> bytes:
+        if self._idle_connections:
+            connection = self._idle_connections.pop()
+
+            try:
+                return await self._send_request(connection, body)
+            except ASYNC_STALE_CONNECTION_EXCEPTIONS:
+                # Server dropped keep-alive connection, try again with a fresh one
+                pass
+
+        connection = await asyncio.wait_for(
+            self._open_connection(), self.connect_timeout
+        )
+
+        return await self._send_request(connection, body)
+
+    async def _open_connection(self) -> StreamPair:
+        if self.proxy_host is None:
+            return await asyncio.open_connection(
+                self.host,
+                self.port,
+                ssl=self.ssl_context,
+                server_hostname=self.host if self.ssl_context else None,
+            )
+
+        # Tunnel is set up once per connection, so blocking socket is fine there
+        loop = asyncio.get_running_loop()
+        tunnel_socket = await loop.run_in_executor(None, self._open_tunnel)
+
+        return await asyncio.open_connection(
+            sock=tunnel_socket,
+            ssl=self.ssl_context,
+            server_hostname=self.host if self.ssl_context else None,
+        )
+
+    def _open_tunnel(self) -> socket.socket:
+        tunnel_socket = socket.create_connection(
+            (str(self.proxy_host), self.proxy_port), self.connect_timeout
+        )
+
+        try:
+            tunnel_socket.sendall(self._format_connect_head())
+
+            response_head = b""
+            while b"\r\n\r\n" not in response_head:
+                response_data = tunnel_socket.recv(ASYNC_READ_BLOCK_SIZE)
+                if not response_data:
+                    raise ConnectionResetError("Proxy closed connection")
+
+                response_head += response_data
+
+            status_line = response_head.split(b"\r\n", 1)[0]
+
+            try:
+                status = int(status_line.split()[1])
+            except (IndexError, ValueError):
+                raise HTTPException(f"Bad proxy status line: {status_line!r}")
+
+            if status != 200:  # noqa: WPS432
+                raise HTTPException(
+                    f"Proxy refused tunnel to {self.host}:{self.port},"
+                    f" HTTP status {status}"
+                )
+        except BaseException:
+            tunnel_socket.close()
+            raise
+
+        return tunnel_socket
+
+    def _format_connect_head(self) -> bytes:
+        head_lines = [
+            f"CONNECT {self.host}:{self.port} HTTP/1.1",
+            f"Host: {self.host}:{self.port}",
+        ]
+
+        if self.proxy_auth:
+            head_lines.append(f"Proxy-Authorization: {self.proxy_auth}")
+
+        return ("\r\n".join(head_lines) + "\r\n\r\n").encode("latin-1")
+
+    async def _send_request(self, connection: StreamPair, body: bytes) -> bytes:
+        reader, writer = connection
+
+        try:
+            writer.write(self._format_request_head(len(body)) + body)
+            await asyncio.wait_for(writer.drain(), self.read_timeout)
+
+            status, response_headers = await self._read_response_head(reader)
+
+            if response_headers.get("transfer-encoding", "").lower() == "chunked":
+                response_body = await self._read_chunked_body(reader)
+            else:
+                response_body = await self._read_exactly(
+                    reader, int(response_headers.get("content-length", 0))
+                )
+        except BaseException:
+            writer.close()
+            raise
+
+        if response_headers.get("connection", "").lower() == "close":
+            writer.close()
+        else:
+            self._idle_connections.append(connection)
+
+        if status != 200:  # noqa: WPS432
+            raise HTTPException(f"Unexpected HTTP status {status} from {self.url}")
+
+        return response_body
+
+    def _format_request_head(self, content_length: int) -> bytes:
+        head_lines = [
+            f"POST {self.path} HTTP/1.1",
+            f"Host: {self.host}",
+            "Content-Type: application/x-thrift",
+            f"Content-Length: {content_length}",
+        ]
+
+        head_lines.extend(f"{k}: {v}" for k, v in self._default_headers.items())
+
+        return ("\r\n".join(head_lines) + "\r\n\r\n").encode("latin-1")
+
+    async def _read_response_head(
+        self, reader: asyncio.StreamReader
+    ) -> tuple[int, dict[str, str]]:
+        status_line = await self._read_line(reader)
+
+        if not status_line:
+            raise ConnectionResetError("Server closed connection")
+
+        try:
+            status = int(status_line.split()[1])
+        except (IndexError, ValueError):
+            raise HTTPException(f"Bad HTTP status line: {status_line!r}")
+
+        response_headers = {}
+
+        while True:
+            header_line = (await self._read_line(reader)).decode("latin-1").strip()
+            if not header_line:
+                break
+
+            name, _, header_value = header_line.partition(":")
+            response_headers[name.strip().lower()] = header_value.strip()
+
+        return status, response_headers
+
+    async def _read_chunked_body(self, reader: asyncio.StreamReader) -> bytes:
+        body_chunks = []
+
+        while True:
+            chunk_size = int((await self._read_line(reader)).split(b";")[0], 16)
+
+            if chunk_size == 0:
+                # Skip trailers
+                trailer_line = await self._read_line(reader)
+                while trailer_line.strip():
+                    trailer_line = await self._read_line(reader)
+                break
+
+            body_chunks.append(await self._read_exactly(reader, chunk_size))
+            await self._read_line(reader)
+
+        return b"".join(body_chunks)
+
+    async def _read_line(self, reader: asyncio.StreamReader) -> bytes:
+        return await asyncio.wait_for(reader.readline(), self.read_timeout)
+
+    async def _read_exactly(self, reader: asyncio.StreamReader, size: int) -> bytes:
+        """Read in blocks, so timeout applies to stalls, not to large bodies"""
+
+        body = bytearray()
+
+        while len(body) < size:
+            block = await asyncio.wait_for(
+                reader.read(min(size - len(body), ASYNC_READ_BLOCK_SIZE)),
+                self.read_timeout,
+            )
+
+            if not block:
+                raise asyncio.IncompleteReadError(bytes(body), size)
+
+            body.extend(block)
+
+        return bytes(body)
+
+    def _serialize_call(self, method_name: str, args: Any) -> bytes:
+        self._seqid += 1
+
+        buffer = TMemoryBuffer()
+        protocol = TBinaryProtocolHotfix(buffer)
+
+        protocol.writeMessageBegin(method_name, TMessageType.CALL, self._seqid)
+        args.write(protocol)
+        protocol.writeMessageEnd()
+
+        return bytes(buffer.getvalue())
+
+    def _deserialize_result(self, method_name: str, response_body: bytes) -> Any:
+        protocol = TBinaryProtocolHotfix(TMemoryBuffer(response_body))
+
+        _, message_type, _ = protocol.readMessageBegin()
+
+        if message_type == TMessageType.EXCEPTION:
+            app_exception = TApplicationException()
+            app_exception.read(protocol)
+            protocol.readMessageEnd()
+            raise app_exception
+
+        result = getattr(NoteStore, f"{method_name}_result")()
+        result.read(protocol)
+        protocol.readMessageEnd()
+
+        if result.success is not None:
+            return result.success
+
+        for field_spec in result.thrift_spec[1:]:
+            if field_spec is None:
+                continue
+
+            field_exception = getattr(result, field_spec[2])
+            if field_exception is not None:
+                raise field_exception
+
+        raise TApplicationException(
+            TApplicationException.MISSING_RESULT,
+            f"{method_name} failed: unknown result",
+        )
+
+
+class AsyncNoteStoreClient:
+    def __init__(
+        self,
+        auth_token: str,
+        store_url: str,
+        user_agent: Optional[str] = None,
+        cafile: Optional[str] = None,
+        retry_max: int = DEFAULT_RETRY_MAX,
+        retry_delay: float = DEFAULT_RETRY_DELAY,
+        retry_backoff_factor: float = DEFAULT_RETRY_BACKOFF_FACTOR,
+    ) -> None:
+        self.auth_token = auth_token
+
+        self._retry_max = retry_max
+        self._retry_delay = retry_delay
+        self._retry_backoff_factor = retry_backoff_factor
+
+        self._base_client = AsyncHttpThriftClient(
+            url=store_url,
+            user_agent=user_agent,
+            cafile=cafile,
+        )
+
+    async def get_note(self, note_guid: str) -> Note:
+        args = NoteStore.getNote_args(
+            authenticationToken=self.auth_token,
+            guid=note_guid,
+            withContent=True,
+            withResourcesData=True,
+            withResourcesRecognition=True,
+            withResourcesAlternateData=True,
+        )
+
+        return await self._call_with_retry("getNote", args)
+
+    async def get_note_with_result_spec(
+        self, note_guid: str, result_spec: NoteResultSpec
+    ) -> Note:
+        args = NoteStore.getNoteWithResultSpec_args(
+            authenticationToken=self.auth_token,
+            guid=note_guid,
+            resultSpec=result_spec,
+        )
+
+        return await self._call_with_retry("getNoteWithResultSpec", args)
+
+    async def get_resource(self, resource_guid: str) -> Resource:
+        args = NoteStore.getResource_args(
+            authenticationToken=self.auth_token,
+            guid=resource_guid,
+            withData=True,
+            withRecognition=True,
+            withAttributes=False,
+            withAlternateData=True,
+        )
+
+        return await self._call_with_retry("getResource", args)
+
+    async def close(self) -> None:
+        await self._base_client.close()
+
+    async def _call_with_retry(self, method_name: str, args: Any) -> Any:
+        delay = self._retry_delay
+
+        for attempt in range(self._retry_max + 1):
+            try:
+                return await self._base_client.call(method_name, args)
+            except ASYNC_RETRY_EXCEPTIONS:
+                if attempt >= self._retry_max:
+                    raise
+
+                await asyncio.sleep(delay)
+                delay *= self._retry_backoff_factor
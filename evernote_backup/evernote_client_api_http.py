@@ -1,6 +1,9 @@
 import functools
+import ssl
+import threading
 import time
-from http.client import HTTPException
+from http.client import HTTPConnection, HTTPException, HTTPResponse
+from io import BytesIO
 from typing import Any, Callable, Optional, cast
 
 from six.moves import http_client
@@ -16,6 +19,109 @@ DEFAULT_RETRY_MAX = 3
 DEFAULT_RETRY_DELAY = 0.5
 DEFAULT_RETRY_BACKOFF_FACTOR = 2.0
 DEFAULT_RETRY_EXCEPTIONS = (HTTPException, ConnectionError)
+DEFAULT_POOL_IDLE_TIMEOUT = 60.0
+
+# Errors caused by the server dropping idle keep-alive connection
+STALE_CONNECTION_EXCEPTIONS = (
+    http_client.RemoteDisconnected,
+    http_client.CannotSendRequest,
+    BrokenPipeError,
+    ConnectionResetError,
+)
+
+PoolKey = tuple[Any, ...]
+
+
+class HttpConnectionPool:
+    """Pool of persistent HTTP/1.1 keep-alive connections
+
+    HTTP connections are not thread-safe, so each thread keeps its own
+    connection per endpoint (scheme, host, port, SSL context, timeout).
+    Connections idle for longer than idle_timeout are closed on next access,
+    since server is likely to drop them anyway.
+    """
+
+    def __init__(self, idle_timeout: float = DEFAULT_POOL_IDLE_TIMEOUT) -> None:
+        self.idle_timeout = idle_timeout
+
+        self._thread_data = threading.local()
+
+    def get_connection(
+        self, key: PoolKey, factory: Callable[[], HTTPConnection]
+    ) -> tuple[HTTPConnection, bool]:
+        """Returns pooled connection and flag whether it was used before"""
+
+        self.evict_idle()
+
+        try:
+            connection, _ = self._connections[key]
+        except KeyError:
+            connection = factory()
+            is_reused = False
+        else:
+            is_reused = True
+
+        self._connections[key] = (connection, time.monotonic())
+
+        return connection, is_reused
+
+    def release(self, key: PoolKey, connection: HTTPConnection) -> None:
+        """Returns connection to the pool, so other clients can keep using it"""
+
+        pooled = self._connections.get(key)
+
+        if pooled is None:
+            self._connections[key] = (connection, time.monotonic())
+        elif pooled[0] is not connection:
+            # Pool already holds a newer connection for this endpoint
+            connection.close()
+
+    def discard(
+        self, key: PoolKey, connection: Optional[HTTPConnection] = None
+    ) -> None:
+        """Closes pooled connection, if given only when it is still the pooled one"""
+
+        pooled = self._connections.get(key)
+
+        if pooled is None or (connection is not None and pooled[0] is not connection):
+            return
+
+        del self._connections[key]
+        pooled[0].close()
+
+    def evict_idle(self) -> None:
+        now = time.monotonic()
+
+        idle_keys = [
+            key
+            for key, (_, last_used) in self._connections.items()
+            if now - last_used > self.idle_timeout
+        ]
+
+        for key in idle_keys:
+            self.discard(key)
+
+    def close_all(self) -> None:
+        for key in list(self._connections):
+            self.discard(key)
+
+    @property
+    def _connections(self) -> dict[PoolKey, tuple[HTTPConnection, float]]:
+        try:
+            return self._thread_data.connections  # type: ignore
+        except AttributeError:
+            self._thread_data.connections = {}
+            return self._thread_data.connections  # type: ignore
+
+
+HTTP_POOL = HttpConnectionPool()
+
+
+@functools.cache
+def get_ssl_context(cafile: str) -> ssl.SSLContext:
+    """Loading CA file is expensive, so one context is shared by all clients"""
+
+    return ssl.create_default_context(cafile=cafile)
 
 
 class TBinaryProtocolHotfix(TBinaryProtocol):
@@ -32,29 +138,135 @@ class THttpClientHotfix(THttpClient):
     Hotfix for deprecated `key_file` and `cert_file` args
     https://issues.apache.org/jira/browse/THRIFT-5847
     https://github.com/apache/thrift/pull/3108
+
+    Also keeps connection alive between requests instead of reconnecting on
+    every flush, connections are shared through HTTP_POOL.
     """
 
     def open(self) -> None:  # pragma: no cover
+        self._THttpClient__http, _ = HTTP_POOL.get_connection(
+            self._pool_key, self._new_connection
+        )
+
+    def close(self) -> None:
+        http: Optional[HTTPConnection] = self._THttpClient__http
+
+        if http is not None:
+            HTTP_POOL.release(self._pool_key, http)
+
+        self._detach()
+
+    def reset(self) -> None:
+        """Drops connection used by this client, e.g. after failed request"""
+
+        http: Optional[HTTPConnection] = self._THttpClient__http
+
+        if http is not None:
+            HTTP_POOL.discard(self._pool_key, http)
+
+        self._detach()
+
+    def _detach(self) -> None:
+        self._THttpClient__http = None  # type: ignore[assignment]
+        self._THttpClient__http_response = None
+
+    def flush(self) -> None:
+        data: bytes = self._THttpClient__wbuf.getvalue()  # type: ignore[has-type]
+        self._THttpClient__wbuf = BytesIO()
+
+        http, is_reused = HTTP_POOL.get_connection(self._pool_key, self._new_connection)
+
+        try:
+            self._send_request(http, data)
+        except STALE_CONNECTION_EXCEPTIONS:
+            if not is_reused:
+                raise
+
+            # Server dropped keep-alive connection, try once more with a fresh one
+            self.reset()
+            http, _ = HTTP_POOL.get_connection(self._pool_key, self._new_connection)
+            self._send_request(http, data)
+
+    def _send_request(self, http: HTTPConnection, data: bytes) -> None:
+        self._THttpClient__http = http
+
+        prev_response: Optional[HTTPResponse] = self._THttpClient__http_response
+        if prev_response is not None and not prev_response.isclosed():
+            # Leftovers of previous response must be consumed before reusing connection
+            prev_response.read()
+
+        if self.using_proxy() and self.scheme == "http":
+            http.putrequest(
+                "POST", f"http://{self.realhost}:{self.realport}{self.path}"
+            )
+        else:
+            http.putrequest("POST", self.path)
+
+        http.putheader("Content-Type", "application/x-thrift")
+        http.putheader("Content-Length", str(len(data)))
+        if self.using_proxy() and self.scheme == "http" and self.proxy_auth:
+            http.putheader("Proxy-Authorization", self.proxy_auth)
+
+        custom_headers = self._THttpClient__custom_headers or {}
+
+        if "User-Agent" not in custom_headers:
+            http.putheader("User-Agent", "Python/THttpClient")
+
+        for key, header_value in custom_headers.items():
+            http.putheader(key, header_value)
+
+        prev_headers = self.headers  # type: ignore[has-type]
+        if prev_headers and "Set-Cookie" in prev_headers:
+            http.putheader("Cookie", prev_headers["Set-Cookie"])
+
+        http.endheaders()
+        http.send(data)
+
+        response = http.getresponse()
+
+        self._THttpClient__http_response = response  # type: ignore[assignment]
+        self.code = response.status
+        self.message = response.reason
+        self.headers = response.msg
+
+    def _new_connection(self) -> HTTPConnection:  # pragma: no cover
+        http: HTTPConnection
+
         if self.scheme == "http":
-            self._THttpClient__http = http_client.HTTPConnection(
+            http = http_client.HTTPConnection(
                 self.host,
                 self.port,
                 timeout=self._THttpClient__timeout,
             )
-        elif self.scheme == "https":
-            self._THttpClient__http = http_client.HTTPSConnection(
+        else:
+            http = http_client.HTTPSConnection(
                 self.host,
                 self.port,
                 timeout=self._THttpClient__timeout,
                 context=self.context,
             )
+
         if self.using_proxy():
-            self._THttpClient__http.set_tunnel(
+            http.set_tunnel(
                 self.realhost,
                 self.realport,
                 {"Proxy-Authorization": self.proxy_auth},
             )
 
+        return http
+
+    @property
+    def _pool_key(self) -> PoolKey:
+        return (
+            self.scheme,
+            self.host,
+            self.port,
+            self.realhost,
+            self.realport,
+            id(getattr(self, "context", None)),
+            self._THttpClient__timeout,
+        )
+
 
 class BinaryHttpThriftClient:
     def __init__(
@@ -83,7 +295,8 @@ class BinaryHttpThriftClient:
 
     def _create_protocol(self) -> TBinaryProtocolHotfix:
         try:
-            thrift_http_client = THttpClientHotfix(self.url, cafile=self.cafile)
+            ssl_context = get_ssl_context(self.cafile) if self.cafile else None
+            thrift_http_client = THttpClientHotfix(self.url, ssl_context=ssl_context)
             thrift_http_client.setCustomHeaders(self._default_headers)
             return TBinaryProtocolHotfix(thrift_http_client)
         except Exception as e:
@@ -93,6 +306,9 @@ class BinaryHttpThriftClient:
     def protocol(self) -> TBinaryProtocolHotfix:
         return self._protocol
 
+    def reset_connection(self) -> None:
+        self._protocol.trans.reset()
+
 
 class UserStoreClient(TokenizedUserStoreClient):
     def __init__(
@@ -170,6 +386,7 @@ class RetryableMixin:
                         return func(*args, **kwargs)
                     except self._retry_exceptions as e:
                         last_exception = e
+                        self._reset_connection()
                         if attempt < self._retry_max:
                             time.sleep(delay)
                             delay *= self._retry_backoff_factor
@@ -180,6 +397,14 @@ class RetryableMixin:
 
         return decorator
 
+    def _reset_connection(self) -> None:
+        """Drop possibly broken pooled connection, so retry starts with a new one"""
+
+        base_client = getattr(self, "_base_client", None)
+
+        if isinstance(base_client, BinaryHttpThriftClient):
+            base_client.reset_connection()
+
 
 class UserStoreClientRetryable(RetryableMixin, UserStoreClient):
     # Stating all params explicitly for IDE hints
@@ -1,12 +1,15 @@
+import functools
 import json
 import logging
-from collections.abc import Iterator
+import threading
+from collections import deque
+from collections.abc import Generator, Iterator
 from typing import Any, Optional
 
 from evernote.edam.error.ttypes import EDAMNotFoundException
 from evernote.edam.notestore import NoteStore
-from evernote.edam.notestore.ttypes import SyncChunk
-from evernote.edam.type.ttypes import LinkedNotebook, Note
+from evernote.edam.notestore.ttypes import NoteResultSpec, SyncChunk
+from evernote.edam.type.ttypes import LinkedNotebook, Note, Resource
 
 from evernote_backup.evernote_client import EvernoteClient
 from evernote_backup.evernote_client_util import NotebookAuth
@@ -21,6 +24,119 @@ from evernote_backup.evernote_types import (
 
 logger = logging.getLogger(__name__)
 
+# Generous estimate of serialized metadata size for one sync chunk entry
+SYNC_CHUNK_ENTRY_SIZE = 1024
+
+NOTE_WITHOUT_RESOURCES_DATA_SPEC = NoteResultSpec(
+    includeContent=True,
+    includeResourcesData=False,
+    includeResourcesRecognition=False,
+    includeResourcesAlternateData=False,
+)
+
+
+def get_chunk_size(chunk: SyncChunk) -> int:
+    """Rough size of sync chunk, estimated from number of entries in it
+
+    Serializing chunk again just to measure it costs about as much as parsing it.
+    """
+
+    entries_count = sum(len(v) for v in vars(chunk).values() if isinstance(v, list))
+    entries_count += sum(len(n.resources or []) for n in chunk.notes or [])
+
+    return entries_count * SYNC_CHUNK_ENTRY_SIZE
+
+
+class SyncChunkPrefetcher:
+    """Fetch sync chunks in background thread ahead of consumer
+
+    Up to `depth` chunks are kept in memory, but no more than `memory_limit`
+    bytes, unless it is a single chunk larger than the limit.
+    """
+
+    def __init__(
+        self,
+        chunks: Generator[SyncChunk, None, None],
+        depth: int,
+        memory_limit: int,
+    ) -> None:
+        self.chunks = chunks
+        self.depth = depth
+        self.memory_limit = memory_limit
+
+        self._buffer: deque[tuple[Optional[SyncChunk], int]] = deque()
+        self._buffer_memory = 0
+        self._is_finished = False
+        self._is_stopped = False
+        self._error: Optional[BaseException] = None
+
+        self._cond = threading.Condition()
+
+    def __iter__(self) -> Iterator[SyncChunk]:
+        prefetch_thread = threading.Thread(target=self._prefetch, daemon=True)
+        prefetch_thread.start()
+
+        try:
+            while True:
+                chunk = self._get_chunk()
+                if chunk is None:
+                    return
+
+                yield chunk
+        finally:
+            with self._cond:
+                self._is_stopped = True
+                self._cond.notify_all()
+
+    def _get_chunk(self) -> Optional[SyncChunk]:
+        with self._cond:
+            self._cond.wait_for(lambda: self._buffer or self._is_finished)
+
+            if not self._buffer:
+                if self._error is not None:
+                    raise self._error
+                return None
+
+            chunk, chunk_size = self._buffer.popleft()
+            self._buffer_memory -= chunk_size
+
+            self._cond.notify_all()
+
+            return chunk
+
+    def _prefetch(self) -> None:
+        try:
+            for chunk in self.chunks:
+                chunk_size = get_chunk_size(chunk)
+
+                with self._cond:
+                    self._cond.wait_for(functools.partial(self._has_room, chunk_size))
+
+                    if self._is_stopped:
+                        return
+
+                    self._buffer.append((chunk, chunk_size))
+                    self._buffer_memory += chunk_size
+
+                    self._cond.notify_all()
+        except BaseException as e:
+            self._error = e
+        finally:
+            self.chunks.close()
+
+            with self._cond:
+                self._is_finished = True
+                self._cond.notify_all()
+
+    def _has_room(self, chunk_size: int) -> bool:
+        if self._is_stopped or not self._buffer:
+            return True
+
+        return (
+            len(self._buffer) < self.depth
+            and self._buffer_memory + chunk_size <= self.memory_limit
+        )
+
 
 class EvernoteClientSync(EvernoteClient):  # noqa: WPS214
     def __init__(
@@ -30,6 +146,8 @@ class EvernoteClientSync(EvernoteClient):  # noqa: WPS214
         network_error_retry_count: int,
         max_chunk_results: int,
         cafile: Optional[str],
+        chunk_prefetch_depth: int = 0,
+        chunk_prefetch_memory_limit: int = 64,
     ) -> None:
         super().__init__(
             backend=backend,
@@ -42,6 +160,8 @@ class EvernoteClientSync(EvernoteClient):  # noqa: WPS214
         self._notebook_tags: dict[str, dict[str, str]] = {}
         self._linked_notebooks: Optional[dict] = None
         self.max_chunk_results = max_chunk_results
+        self.chunk_prefetch_depth = chunk_prefetch_depth
+        self.chunk_prefetch_memory_limit = chunk_prefetch_memory_limit
 
         self.shared_mode = False
 
@@ -56,18 +176,91 @@ class EvernoteClientSync(EvernoteClient):  # noqa: WPS214
             True,  # noqa: WPS425
         )
 
-        if note.tagGuids:
-            if self.shared_mode:
-                nb_tags = self.list_notebook_tags(note.notebookGuid)
-                note.tagNames = [nb_tags[t] for t in note.tagGuids]
-            else:
-                note.tagNames = [self.tags[t] for t in note.tagGuids]
+        self.fill_note_tags(note)
 
         logger.debug(f"Finished downloading note [{note.guid}]")
 
         return note
 
+    def get_note_reusing_resources(
+        self, note_guid: str, known_resource_hashes: frozenset[bytes]
+    ) -> Note:
+        """Download note, skipping bodies of resources that are already stored
+
+        Skipped resources are returned with empty data body,
+        the rest are downloaded one by one.
+        """
+
+        logger.debug(f"Downloading note [{note_guid}] reusing stored resources")
+
+        note_store = self.note_store
+
+        note = note_store.getNoteWithResultSpec(
+            note_guid, NOTE_WITHOUT_RESOURCES_DATA_SPEC
+        )
+
+        for resource in note.resources or []:
+            if resource.data and resource.data.bodyHash in known_resource_hashes:
+                continue
+
+            self._fill_resource(note_store, resource)
+
+        self.fill_note_tags(note)
+
+        logger.debug(f"Finished downloading note [{note.guid}]")
+
+        return note
+
+    def _fill_resource(self, note_store: Any, resource: Resource) -> None:
+        logger.debug(f"Downloading resource [{resource.guid}]")
+
+        full_resource = note_store.getResource(
+            resource.guid,
+            True,
+            True,
+            False,
+            True,  # noqa: WPS425
+        )
+
+        resource.data = full_resource.data
+        resource.recognition = full_resource.recognition
+        resource.alternateData = full_resource.alternateData
+
+    def fill_note_tags(self, note: Note) -> None:
+        if not note.tagGuids:
+            return
+
+        if self.shared_mode:
+            nb_tags = self.list_notebook_tags(note.notebookGuid)
+            note.tagNames = [nb_tags[t] for t in note.tagGuids]
+        else:
+            note.tagNames = [self.tags[t] for t in note.tagGuids]
+
     def iter_sync_chunks(self, after_usn: int) -> Iterator[SyncChunk]:
+        return self._prefetch_chunks(self._iter_sync_chunks(after_usn))
+
+    def iter_linked_notebook_sync_chunks(
+        self, l_notebook: LinkedNotebook, after_usn: int
+    ) -> Iterator[SyncChunk]:
+        return self._prefetch_chunks(
+            self._iter_linked_notebook_sync_chunks(l_notebook, after_usn)
+        )
+
+    def _prefetch_chunks(
+        self, chunks: Generator[SyncChunk, None, None]
+    ) -> Iterator[SyncChunk]:
+        if self.chunk_prefetch_depth < 1:
+            return chunks
+
+        return iter(
+            SyncChunkPrefetcher(
+                chunks,
+                depth=self.chunk_prefetch_depth,
+                memory_limit=self.chunk_prefetch_memory_limit * 1024 * 1024,
+            )
+        )
+
+    def _iter_sync_chunks(self, after_usn: int) -> Generator[SyncChunk, None, None]:
         sync_filter = NoteStore.SyncChunkFilter(
             includeNotes=True,
             includeNoteResources=True,
@@ -88,9 +281,9 @@ class EvernoteClientSync(EvernoteClient):  # noqa: WPS214
             if chunk.chunkHighUSN == chunk.updateCount:
                 return
 
-    def iter_linked_notebook_sync_chunks(
+    def _iter_linked_notebook_sync_chunks(
         self, l_notebook: LinkedNotebook, after_usn: int
-    ) -> Iterator[SyncChunk]:
+    ) -> Generator[SyncChunk, None, None]:
         ln_note_store = self.get_note_store(l_notebook.shardId)
         is_full_sync = False
 
@@ -117,6 +310,22 @@ class EvernoteClientSync(EvernoteClient):  # noqa: WPS214
             if chunk.chunkHighUSN == chunk.updateCount:
                 return
 
+    def get_linked_notebook_remote_usn(
+        self, l_notebook: LinkedNotebook
+    ) -> Optional[int]:
+        ln_note_store = self.get_note_store(l_notebook.shardId)
+
+        try:
+            sync_state = ln_note_store.getLinkedNotebookSyncState(l_notebook)
+        except EDAMNotFoundException:
+            logger.warning(
+                f"Linked notebook '{l_notebook.shareName}' [{l_notebook.guid}]"
+                f" is not accessible, skipping..."
+            )
+            return None
+
+        return int(sync_state.updateCount)
+
     def auth_linked_notebook(
         self, l_notebook_guid: str, notebook_guid: str
     ) -> NotebookAuth:
@@ -1,17 +1,48 @@
+import hashlib
+import json
 import logging
-from collections.abc import Iterable
+import mimetypes
+import os
+import re
+import sqlite3
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import TYPE_CHECKING, Any, NamedTuple, Optional, TextIO, Union
+from urllib.parse import quote
 
 from click import progressbar
-from evernote.edam.type.ttypes import Note, Notebook
+from evernote.edam.type.ttypes import Note, Notebook, Resource
 
 from evernote_backup.cli_app_util import DatabaseEmptyError, get_progress_output
-from evernote_backup.evernote_types import Task
+from evernote_backup.evernote_types import Reminder, Task
 from evernote_backup.log_util import log_format_note, log_format_notebook
-from evernote_backup.note_exporter_util import SafePath
+from evernote_backup.note_exporter_archive import ArchiveWriter
+from evernote_backup.note_exporter_manifest import (
+    ExportManifest,
+    get_file_entry,
+    get_file_hash,
+)
+from evernote_backup.note_exporter_util import SafePath, ShardedFileWriter
 from evernote_backup.note_formatter import NoteFormatter
-from evernote_backup.note_storage import SqliteStorage
+from evernote_backup.note_formatter_enml import (
+    HtmlNoteFormatter,
+    MarkdownNoteFormatter,
+    get_resource_hash,
+)
+from evernote_backup.note_formatter_jsonl import JsonlNoteFormatter
+from evernote_backup.note_storage import (
+    ExportNote,
+    NoteFilter,
+    SqliteStorage,
+    StorageConnection,
+)
+
+if TYPE_CHECKING:
+    from click._termui_impl import ProgressBar
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +51,38 @@ ENEX_HEAD = """<?xml version="1.0" encoding="UTF-8"?>
 """
 ENEX_TAIL = "</en-export>\n"
 
+EXPORT_FORMATS = ("enex", "markdown", "html", "jsonl")
+EXPORT_FILE_EXTENSIONS = {
+    "enex": ".enex",
+    "markdown": ".md",
+    "html": ".html",
+    "jsonl": ".jsonl",
+}
+# Attachments of markdown and html exports, shared by all notes
+RESOURCES_DIR_NAME = "_resources"
+RESOURCE_EXPORT_STATE = "resource"
+
+# Single notes are handed out to worker processes in batches of this size
+EXPORT_WORKER_CHUNK_SIZE = 16
+
+
+class ExportTask(NamedTuple):
+    file_path: Path
+    notebook_name: str
+    # None for trash
+    notebook_guid: Optional[str]
+    # None to export all notebook notes into one file
+    note_guid: Optional[str]
+    notes: tuple[ExportNote, ...]
+    # Digest of everything that affects file contents, for incremental export
+    export_state: str = ""
+
+
+class ExportResult(NamedTuple):
+    notes_count: int
+    file_hash: Optional[str] = None
+    resource_files: tuple[Path, ...] = ()
+
 
 class NoteExporter:
     def __init__(
@@ -33,18 +96,66 @@ class NoteExporter:
         add_metadata: bool,
         overwrite: bool,
         filter_notebooks: tuple[str],
-        filter_tags: tuple[str],
+        note_filter: NoteFilter,
+        workers: int = 1,
+        incremental: bool = False,
+        archive: Optional[ArchiveWriter] = None,
+        export_format: str = "enex",
+        add_resource_bodies: bool = False,
+        jsonl_shard_size: int = 0,
+        filter_stacks: tuple[str, ...] = (),
     ) -> None:
         self.storage = storage
-        self.safe_paths = SafePath(target_dir, overwrite)
 
-        self.single_notes = single_notes
+        self._old_manifest: Optional[ExportManifest] = None
+        if incremental:
+            self._old_manifest = ExportManifest.load(target_dir)
+
+        if archive is not None:
+            # Paths are archive member names, nothing is created on disk
+            self.safe_paths = SafePath(Path(), ignore_existing=True, create_dirs=False)
+        elif self._old_manifest is not None:
+            # Incremental export rewrites its own files, names must not depend on them,
+            # other files in the way are kept unless overwrite is asked for
+            self.safe_paths = SafePath(
+                target_dir,
+                ignore_existing=overwrite,
+                reclaimable=self._old_manifest.get_file_paths(),
+            )
+        else:
+            self.safe_paths = SafePath(target_dir, overwrite=overwrite)
+        self.target_dir = target_dir
+        self.overwrite = overwrite
+
+        self._resources_dir = target_dir / RESOURCES_DIR_NAME
+        if export_format in {"markdown", "html"}:
+            # Notebook named same as attachments directory gets a numbered name
+            self._resources_dir = self.safe_paths.reserve(RESOURCES_DIR_NAME)
+
+        # Only ENEX can hold many notes in one file
+        self.single_notes = single_notes or export_format != "enex"
         self.export_trash = export_trash
         self.no_export_date = no_export_date
         self.add_guid = add_guid
         self.add_metadata = add_metadata
         self.filter_notebooks = filter_notebooks
-        self.filter_tags = filter_tags
+        self.filter_stacks = filter_stacks
+        self.note_filter = note_filter
+        self.workers = workers
+        self.incremental = incremental
+        self.archive = archive
+        self.export_format = export_format
+        self.add_resource_bodies = add_resource_bodies
+        self.jsonl_shard_size = jsonl_shard_size
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._manifest: Optional[ExportManifest] = None
+        self._tasks_digests: dict[str, str] = {}
+        self._count_unchanged_files = 0
+        self._written_resources: set[str] = set()
+        self._notes_tasks_cache: Optional[
+            tuple[Optional[str], dict[str, list[Task]]]
+        ] = None
 
     def export_notebooks(self) -> None:
         count_notes = self.storage.notes.get_notes_count()
@@ -61,6 +172,68 @@ class NoteExporter:
         if count_notes == 0 and count_trash == 0:
             raise DatabaseEmptyError
 
+        database_path = self.storage.get_database_path()
+
+        if self.workers > 1 and database_path is not None:
+            logger.debug(f"Exporting with {self.workers} worker processes")
+
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_export_worker,
+                initargs=(database_path, self._get_worker_options()),
+            )
+
+        if self.incremental:
+            self._manifest = ExportManifest(self.target_dir)
+            self._tasks_digests = self.storage.tasks.get_notes_tasks_digests()
+
+        try:
+            self._export_all(count_notes, count_trash)
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+        if self._old_manifest is not None and self._manifest is not None:
+            count_removed = self._old_manifest.remove_stale_files(
+                self._manifest, self._get_excluded_notes(self._old_manifest)
+            )
+            self._manifest.save()
+
+            logger.info(f"Unchanged files: {self._count_unchanged_files}")
+            logger.info(f"Removed files: {count_removed}")
+
+    def _get_excluded_notes(self, old_manifest: ExportManifest) -> frozenset[str]:
+        """Notes exported before that are left out now, but not deleted or trashed
+
+        Files of such notes are kept, changing filters must not delete them.
+        """
+
+        if self._manifest is None:
+            return frozenset()
+
+        old_notes = {g for e in old_manifest.files.values() for g in e.notes}
+        current_notes = {g for e in self._manifest.files.values() for g in e.notes}
+
+        return frozenset(
+            self.storage.notes.get_existing_note_guids(
+                old_notes - current_notes, include_trash=self.export_trash
+            )
+        )
+
+    @property
+    def _file_ext(self) -> str:
+        return EXPORT_FILE_EXTENSIONS[self.export_format]
+
+    @property
+    def _is_planned(self) -> bool:
+        return self._executor is not None or self.incremental
+
+    def _export_all(self, count_notes: int, count_trash: int) -> None:
+        if self.export_format == "jsonl":
+            self._export_jsonl(count_notes, count_trash)
+            return
+
         if count_notes > 0:
             logger.info("Exporting notebooks...")
 
@@ -71,16 +244,31 @@ class NoteExporter:
 
             self._export_trash()
 
-    def _export_active(self) -> None:
-        notebooks = list(self.storage.notebooks.iter_notebooks())
+    def _get_notebooks(self) -> list[Notebook]:
+        notebooks = list(
+            self.storage.notebooks.iter_notebooks(
+                names=self.filter_notebooks, stacks=self.filter_stacks
+            )
+        )
 
-        if self.filter_notebooks:
-            notebooks = [n for n in notebooks if n.name in self.filter_notebooks]
+        missed_notebooks = set(self.filter_notebooks) - {n.name for n in notebooks}
 
-            missed_notebooks = set(self.filter_notebooks) - {n.name for n in notebooks}
+        for n in missed_notebooks:
+            logger.warning(f"Notebook '{n}' not found in database.")
 
-            for n in missed_notebooks:
-                logger.warning(f"Notebook '{n}' not found in database.")
+        missed_stacks = set(self.filter_stacks) - {n.stack for n in notebooks}
+
+        for s in missed_stacks:
+            logger.warning(f"Stack '{s}' not found in database.")
+
+        return notebooks
+
+    def _export_active(self) -> None:
+        notebooks = self._get_notebooks()
+
+        if self._is_planned:
+            self._run_planned(self._plan_active(notebooks))
+            return
 
         with progressbar(
             notebooks,
@@ -92,90 +280,444 @@ class NoteExporter:
                     nb_info = log_format_notebook(nb)
                     logger.debug(f"Exporting notebook {nb_info}")
 
-                if self.storage.notebooks.get_notebook_notes_count(nb.guid) == 0:
+                notes_count = self.storage.notebooks.get_notebook_notes_count(
+                    nb.guid, self.note_filter
+                )
+
+                if notes_count == 0:
                     logger.debug("Notebook is empty, skip")
                     continue
 
                 self._export_notes(nb)
 
-    def _filter_tags(self, note: Note) -> bool:
-        if not note.tagNames:
-            return False
-
-        return bool(set(note.tagNames) & set(self.filter_tags))
-
     def _export_notes(self, notebook: Notebook) -> None:
         parent_dir = [notebook.stack] if notebook.stack else []
 
-        notes_source = self.storage.notes.iter_notes(notebook.guid)
-
-        if self.filter_tags:
-            notes_source = filter(self._filter_tags, notes_source)
+        notes_source = self.storage.notes.iter_notes(notebook.guid, self.note_filter)
+        notes_tasks = self._get_notes_tasks(notebook.guid)
 
         if self.single_notes:
             parent_dir.append(notebook.name)
-            self._output_single_notes(parent_dir, notebook.name, notes_source)
+            self._output_single_notes(
+                parent_dir, notebook.name, notes_source, notes_tasks
+            )
         else:
-            self._output_notebook(parent_dir, notebook.name, notes_source)
+            self._output_notebook(parent_dir, notebook.name, notes_source, notes_tasks)
 
     def _export_trash(self) -> None:
-        notes_source = self.storage.notes.iter_notes_trash()
+        if self._is_planned:
+            self._run_planned(self._plan_trash())
+            return
 
-        if self.filter_tags:
-            notes_source = filter(self._filter_tags, notes_source)
+        notes_source = self.storage.notes.iter_notes_trash(self.note_filter)
+        notes_tasks = self._get_notes_tasks(None)
 
         if self.single_notes:
             self._output_single_notes(
                 ["Trash"],
                 "Trash",
                 notes_source,
+                notes_tasks,
             )
         else:
             self._output_notebook(
                 [],
                 "Trash",
                 notes_source,
+                notes_tasks,
             )
 
+    def _export_jsonl(self, count_notes: int, count_trash: int) -> None:
+        """Stream notes into JSON Lines files, one notebook in memory at a time"""
+
+        note_formatter = JsonlNoteFormatter(
+            add_resource_bodies=self.add_resource_bodies
+        )
+        jsonl_writer = ShardedFileWriter(
+            self.safe_paths,
+            "notes",
+            self._file_ext,
+            self.jsonl_shard_size * 1024 * 1024,
+        )
+
+        try:
+            if count_notes > 0:
+                logger.info("Exporting notebooks...")
+
+                with progressbar(
+                    self._get_notebooks(),
+                    show_pos=True,
+                    file=get_progress_output(),
+                ) as notebooks_bar:
+                    for nb in notebooks_bar:
+                        notes_tasks = self._get_notes_tasks(nb.guid)
+
+                        for note in self.storage.notes.iter_notes(
+                            nb.guid, self.note_filter
+                        ):
+                            jsonl_writer.write_line(
+                                note_formatter.format_note(
+                                    note, nb, notes_tasks.get(note.guid, [])
+                                )
+                            )
+
+            if count_trash > 0 and self.export_trash:
+                logger.info("Exporting trash...")
+
+                notebooks = {
+                    nb.guid: nb for nb in self.storage.notebooks.iter_notebooks()
+                }
+                notes_tasks = self._get_notes_tasks(None)
+
+                for note in self.storage.notes.iter_notes_trash(self.note_filter):
+                    jsonl_writer.write_line(
+                        note_formatter.format_note(
+                            note,
+                            notebooks.get(note.notebookGuid),
+                            notes_tasks.get(note.guid, []),
+                        )
+                    )
+        finally:
+            jsonl_writer.close()
+
+        logger.debug(f"Written files: {len(jsonl_writer.files)}")
+
     def _output_single_notes(
         self,
         parent_dir: list[str],
         notebook_name: str,
         notes_source: Iterable[Note],
+        notes_tasks: dict[str, list[Task]],
     ) -> None:
         for note in notes_source:
-            note_path = self.safe_paths.get_file(*parent_dir, f"{note.title}.enex")
+            note_path = self.safe_paths.get_file(
+                *parent_dir, f"{note.title}{self._file_ext}"
+            )
 
-            self._write_export_file(note_path, notebook_name, [note])
+            self._write_export_file(note_path, notebook_name, [note], notes_tasks)
 
     def _output_notebook(
         self,
         parent_dir: list[str],
         notebook_name: str,
         notes_source: Iterable[Note],
+        notes_tasks: dict[str, list[Task]],
     ) -> None:
         notebook_path = self.safe_paths.get_file(*parent_dir, f"{notebook_name}.enex")
 
-        self._write_export_file(notebook_path, notebook_name, notes_source)
+        self._write_export_file(notebook_path, notebook_name, notes_source, notes_tasks)
+
+    def _get_worker_options(self) -> dict[str, Any]:
+        return {
+            "target_dir": self.target_dir,
+            "single_notes": self.single_notes,
+            "export_trash": self.export_trash,
+            "no_export_date": self.no_export_date,
+            "add_guid": self.add_guid,
+            "add_metadata": self.add_metadata,
+            "overwrite": self.overwrite,
+            "filter_notebooks": self.filter_notebooks,
+            "filter_stacks": self.filter_stacks,
+            "note_filter": self.note_filter,
+            "incremental": self.incremental,
+            "export_format": self.export_format,
+        }
+
+    def _plan_active(self, notebooks: list[Notebook]) -> list[ExportTask]:
+        export_tasks = []
+
+        for nb in notebooks:
+            parent_dir = [nb.stack] if nb.stack else []
+
+            if self.single_notes:
+                parent_dir.append(nb.name)
+                export_tasks.extend(
+                    self._plan_single_notes(parent_dir, nb.name, nb.guid)
+                )
+                continue
+
+            export_notes = self.storage.notes.get_export_notes(
+                nb.guid, self.note_filter
+            )
+
+            if not export_notes:
+                continue
+
+            export_tasks.append(
+                self._make_task(
+                    self._reserve_file(*parent_dir, f"{nb.name}.enex"),
+                    nb.name,
+                    nb.guid,
+                    None,
+                    export_notes,
+                )
+            )
+
+        return export_tasks
+
+    def _plan_trash(self) -> list[ExportTask]:
+        if self.single_notes:
+            return self._plan_single_notes(["Trash"], "Trash", None)
+
+        export_notes = self.storage.notes.get_export_notes(None, self.note_filter)
+
+        if not export_notes:
+            return []
+
+        return [
+            self._make_task(
+                self._reserve_file("Trash.enex"),
+                "Trash",
+                None,
+                None,
+                export_notes,
+            )
+        ]
+
+    def _plan_single_notes(
+        self,
+        parent_dir: list[str],
+        notebook_name: str,
+        notebook_guid: Optional[str],
+    ) -> list[ExportTask]:
+        export_notes = self.storage.notes.get_export_notes(
+            notebook_guid, self.note_filter
+        )
+
+        return [
+            self._make_task(
+                self._reserve_file(*parent_dir, f"{export_note.title}{self._file_ext}"),
+                notebook_name,
+                notebook_guid,
+                export_note.guid,
+                [export_note],
+            )
+            for export_note in export_notes
+        ]
+
+    def _make_task(
+        self,
+        file_path: Path,
+        notebook_name: str,
+        notebook_guid: Optional[str],
+        note_guid: Optional[str],
+        export_notes: list[ExportNote],
+    ) -> ExportTask:
+        export_state = ""
+        if self.incremental:
+            export_state = self._get_export_state(notebook_name, export_notes)
+
+        return ExportTask(
+            file_path=file_path,
+            notebook_name=notebook_name,
+            notebook_guid=notebook_guid,
+            note_guid=note_guid,
+            notes=tuple(export_notes),
+            export_state=export_state,
+        )
+
+    def _get_export_state(
+        self, notebook_name: str, export_notes: list[ExportNote]
+    ) -> str:
+        export_state = {
+            "options": [
+                self.single_notes,
+                self.no_export_date,
+                self.add_guid,
+                self.add_metadata,
+                sorted(self.note_filter.tags),
+                self.note_filter.created_after,
+                self.note_filter.created_before,
+                self.note_filter.updated_after,
+                self.note_filter.updated_before,
+                self.export_format,
+            ],
+            "notebook": notebook_name,
+            "notes": [
+                [n.guid, n.usn, self._tasks_digests.get(n.guid)] for n in export_notes
+            ],
+        }
+
+        return hashlib.sha256(json.dumps(export_state).encode()).hexdigest()
+
+    def _reserve_file(self, *paths: str) -> Path:
+        """Pick file name in export order, same as sequential export would
+
+        SafePath remembers names it gave out, so files can be written later.
+        """
+
+        return self.safe_paths.get_file(*paths)
+
+    def _run_planned(self, export_tasks: list[ExportTask]) -> None:
+        # With overwrite, later file with the same name wins, same as sequential
+        tasks_by_path = {t.file_path: t for t in export_tasks}
+        pending_tasks = [
+            t for t in tasks_by_path.values() if not self._skip_unchanged(t)
+        ]
+
+        notes_bar: ProgressBar[int]
+        with progressbar(
+            length=sum(len(t.notes) for t in pending_tasks),
+            show_pos=True,
+            file=get_progress_output(),
+        ) as notes_bar:
+            if self._executor is not None:
+                results = self._executor.map(
+                    _run_export_task,
+                    pending_tasks,
+                    chunksize=EXPORT_WORKER_CHUNK_SIZE if self.single_notes else 1,
+                )
+            else:
+                results = map(self.run_export_task, pending_tasks)
+
+            for export_task, export_result in zip(pending_tasks, results):
+                notes_bar.update(export_result.notes_count)
+
+                self._record_file(export_task, export_result)
+
+    def _skip_unchanged(self, export_task: ExportTask) -> bool:
+        if self._old_manifest is None or self._manifest is None:
+            return False
+
+        if not self._old_manifest.is_up_to_date(
+            export_task.file_path, export_task.export_state
+        ):
+            return False
+
+        logger.debug(f"File {export_task.file_path} is up to date, skip")
+
+        old_entry = self._old_manifest.get_entry(export_task.file_path)
+        if old_entry is not None:
+            # Content is verified, so touched file is not hashed again next time
+            self._manifest.add_file(
+                export_task.file_path,
+                old_entry._replace(file_mtime=export_task.file_path.stat().st_mtime_ns),
+            )
+            self._manifest.copy_entries(self._old_manifest, old_entry.resources)
+
+        self._count_unchanged_files += 1
 
-    def _get_note_tasks(self, note_guid: str) -> list[Task]:
-        tasks = sorted(
-            self.storage.tasks.iter_tasks(note_guid),
-            key=lambda t: str(t.sortWeight),
+        return True
+
+    def _record_file(
+        self, export_task: ExportTask, export_result: ExportResult
+    ) -> None:
+        if self._manifest is None or export_result.file_hash is None:
+            return
+
+        for resource_path in export_result.resource_files:
+            # Attachment file is named by its hash
+            self._manifest.add_file(
+                resource_path,
+                get_file_entry(
+                    resource_path,
+                    export_state=RESOURCE_EXPORT_STATE,
+                    notes={},
+                    file_hash=resource_path.stem,
+                ),
+            )
+
+        self._manifest.add_file(
+            export_task.file_path,
+            get_file_entry(
+                export_task.file_path,
+                export_state=export_task.export_state,
+                notes={n.guid: n.usn for n in export_task.notes},
+                file_hash=export_result.file_hash,
+                resources=tuple(
+                    self._manifest.get_file_name(r)
+                    for r in export_result.resource_files
+                ),
+            ),
         )
 
-        for task in tasks:
-            task.reminders = list(self.storage.reminders.iter_reminders(task.taskId))
+    def run_export_task(self, export_task: ExportTask) -> ExportResult:
+        if export_task.note_guid is not None:
+            note = self.storage.notes.get_note(export_task.note_guid)
+
+            if note is None:
+                # Corrupt note, already reported
+                return ExportResult(notes_count=0)
+
+            resource_files = self._write_export_file(
+                export_task.file_path,
+                export_task.notebook_name,
+                [note],
+                self._get_cached_notes_tasks(export_task.notebook_guid),
+            )
+
+            return self._get_export_result(export_task, resource_files)
+
+        if export_task.notebook_guid is None:
+            notes_source = self.storage.notes.iter_notes_trash(self.note_filter)
+        else:
+            notes_source = self.storage.notes.iter_notes(
+                export_task.notebook_guid, self.note_filter
+            )
+
+        resource_files = self._write_export_file(
+            export_task.file_path,
+            export_task.notebook_name,
+            notes_source,
+            self._get_notes_tasks(export_task.notebook_guid),
+        )
+
+        return self._get_export_result(export_task, resource_files)
+
+    def _get_notes_tasks(self, notebook_guid: Optional[str]) -> dict[str, list[Task]]:
+        """Tasks of notebook notes grouped by note, of trashed notes if guid is None"""
+
+        if notebook_guid is None:
+            return _group_tasks(
+                self.storage.tasks.iter_trash_tasks(),
+                self.storage.reminders.iter_trash_reminders(),
+            )
+
+        return _group_tasks(
+            self.storage.tasks.iter_notebook_tasks(notebook_guid),
+            self.storage.reminders.iter_notebook_reminders(notebook_guid),
+        )
 
-        return tasks
+    def _get_cached_notes_tasks(
+        self, notebook_guid: Optional[str]
+    ) -> dict[str, list[Task]]:
+        """Single notes of notebook are planned in a row, so tasks are loaded once"""
+
+        cached_tasks = self._notes_tasks_cache
+        if cached_tasks is None or cached_tasks[0] != notebook_guid:
+            cached_tasks = (notebook_guid, self._get_notes_tasks(notebook_guid))
+            self._notes_tasks_cache = cached_tasks
+
+        return cached_tasks[1]
+
+    def _get_export_result(
+        self, export_task: ExportTask, resource_files: list[Path]
+    ) -> ExportResult:
+        file_hash = None
+        if self.incremental:
+            file_hash = get_file_hash(export_task.file_path)
+
+        return ExportResult(
+            notes_count=len(export_task.notes),
+            file_hash=file_hash,
+            resource_files=tuple(resource_files),
+        )
 
     def _write_export_file(
         self,
         file_path: Path,
         notebook_name: str,
         note_source: Iterable[Note],
-    ) -> None:
-        with file_path.open("w", encoding="utf-8") as f:
+        notes_tasks: dict[str, list[Task]],
+    ) -> list[Path]:
+        """Write notes into file, return attachment files it links to"""
+
+        if self.export_format != "enex":
+            return self._write_document_file(
+                file_path, notebook_name, note_source, notes_tasks
+            )
+
+        with self._open_output(file_path) as f:
             logger.debug(f"Writing file {file_path}")
 
             f.write(ENEX_HEAD)
@@ -198,14 +740,165 @@ class NoteExporter:
                 n_info = log_format_note(note)
                 logger.debug(f"Exporting note {n_info}")
 
-                note_tasks = self._get_note_tasks(note.guid)
-
-                f.write(
-                    note_formatter.format_note(
-                        note,
-                        notebook_name,
-                        note_tasks,
-                    )
+                note_formatter.write_note(
+                    f,
+                    note,
+                    notebook_name,
+                    notes_tasks.get(note.guid, []),
                 )
 
             f.write(ENEX_TAIL)
+
+        return []
+
+    def _write_document_file(
+        self,
+        file_path: Path,
+        notebook_name: str,
+        note_source: Iterable[Note],
+        notes_tasks: dict[str, list[Task]],
+    ) -> list[Path]:
+        note_formatter: Union[MarkdownNoteFormatter, HtmlNoteFormatter]
+        if self.export_format == "markdown":
+            note_formatter = MarkdownNoteFormatter(
+                add_guid=self.add_guid,
+                add_metadata=self.add_metadata,
+            )
+        else:
+            note_formatter = HtmlNoteFormatter(
+                add_guid=self.add_guid,
+                add_metadata=self.add_metadata,
+            )
+
+        resource_files: list[Path] = []
+
+        # Single notes mode, source holds one note
+        for note in note_source:
+            logger.debug(f"Writing file {file_path}")
+
+            resource_links = self._write_resources(
+                note, file_path.parent, resource_files
+            )
+
+            with self._open_output(file_path) as f:
+                note_formatter.write_note(
+                    f,
+                    note,
+                    notebook_name,
+                    notes_tasks.get(note.guid, []),
+                    resource_links,
+                )
+
+        return resource_files
+
+    def _write_resources(
+        self, note: Note, note_dir: Path, resource_files: list[Path]
+    ) -> dict[str, str]:
+        """Write note attachments as files named by hash, return links to them
+
+        Same attachment is written once, no matter how many notes have it.
+        Paths of linked files are added to resource_files.
+        """
+
+        resources_dir = self._resources_dir
+
+        resource_links = {}
+        for resource in note.resources or []:
+            resource_hash = get_resource_hash(resource)
+
+            if resource_hash is None or resource.data.body is None:
+                continue
+
+            resource_path = (
+                resources_dir / f"{resource_hash}{_get_resource_ext(resource)}"
+            )
+
+            if resource_path.name not in self._written_resources:
+                _write_resource_file(resource_path, resource.data.body)
+                self._written_resources.add(resource_path.name)
+
+            resource_files.append(resource_path)
+
+            resource_link = Path(os.path.relpath(resource_path, note_dir)).as_posix()
+            resource_links[resource_hash] = quote(resource_link)
+
+        return resource_links
+
+    @contextmanager
+    def _open_output(self, file_path: Path) -> Iterator[TextIO]:
+        if self.archive is not None:
+            with self.archive.open_member(file_path.as_posix()) as member:
+                yield member
+            return
+
+        with file_path.open("w", encoding="utf-8") as f:
+            yield f
+
+
+def _group_tasks(
+    tasks: Iterable[Task], reminders: Iterable[Reminder]
+) -> dict[str, list[Task]]:
+    task_reminders: dict[str, list[Reminder]] = defaultdict(list)
+    for reminder in reminders:
+        task_reminders[str(reminder.sourceId)].append(reminder)
+
+    notes_tasks: dict[str, list[Task]] = defaultdict(list)
+    for task in tasks:
+        task.reminders = task_reminders.get(task.taskId, [])
+        notes_tasks[str(task.parentId)].append(task)
+
+    for note_tasks in notes_tasks.values():
+        note_tasks.sort(key=lambda t: str(t.sortWeight))
+
+    return notes_tasks
+
+
+def _get_resource_ext(resource: Resource) -> str:
+    mime_ext = mimetypes.guess_extension(resource.mime or "")
+    if mime_ext:
+        return mime_ext
+
+    file_name = resource.attributes.fileName if resource.attributes else None
+    file_ext = Path(file_name or "").suffix
+
+    if re.fullmatch(r"\.[A-Za-z0-9]{1,10}", file_ext):
+        return file_ext.lower()
+
+    return ""
+
+
+def _write_resource_file(resource_path: Path, resource_body: bytes) -> None:
+    # Name is derived from content, so a file that is already there is the same
+    if resource_path.exists():
+        return
+
+    resource_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Written under temporary name, so interrupted export leaves no partial files
+    tmp_path = resource_path.with_name(f".{resource_path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(resource_body)
+    tmp_path.replace(resource_path)
+
+
+# Exporter of current worker process, set up by _init_export_worker
+_worker_exporter: Optional[NoteExporter] = None
+
+
+def _init_export_worker(database_path: Path, exporter_options: dict[str, Any]) -> None:
+    global _worker_exporter  # noqa: WPS420
+
+    db = sqlite3.connect(
+        f"{database_path.resolve().as_uri()}?mode=ro",
+        uri=True,
+        factory=StorageConnection,
+    )
+    db.row_factory = sqlite3.Row
+
+    _worker_exporter = NoteExporter(storage=SqliteStorage(db), **exporter_options)
+
+
+def _run_export_task(export_task: ExportTask) -> ExportResult:
+    if _worker_exporter is None:  # pragma: no cover
+        raise RuntimeError("Export worker is not initialized")
+
+    return _worker_exporter.run_export_task(export_task)
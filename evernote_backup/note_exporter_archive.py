@@ -0,0 +1,227 @@
+import io
+import tarfile
+import tempfile
+import time
+import zipfile
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Optional, TextIO, Union, cast
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+# Tar members bigger than this are spooled to a temporary file, not kept in memory
+TAR_MEMBER_SPOOL_SIZE = 8 * 1024 * 1024
+
+ARCHIVE_FORMATS = ("tar.gz", "tar.zst", "zip")
+ARCHIVE_EXTENSIONS = {
+    ".tar.gz": "tar.gz",
+    ".tgz": "tar.gz",
+    ".tar.zst": "tar.zst",
+    ".zip": "zip",
+}
+
+
+class ArchiveFormatError(Exception):
+    """Raise when archive format is unknown or not available"""
+
+
+class TarArchiveWriter:
+    """Writes members into a streamed tar archive, output is never seeked
+
+    Tar header holds member size, so each member is spooled first,
+    in memory while small and in a temporary file after that.
+    Notes of a member are read from database once, so its size can't be
+    learned from a separate rendering pass without loading them twice.
+    """
+
+    def __init__(self, fileobj: BinaryIO, compression: str) -> None:
+        self._compressor = None
+
+        if compression == "zst":
+            if zstandard is None:
+                raise ArchiveFormatError(
+                    "'tar.zst' archives require 'zstandard' package."
+                    " Install it or use another archive format."
+                )
+
+            self._compressor = zstandard.ZstdCompressor().stream_writer(
+                fileobj, closefd=False
+            )
+            self._tar = tarfile.open(fileobj=self._compressor, mode="w|")
+        else:
+            self._tar = tarfile.open(fileobj=fileobj, mode="w|gz")
+
+    @contextmanager
+    def open_member(self, member_name: str) -> Iterator[TextIO]:
+        member_buffer = _MemberSpool(TAR_MEMBER_SPOOL_SIZE)
+        member_out = io.TextIOWrapper(cast(BinaryIO, member_buffer), encoding="utf-8")
+
+        try:
+            yield member_out
+
+            member_out.flush()
+
+            member = tarfile.TarInfo(member_name)
+            member.size = member_buffer.size
+            member.mtime = int(time.time())
+            member.mode = 0o644
+
+            self._tar.addfile(member, member_buffer.rewind())
+        finally:
+            member_out.close()
+
+    def close(self) -> None:
+        self._tar.close()
+
+        if self._compressor is not None:
+            self._compressor.close()
+
+
+class _MemberSpool(io.BufferedIOBase):
+    """Write-only buffer that moves into a temporary file once it grows big"""
+
+    def __init__(self, max_size: int) -> None:
+        self.size = 0
+        self._max_size = max_size
+        self._memory_file = io.BytesIO()
+        self._file: BinaryIO = self._memory_file
+        self._is_rolled = False
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:
+        written = self._file.write(data)
+        self.size += written
+
+        if not self._is_rolled and self.size > self._max_size:
+            self._roll()
+
+        return written
+
+    def rewind(self) -> BinaryIO:
+        self._file.seek(0)
+        return self._file
+
+    def close(self) -> None:
+        self._file.close()
+        super().close()
+
+    def _roll(self) -> None:
+        disk_file = tempfile.TemporaryFile()
+        with self._memory_file.getbuffer() as memory_data:
+            disk_file.write(memory_data)
+        self._memory_file.close()
+
+        self._file = cast(BinaryIO, disk_file)
+        self._is_rolled = True
+
+
+class _ArchiveOutput(io.RawIOBase):
+    """Archive output that drops all writes once aborted
+
+    Writers are still closed after abort, to release their resources,
+    but nothing they finalize reaches the file.
+    """
+
+    def __init__(self, fileobj: BinaryIO) -> None:
+        super().__init__()
+        self.is_aborted = False
+        self._fileobj = fileobj
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:
+        if self.is_aborted:
+            return len(data)
+
+        return self._fileobj.write(data)
+
+    def seekable(self) -> bool:
+        return self._fileobj.seekable()
+
+    def tell(self) -> int:
+        return self._fileobj.tell()
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._fileobj.seek(offset, whence)
+
+    def flush(self) -> None:
+        # Also called on garbage collection, when output may be closed already
+        if not self.is_aborted and not self._fileobj.closed:
+            self._fileobj.flush()
+
+
+class ZipArchiveWriter:
+    """Writes members straight into a zip archive, without buffering them"""
+
+    def __init__(self, fileobj: BinaryIO) -> None:
+        self._zip = zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_DEFLATED)
+
+    @contextmanager
+    def open_member(self, member_name: str) -> Iterator[TextIO]:
+        # Size is unknown upfront, so allow member to grow past 4 GB
+        with self._zip.open(member_name, "w", force_zip64=True) as member_raw:
+            member_out = io.TextIOWrapper(member_raw, encoding="utf-8")
+
+            yield member_out
+
+            member_out.flush()
+            member_out.detach()
+
+    def close(self) -> None:
+        self._zip.close()
+
+
+ArchiveWriter = Union[TarArchiveWriter, ZipArchiveWriter]
+
+
+def get_archive_format(archive_name: str, archive_format: Optional[str]) -> str:
+    if archive_format:
+        return archive_format
+
+    for extension, extension_format in ARCHIVE_EXTENSIONS.items():
+        if archive_name.lower().endswith(extension):
+            return extension_format
+
+    raise ArchiveFormatError(
+        f"Can't tell archive format from '{archive_name}',"
+        f" use one of {', '.join(ARCHIVE_EXTENSIONS)} extensions"
+        " or '--archive-format' option."
+    )
+
+
+@contextmanager
+def open_archive(fileobj: BinaryIO, archive_format: str) -> Iterator[ArchiveWriter]:
+    """Archive is finalized only if block finishes without error
+
+    Otherwise its end records are never written, so unfinished archive
+    can't be mistaken for a complete one.
+    """
+
+    archive_output = _ArchiveOutput(fileobj)
+    archive_writer_output = cast(BinaryIO, archive_output)
+
+    archive_writer: ArchiveWriter
+    if archive_format == "zip":
+        archive_writer = ZipArchiveWriter(archive_writer_output)
+    elif archive_format == "tar.gz":
+        archive_writer = TarArchiveWriter(archive_writer_output, "gz")
+    elif archive_format == "tar.zst":
+        archive_writer = TarArchiveWriter(archive_writer_output, "zst")
+    else:
+        raise ArchiveFormatError(f"Unknown archive format '{archive_format}'")
+
+    try:
+        yield archive_writer
+    except BaseException:
+        archive_output.is_aborted = True
+        archive_writer.close()
+        raise
+
+    archive_writer.close()
+    archive_output.flush()
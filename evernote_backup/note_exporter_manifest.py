@@ -0,0 +1,185 @@
+import hashlib
+import json
+import logging
+from collections.abc import Iterable
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE_NAME = ".export-manifest.json"
+MANIFEST_VERSION = 1
+
+HASH_READ_SIZE = 1024 * 1024
+
+
+class ManifestEntry(NamedTuple):
+    # Digest of everything that affects file contents
+    export_state: str
+    # Note guid -> USN of notes written into the file
+    notes: dict[str, Optional[int]]
+    file_hash: str
+    file_size: int
+    # Missing in manifests of older versions, hash is checked instead
+    file_mtime: Optional[int] = None
+    # Attachment files the file links to, they have entries of their own
+    resources: tuple[str, ...] = ()
+
+
+class ExportManifest:
+    """Record of files written by incremental export, kept in export directory"""
+
+    def __init__(self, target_dir: Path) -> None:
+        self.target_dir = target_dir
+        self.files: dict[str, ManifestEntry] = {}
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.target_dir / MANIFEST_FILE_NAME
+
+    @classmethod
+    def load(cls, target_dir: Path) -> "ExportManifest":
+        manifest = cls(target_dir)
+
+        try:
+            manifest_data = json.loads(manifest.manifest_path.read_text("utf-8"))
+        except FileNotFoundError:
+            return manifest
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to read export manifest, exporting everything: {e}")
+            return manifest
+
+        if manifest_data.get("version") != MANIFEST_VERSION:
+            logger.warning("Unknown export manifest version, exporting everything")
+            return manifest
+
+        for file_name, entry in manifest_data["files"].items():
+            manifest.files[file_name] = ManifestEntry(**entry)
+
+        return manifest
+
+    def save(self) -> None:
+        manifest_data = {
+            "version": MANIFEST_VERSION,
+            "files": {
+                file_name: entry._asdict()
+                for file_name, entry in sorted(self.files.items())
+            },
+        }
+
+        # Replace in one step, so interrupted export never leaves partial manifest
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(manifest_data, indent=1), "utf-8")
+        tmp_path.replace(self.manifest_path)
+
+    def get_file_name(self, file_path: Path) -> str:
+        return file_path.relative_to(self.target_dir).as_posix()
+
+    def get_file_paths(self) -> list[Path]:
+        return [self.target_dir / file_name for file_name in self.files]
+
+    def get_entry(self, file_path: Path) -> Optional[ManifestEntry]:
+        return self.files.get(self.get_file_name(file_path))
+
+    def is_up_to_date(self, file_path: Path, export_state: str) -> bool:
+        entry = self.get_entry(file_path)
+
+        if entry is None or entry.export_state != export_state:
+            return False
+
+        try:
+            file_stat = file_path.stat()
+        except FileNotFoundError:
+            return False
+
+        if file_stat.st_size != entry.file_size:
+            return False
+
+        # Same size edits are caught by timestamp, touched files are read
+        if file_stat.st_mtime_ns != entry.file_mtime:
+            if get_file_hash(file_path) != entry.file_hash:
+                return False
+
+        return all(
+            r in self.files and (self.target_dir / r).is_file() for r in entry.resources
+        )
+
+    def add_file(self, file_path: Path, entry: ManifestEntry) -> None:
+        self.files[self.get_file_name(file_path)] = entry
+
+    def copy_entries(self, source: "ExportManifest", file_names: Iterable[str]) -> None:
+        for file_name in file_names:
+            self.files[file_name] = source.files[file_name]
+
+    def remove_stale_files(
+        self, current: "ExportManifest", kept_notes: frozenset[str] = frozenset()
+    ) -> int:
+        """Delete files listed here that are no longer part of current export
+
+        Files with any of kept_notes, e.g. notes left out by changed filters,
+        stay on disk and are carried over to current manifest.
+        """
+
+        for file_name, entry in self.files.items():
+            if file_name not in current.files and kept_notes.intersection(entry.notes):
+                current.files[file_name] = entry
+                current.copy_entries(self, entry.resources)
+
+        stale_files = self.files.keys() - current.files.keys()
+        target_dir = self.target_dir.resolve()
+
+        count_removed = 0
+        for file_name in sorted(stale_files):
+            file_path = self.target_dir / file_name
+
+            # Manifest is a plain file in export directory, it may be edited
+            if target_dir not in file_path.resolve().parents:
+                logger.warning(f"Not removing {file_name}, it is outside export dir")
+                continue
+
+            logger.debug(f"Removing {file_path}")
+
+            file_path.unlink(missing_ok=True)
+            _remove_empty_dirs(file_path.parent, self.target_dir)
+
+            count_removed += 1
+
+        return count_removed
+
+
+def get_file_entry(
+    file_path: Path,
+    export_state: str,
+    notes: dict[str, Optional[int]],
+    file_hash: str,
+    resources: tuple[str, ...] = (),
+) -> ManifestEntry:
+    file_stat = file_path.stat()
+
+    return ManifestEntry(
+        export_state=export_state,
+        notes=notes,
+        file_hash=file_hash,
+        file_size=file_stat.st_size,
+        file_mtime=file_stat.st_mtime_ns,
+        resources=resources,
+    )
+
+
+def get_file_hash(file_path: Path) -> str:
+    file_hash = hashlib.sha256()
+
+    with file_path.open("rb") as f:
+        for file_block in iter(lambda: f.read(HASH_READ_SIZE), b""):
+            file_hash.update(file_block)
+
+    return file_hash.hexdigest()
+
+
+def _remove_empty_dirs(dir_path: Path, top_dir: Path) -> None:
+    while dir_path != top_dir and top_dir in dir_path.parents:
+        if any(dir_path.iterdir()):
+            return
+
+        dir_path.rmdir()
+        dir_path = dir_path.parent
@@ -1,4 +1,9 @@
+import os
+import tempfile
+from collections import defaultdict
+from collections.abc import Callable, Iterable
 from pathlib import Path
+from typing import BinaryIO, Optional
 
 MAX_FILE_NAME_LEN = 255
 
@@ -10,13 +15,47 @@ class SafePath:
     safe_path.get("test_dir") == base_dir/test_dir
     safe_path.get("test_dir?|") == base_dir/test_dir__
     safe_path.get("test_dir||") == base_dir/test_dir__ (1)
+
+    With ignore_existing, only paths handed out by this instance count as taken,
+    so names don't depend on files left from previous exports.
+    Reclaimable paths are files on disk that may be taken again, e.g. ones
+    written by previous incremental export, other existing files still count.
+    Without create_dirs, paths are only computed, e.g. for archive member names.
+
+    Taken names are tracked in memory per directory, seeded by one scandir,
+    so picking a name for a thousandth "Untitled" note costs no disk access.
+    Reserved names are never handed out, not even with overwrite.
+
+    Whether names differing only in case clash is probed once in base directory,
+    paths that are only computed are assumed to clash, since archive
+    may be extracted anywhere.
     """
 
-    def __init__(self, base_dir: Path, overwrite: bool = False) -> None:
+    def __init__(
+        self,
+        base_dir: Path,
+        overwrite: bool = False,
+        ignore_existing: bool = False,
+        create_dirs: bool = True,
+        reclaimable: Iterable[Path] = (),
+    ) -> None:
         self.safe_paths: dict[tuple[str, ...], Path] = {}
+        self.dir_names: dict[Path, set[str]] = {}
+        self.reclaimable_names: dict[Path, list[str]] = defaultdict(list)
+        for reclaimable_path in reclaimable:
+            self.reclaimable_names[reclaimable_path.parent].append(
+                reclaimable_path.name
+            )
+        # Last collision number given out for a name, so next search starts there
+        self.name_counters: dict[tuple[Path, str], int] = {}
+        self.reserved_names: set[tuple[Path, str]] = set()
 
         self.main_base_dir = base_dir
         self.overwrite = overwrite
+        self.ignore_existing = ignore_existing
+        self.create_dirs = create_dirs
+
+        self._is_case_insensitive: Optional[bool] = None
 
     def get_file(self, *paths: str) -> Path:
         return self._get(*paths, is_dir=False, overwrite=self.overwrite)
@@ -24,6 +63,16 @@ class SafePath:
     def get(self, *paths: str) -> Path:
         return self._get(*paths, is_dir=True, overwrite=self.overwrite)
 
+    def reserve(self, name: str) -> Path:
+        """Claim name in base directory as is, other paths are numbered around it"""
+
+        name_key = self._get_name_key(name)
+
+        self._get_dir_names(self.main_base_dir).add(name_key)
+        self.reserved_names.add((self.main_base_dir, name_key))
+
+        return self.main_base_dir / name
+
     def _get(self, *paths: str, is_dir: bool, overwrite: bool) -> Path:
         if paths in self.safe_paths:
             return self.safe_paths[paths]  # noqa: WPS529
@@ -33,28 +82,129 @@ class SafePath:
             parent_dir = paths[:-1]
             base_dir = self._get(*parent_dir, is_dir=True, overwrite=True)
         else:
-            _ensure_path(self.main_base_dir)
+            if self.create_dirs:
+                _ensure_path(self.main_base_dir)
             base_dir = self.main_base_dir
 
-        this_path = paths[-1]
-
-        safe_path = _get_safe_path(base_dir, this_path, overwrite)
+        safe_path = self._get_safe_path(base_dir, paths[-1], overwrite)
 
         if is_dir:
-            safe_path.mkdir(exist_ok=True)
+            if self.create_dirs:
+                safe_path.mkdir(exist_ok=True)
             self.safe_paths[paths] = safe_path
 
         return safe_path
 
+    def _get_safe_path(self, target_dir: Path, new_name: str, overwrite: bool) -> Path:
+        file_name = _replace_bad_characters(new_name)
+        file_name = _trim_name(Path(file_name).stem, Path(file_name).suffix)
+
+        dir_names = self._get_dir_names(target_dir)
+
+        is_reserved = (target_dir, self._get_name_key(file_name)) in self.reserved_names
+
+        if not overwrite or is_reserved:
+            counter_key = (target_dir, file_name)
+
+            file_name, self.name_counters[counter_key] = _get_non_existant_name(
+                file_name,
+                lambda n: self._get_name_key(n) in dir_names,
+                self.name_counters.get(counter_key, 0),
+            )
+
+        dir_names.add(self._get_name_key(file_name))
 
-def _get_safe_path(target_dir: Path, new_name: str, overwrite: bool = False) -> Path:
-    file_name = _replace_bad_characters(new_name)
-    file_name = _trim_name(Path(file_name).stem, Path(file_name).suffix)
+        return target_dir / file_name
 
-    if not overwrite:
-        file_name = _get_non_existant_name(file_name, target_dir)
+    def _get_dir_names(self, dir_path: Path) -> set[str]:
+        if dir_path in self.dir_names:
+            return self.dir_names[dir_path]  # noqa: WPS529
 
-    return target_dir / file_name
+        dir_names = set()
+
+        # Probe before scanning, so probe file doesn't show up in scan
+        self._get_is_case_insensitive()
+
+        if not self.ignore_existing:
+            try:
+                with os.scandir(dir_path) as dir_entries:
+                    dir_names = {self._get_name_key(e.name) for e in dir_entries}
+            except (FileNotFoundError, NotADirectoryError):
+                pass
+
+            dir_names -= {
+                self._get_name_key(n) for n in self.reclaimable_names.get(dir_path, [])
+            }
+
+        self.dir_names[dir_path] = dir_names
+
+        return dir_names
+
+    def _get_name_key(self, file_name: str) -> str:
+        if self._get_is_case_insensitive():
+            return file_name.casefold()
+
+        return file_name
+
+    def _get_is_case_insensitive(self) -> bool:
+        if self._is_case_insensitive is None:
+            if self.create_dirs:
+                _ensure_path(self.main_base_dir)
+                self._is_case_insensitive = _is_case_insensitive_dir(self.main_base_dir)
+            else:
+                self._is_case_insensitive = True
+
+        return self._is_case_insensitive
+
+
+class ShardedFileWriter:
+    """Writes lines into files of limited size, numbered in order
+
+    Without size limit, all lines go into one file.
+    Files are created on first write, so no lines means no files.
+    """
+
+    def __init__(
+        self, safe_paths: SafePath, base_name: str, file_ext: str, shard_size: int
+    ) -> None:
+        self.safe_paths = safe_paths
+        self.base_name = base_name
+        self.file_ext = file_ext
+        self.shard_size = shard_size
+
+        self.files: list[Path] = []
+
+        self._shard: Optional[BinaryIO] = None
+        self._shard_written = 0
+
+    def write_line(self, line: str) -> None:
+        line_data = f"{line}\n".encode()
+
+        if self._shard is None:
+            self._shard = self._open_next_shard()
+
+        self._shard.write(line_data)
+        self._shard_written += len(line_data)
+
+        if self.shard_size and self._shard_written >= self.shard_size:
+            self.close()
+
+    def close(self) -> None:
+        if self._shard is not None:
+            self._shard.close()
+            self._shard = None
+
+    def _open_next_shard(self) -> BinaryIO:
+        if self.shard_size:
+            file_name = f"{self.base_name}-{len(self.files) + 1:05}{self.file_ext}"
+        else:
+            file_name = f"{self.base_name}{self.file_ext}"
+
+        shard_path = self.safe_paths.get_file(file_name)
+        self.files.append(shard_path)
+        self._shard_written = 0
+
+        return shard_path.open("wb")
 
 
 def _ensure_path(output_path: Path) -> None:
@@ -62,6 +212,23 @@ def _ensure_path(output_path: Path) -> None:
         output_path.mkdir(parents=True)
 
 
+def _is_case_insensitive_dir(dir_path: Path) -> bool:
+    """Checks if file system treats names differing only in case as the same file"""
+
+    probe_fd, probe_name = tempfile.mkstemp(prefix=".case-probe-", dir=dir_path)
+    os.close(probe_fd)
+    probe_path = Path(probe_name)
+
+    try:
+        probe_path.with_name(probe_path.name.upper()).stat()
+    except FileNotFoundError:
+        return False
+    else:
+        return True
+    finally:
+        probe_path.unlink()
+
+
 def _replace_bad_characters(string: str) -> str:
     bad = r'<>:"/\|?*'
 
@@ -72,21 +239,38 @@ def _replace_bad_characters(string: str) -> str:
     return result_string
 
 
-def _get_non_existant_name(file_name: str, target_dir: Path) -> str:
-    i = 0
+def _get_non_existant_name(
+    file_name: str,
+    is_taken: Callable[[str], bool],
+    start_index: int = 0,
+) -> tuple[str, int]:
+    """First free name, trying "name (i)" for i from start_index on
+
+    Returns the name along with its collision number, 0 if name is used as is.
+    """
+
+    i = start_index
     orig = Path(file_name)
 
-    while (target_dir / file_name).exists():
+    if i:
+        file_name = _get_numbered_name(orig, i)
+
+    while is_taken(file_name):
         i += 1
+        file_name = _get_numbered_name(orig, i)
+
+    return file_name, i
+
 
-        suffix = f" ({i}){orig.suffix}"
-        file_name = f"{orig.stem}{suffix}"
+def _get_numbered_name(orig: Path, i: int) -> str:
+    suffix = f" ({i}){orig.suffix}"
+    file_name = f"{orig.stem}{suffix}"
 
-        if len(file_name.encode("utf-8")) > MAX_FILE_NAME_LEN:
-            max_len = MAX_FILE_NAME_LEN - len(suffix.encode("utf-8"))
+    if len(file_name.encode("utf-8")) > MAX_FILE_NAME_LEN:
+        max_len = MAX_FILE_NAME_LEN - len(suffix.encode("utf-8"))
 
-            trimmed_name = _trim_name(orig.stem, "", max_len)
-            file_name = f"{trimmed_name}{suffix}"
+        trimmed_name = _trim_name(orig.stem, "", max_len)
+        file_name = f"{trimmed_name}{suffix}"
 
     return file_name
 
@@ -126,12 +310,10 @@ def _trim_name(file_name: str, file_ext: str, max_len: int = MAX_FILE_NAME_LEN)
 
 
 def _trim_string(string: str, max_len: int) -> str:
+    """Longest prefix of whole characters that fits into max_len UTF-8 bytes"""
+
     if max_len <= 0:
         return ""
 
-    chars = list(string)
-
-    while sum(len(c.encode("utf-8")) for c in chars) > max_len:
-        chars.pop(-1)
-
-    return "".join(chars)
+    # Cut may land inside a multibyte character, its leftover bytes are dropped
+    return string.encode("utf-8")[:max_len].decode("utf-8", "ignore")
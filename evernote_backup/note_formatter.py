@@ -1,20 +1,24 @@
+import io
 import json
 import re
 import uuid
-from typing import Optional
+from collections.abc import Callable
+from typing import Optional, TextIO
 
 import xmltodict
 from evernote.edam.type.ttypes import Note, Resource
 
 from evernote_backup.evernote_types import Reminder, Task
-from evernote_backup.note_formatter_util import fmt_binary, fmt_content, fmt_time
+from evernote_backup.note_formatter_util import fmt_content, fmt_time, write_binary
+
+RawWriter = Callable[[TextIO], object]
 
 
 class NoteFormatter:
     """https://xml.evernote.com/pub/evernote-export3.dtd"""
 
     def __init__(self, add_guid: bool = False, add_metadata: bool = False) -> None:
-        self._raw_elements: dict = {}
+        self._raw_elements: dict[str, RawWriter] = {}
         self.add_guid = add_guid
         self.add_metadata = add_metadata
 
@@ -24,6 +28,25 @@ class NoteFormatter:
         notebook_name: str,
         note_tasks: list[Task],
     ) -> str:
+        out = io.StringIO()
+
+        self.write_note(out, note, notebook_name, note_tasks)
+
+        return out.getvalue()
+
+    def write_note(
+        self,
+        out: TextIO,
+        note: Note,
+        notebook_name: str,
+        note_tasks: list[Task],
+    ) -> None:
+        """Write note element piece by piece, without building it as one string
+
+        Only the note skeleton is rendered in memory, with placeholders
+        for content and resource bodies. These are written straight to output.
+        """
+
         self._raw_elements = {}
 
         note_skeleton = {
@@ -33,7 +56,7 @@ class NoteFormatter:
                 "updated": fmt_time(note.updated),
                 "tag": note.tagNames,
                 "note-attributes": {},
-                "content": self._fmt_raw(fmt_content(note.content)),
+                "content": self._fmt_raw_text(fmt_content(note.content)),
                 "resource": map(self._fmt_resource, note.resources or []),
                 "task": map(self._fmt_task, note_tasks or []),
             }
@@ -81,16 +104,26 @@ class NoteFormatter:
         # Remove empty tags
         note_template = re.sub(r"^\s+<.*?/>\n", "", note_template, flags=re.M)
 
-        for r_uuid, r_body in self._raw_elements.items():
-            note_template = note_template.replace(r_uuid, r_body)
+        if not self._raw_elements:
+            out.write(note_template)
+            return
+
+        raw_pattern = "|".join(map(re.escape, self._raw_elements))
 
-        return str(note_template)
+        # Capturing split alternates template text and placeholders
+        for i, template_part in enumerate(re.split(f"({raw_pattern})", note_template)):
+            if i % 2:
+                self._raw_elements[template_part](out)
+            else:
+                out.write(template_part)
 
     def _fmt_resource(self, resource: Resource) -> dict:
         return {
             "data": {
                 "@encoding": "base64",
-                "#text": self._fmt_raw(fmt_binary(resource.data.body)),
+                "#text": self._fmt_raw(
+                    lambda out: write_binary(out, resource.data.body)
+                ),
             },
             "mime": resource.mime,
             "width": resource.width,
@@ -110,11 +143,14 @@ class NoteFormatter:
             },
         }
 
-    def _fmt_raw(self, body: Optional[str]) -> Optional[str]:
+    def _fmt_raw_text(self, body: Optional[str]) -> Optional[str]:
         if body is None:
             return body
+        return self._fmt_raw(lambda out: out.write(body))
+
+    def _fmt_raw(self, raw_writer: RawWriter) -> str:
         content_uuid = str(uuid.uuid4())
-        self._raw_elements[content_uuid] = body
+        self._raw_elements[content_uuid] = raw_writer
         return content_uuid
 
     # <!ELEMENT task
@@ -0,0 +1,559 @@
+import hashlib
+import json
+import re
+from abc import ABC, abstractmethod
+from html import escape
+from html.parser import HTMLParser
+from typing import Optional, TextIO
+
+from evernote.edam.type.ttypes import Note, Resource
+
+from evernote_backup.evernote_types import Task
+from evernote_backup.note_formatter_util import fmt_time
+
+# ENML is fed to parser in pieces of this size, output is written as it goes
+ENML_FEED_SIZE = 64 * 1024
+
+HTML_VOID_TAGS = frozenset(("area", "br", "col", "hr", "img", "wbr"))
+MARKDOWN_SPECIAL_CHARS = re.compile(r"([\\`*_\[\]<>])")
+MARKDOWN_HEADINGS = {f"h{n}": n for n in range(1, 7)}
+MARKDOWN_INLINE_MARKS = {
+    "b": "**",
+    "strong": "**",
+    "i": "*",
+    "em": "*",
+    "s": "~~",
+    "strike": "~~",
+    "del": "~~",
+}
+
+ENCRYPTED_CONTENT_TEXT = "[Encrypted content]"
+# Evernote marks code blocks with a style on <div> instead of using <pre>
+CODEBLOCK_STYLE = re.compile(r"-en-codeblock\s*:\s*true")
+
+
+def get_resource_hash(resource: Resource) -> Optional[str]:
+    """Hex body hash, same as en-media elements refer to the resource with"""
+
+    if resource.data is None:
+        return None
+
+    if resource.data.bodyHash:
+        return str(resource.data.bodyHash.hex())
+
+    if resource.data.body is not None:
+        return hashlib.md5(resource.data.body).hexdigest()  # noqa: S324
+
+    return None
+
+
+class _EnmlConverter(HTMLParser, ABC):
+    def __init__(
+        self,
+        out: TextIO,
+        resources: dict[str, Resource],
+        resource_links: dict[str, str],
+    ) -> None:
+        super().__init__(convert_charrefs=True)
+
+        self.out = out
+        self.resources = resources
+        self.resource_links = resource_links
+
+        self._crypt_depth = 0
+
+    def convert(self, content: Optional[str]) -> None:
+        if not content:
+            return
+
+        for feed_start in range(0, len(content), ENML_FEED_SIZE):
+            self.feed(content[feed_start : feed_start + ENML_FEED_SIZE])
+
+        self.close()
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        if tag == "en-crypt":
+            self._crypt_depth += 1
+            self.write_crypt()
+            return
+
+        self.start_tag(tag, dict(attrs))
+
+    def handle_startendtag(self, tag: str, attrs: list) -> None:
+        if tag == "en-crypt":
+            self.write_crypt()
+            return
+
+        self.start_tag(tag, dict(attrs))
+        self.end_tag(tag)
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "en-crypt":
+            self._crypt_depth = max(self._crypt_depth - 1, 0)
+            return
+
+        self.end_tag(tag)
+
+    def handle_data(self, data: str) -> None:
+        if self._crypt_depth:
+            return
+
+        self.write_data(data)
+
+    def get_media(self, attrs: dict) -> tuple[Optional[str], str, bool]:
+        """Link to resource file, its display name and whether it is an image"""
+
+        media_hash = attrs.get("hash") or ""
+        media_type = attrs.get("type") or ""
+
+        resource = self.resources.get(media_hash)
+
+        media_name = media_hash
+        if resource is not None and resource.attributes:
+            media_name = resource.attributes.fileName or media_hash
+
+        return (
+            self.resource_links.get(media_hash),
+            media_name,
+            media_type.startswith("image/"),
+        )
+
+    @abstractmethod
+    def start_tag(self, tag: str, attrs: dict) -> None:
+        """Write opening of element"""
+
+    @abstractmethod
+    def end_tag(self, tag: str) -> None:
+        """Write closing of element"""
+
+    @abstractmethod
+    def write_data(self, data: str) -> None:
+        """Write text found between elements"""
+
+    @abstractmethod
+    def write_crypt(self) -> None:
+        """Write placeholder for encrypted content"""
+
+
+class _EnmlToHtml(_EnmlConverter):
+    def start_tag(self, tag: str, attrs: dict) -> None:
+        if tag == "en-note":
+            return
+
+        if tag == "en-todo":
+            checked = " checked" if attrs.get("checked") == "true" else ""
+            self.out.write(f'<input type="checkbox" disabled{checked}>')
+            return
+
+        if tag == "en-media":
+            self._write_media(attrs)
+            return
+
+        attrs_html = "".join(
+            f' {name}="{escape(value or "")}"' for name, value in attrs.items()
+        )
+        self.out.write(f"<{tag}{attrs_html}>")
+
+    def end_tag(self, tag: str) -> None:
+        if tag in {"en-note", "en-todo", "en-media"} or tag in HTML_VOID_TAGS:
+            return
+
+        self.out.write(f"</{tag}>")
+
+    def write_data(self, data: str) -> None:
+        self.out.write(escape(data, quote=False))
+
+    def write_crypt(self) -> None:
+        self.out.write(f"<pre>{ENCRYPTED_CONTENT_TEXT}</pre>")
+
+    def _write_media(self, attrs: dict) -> None:
+        media_link, media_name, is_image = self.get_media(attrs)
+
+        if media_link is None:
+            return
+
+        if is_image:
+            self.out.write(
+                f'<img src="{escape(media_link)}" alt="{escape(media_name)}">'
+            )
+        else:
+            self.out.write(
+                f'<a href="{escape(media_link)}">{escape(media_name, quote=False)}</a>'
+            )
+
+
+class _EnmlToMarkdown(_EnmlConverter):
+    def __init__(
+        self,
+        out: TextIO,
+        resources: dict[str, Resource],
+        resource_links: dict[str, str],
+    ) -> None:
+        super().__init__(out, resources, resource_links)
+
+        # Output starts as if after a blank line, so no leading newlines
+        self._trailing_newlines = 2
+        self._pending_newlines = 0
+        self._quote_depth = 0
+        self._pre_depth = 0
+        self._lists: list[list[int]] = []
+        self._divs: list[bool] = []
+        self._links: list[Optional[str]] = []
+        self._table_cells: Optional[int] = None
+        self._table_rows = 0
+
+    def start_tag(self, tag: str, attrs: dict) -> None:
+        if tag in MARKDOWN_HEADINGS:
+            self._break(2)
+            self._write("#" * MARKDOWN_HEADINGS[tag] + " ")
+        elif tag in MARKDOWN_INLINE_MARKS:
+            self._write(MARKDOWN_INLINE_MARKS[tag])
+        elif tag == "div":
+            is_codeblock = bool(CODEBLOCK_STYLE.search(attrs.get("style") or ""))
+            self._divs.append(is_codeblock)
+            if is_codeblock:
+                self._start_pre()
+            else:
+                self._break(self._div_newlines)
+        elif tag == "p":
+            self._break(2)
+        elif tag == "br":
+            self._write_line_break()
+        elif tag == "a":
+            href = attrs.get("href")
+            self._links.append(href)
+            if href:
+                self._write("[")
+        elif tag in {"ul", "ol"}:
+            self._break(1)
+            self._lists.append([int(tag == "ol")])
+        elif tag == "li":
+            self._start_list_item()
+        elif tag == "en-todo":
+            checked = "x" if attrs.get("checked") == "true" else " "
+            marker = "" if self._lists else "- "
+            self._write(f"{marker}[{checked}] ")
+        elif tag == "en-media":
+            self._write_media(attrs)
+        elif tag == "hr":
+            self._break(2)
+            self._write("---")
+            self._break(2)
+        elif tag == "pre":
+            self._start_pre()
+        elif tag == "code" and not self._pre_depth:
+            self._write("`")
+        elif tag == "blockquote":
+            self._break(2)
+            self._quote_depth += 1
+        elif tag == "table":
+            self._break(2)
+            self._table_rows = 0
+        elif tag == "tr":
+            self._break(1)
+            self._table_cells = 0
+            self._write("|")
+        elif tag in {"td", "th"}:
+            self._write(" ")
+
+    def end_tag(self, tag: str) -> None:
+        if tag in MARKDOWN_HEADINGS:
+            self._break(2)
+        elif tag in MARKDOWN_INLINE_MARKS:
+            self._write(MARKDOWN_INLINE_MARKS[tag])
+        elif tag == "div":
+            is_codeblock = self._divs.pop() if self._divs else False
+            if is_codeblock:
+                self._end_pre()
+            else:
+                self._break(self._div_newlines)
+        elif tag in {"p", "li"}:
+            self._break(2 if tag == "p" else 1)
+        elif tag == "a":
+            href = self._links.pop() if self._links else None
+            if href:
+                self._write(f"]({_fmt_link(href)})")
+        elif tag in {"ul", "ol"}:
+            if self._lists:
+                self._lists.pop()
+            self._break(1 if self._lists else 2)
+        elif tag == "pre":
+            self._end_pre()
+        elif tag == "code" and not self._pre_depth:
+            self._write("`")
+        elif tag == "blockquote":
+            self._quote_depth = max(self._quote_depth - 1, 0)
+            self._break(2)
+        elif tag == "table":
+            self._table_cells = None
+            self._break(2)
+        elif tag in {"td", "th"} and self._table_cells is not None:
+            self._table_cells += 1
+            self._write(" |")
+        elif tag == "tr":
+            self._end_table_row()
+
+    def write_data(self, data: str) -> None:
+        if self._pre_depth:
+            self._write(data, is_raw=True)
+            return
+
+        text = re.sub(r"\s+", " ", data)
+        text = MARKDOWN_SPECIAL_CHARS.sub(r"\\\1", text)
+        if self._table_cells is not None:
+            text = text.replace("|", "\\|")
+
+        if self._trailing_newlines or self._pending_newlines:
+            text = text.lstrip()
+
+        self._write(text)
+
+    def write_crypt(self) -> None:
+        self._write(ENCRYPTED_CONTENT_TEXT.replace("[", "\\[").replace("]", "\\]"))
+
+    def finish(self) -> None:
+        if not self._trailing_newlines:
+            self.out.write("\n")
+
+    def _start_list_item(self) -> None:
+        self._break(1)
+
+        if not self._lists:
+            self._write("- ")
+            return
+
+        list_state = self._lists[-1]
+        indent = "    " * (len(self._lists) - 1)
+
+        if list_state[0]:
+            self._write(f"{indent}{list_state[0]}. ", is_raw=True)
+            list_state[0] += 1
+        else:
+            self._write(f"{indent}- ", is_raw=True)
+
+    @property
+    def _div_newlines(self) -> int:
+        # Evernote puts every line into its own <div>, these become paragraphs
+        return 1 if self._lists or self._pre_depth else 2
+
+    def _write_line_break(self) -> None:
+        if self._pre_depth:
+            # Empty lines matter in code, so they are written right away
+            self._write("\n", is_raw=True)
+        elif not (self._trailing_newlines or self._pending_newlines):
+            self._write("\\")
+            self._break(1)
+
+    def _start_pre(self) -> None:
+        if not self._pre_depth:
+            self._break(2)
+            self._write("```")
+            self._break(1)
+
+        self._pre_depth += 1
+
+    def _end_pre(self) -> None:
+        self._pre_depth = max(self._pre_depth - 1, 0)
+
+        if not self._pre_depth:
+            self._break(1)
+            self._write("```")
+            self._break(2)
+
+    def _end_table_row(self) -> None:
+        row_cells = self._table_cells
+        self._table_cells = None
+
+        if row_cells is None:
+            return
+
+        if self._table_rows == 0 and row_cells:
+            self._break(1)
+            self._write("|" + " --- |" * row_cells)
+
+        self._table_rows += 1
+        self._break(1)
+
+    def _write_media(self, attrs: dict) -> None:
+        media_link, media_name, is_image = self.get_media(attrs)
+
+        if media_link is None:
+            return
+
+        media_name = MARKDOWN_SPECIAL_CHARS.sub(r"\\\1", media_name)
+
+        image_mark = "!" if is_image else ""
+        self._write(f"{image_mark}[{media_name}]({_fmt_link(media_link)})")
+
+    def _break(self, newlines: int) -> None:
+        if self._table_cells is not None:
+            # Table row must stay on one line
+            return
+
+        self._pending_newlines = max(self._pending_newlines, newlines)
+
+    def _write(self, text: str, is_raw: bool = False) -> None:
+        if not text:
+            return
+
+        newlines = max(self._pending_newlines - self._trailing_newlines, 0)
+        if newlines:
+            self.out.write("\n" * newlines)
+            self._trailing_newlines += newlines
+        self._pending_newlines = 0
+
+        if self._trailing_newlines and self._quote_depth:
+            self.out.write("> " * self._quote_depth)
+
+        if self._trailing_newlines and self._lists and not is_raw:
+            self.out.write("    " * len(self._lists))
+
+        self.out.write(text)
+
+        text_end = text.rstrip("\n")
+        if text_end:
+            self._trailing_newlines = len(text) - len(text_end)
+        else:
+            self._trailing_newlines += len(text)
+
+
+class MarkdownNoteFormatter:
+    """Note as Markdown document, with metadata in YAML front matter"""
+
+    def __init__(self, add_guid: bool = False, add_metadata: bool = False) -> None:
+        self.add_guid = add_guid
+        self.add_metadata = add_metadata
+
+    def write_note(
+        self,
+        out: TextIO,
+        note: Note,
+        notebook_name: str,
+        note_tasks: list[Task],
+        resource_links: dict[str, str],
+    ) -> None:
+        out.write("---\n")
+
+        for field_name, field_value in _get_note_fields(
+            note, notebook_name, self.add_guid, self.add_metadata
+        ):
+            out.write(f"{field_name}: {json.dumps(field_value, ensure_ascii=False)}\n")
+
+        out.write("---\n\n")
+
+        title = MARKDOWN_SPECIAL_CHARS.sub(r"\\\1", note.title or "")
+        out.write(f"# {title}\n\n")
+
+        converter = _EnmlToMarkdown(out, _get_note_resources(note), resource_links)
+        converter.convert(note.content)
+        converter.finish()
+
+        if note_tasks:
+            out.write("\n## Tasks\n\n")
+            for task in note_tasks:
+                checked = "x" if task.status == "completed" else " "
+                label = MARKDOWN_SPECIAL_CHARS.sub(r"\\\1", task.label or "")
+                out.write(f"- [{checked}] {label}\n")
+
+
+class HtmlNoteFormatter:
+    """Note as standalone HTML document, with metadata in <meta> tags"""
+
+    def __init__(self, add_guid: bool = False, add_metadata: bool = False) -> None:
+        self.add_guid = add_guid
+        self.add_metadata = add_metadata
+
+    def write_note(
+        self,
+        out: TextIO,
+        note: Note,
+        notebook_name: str,
+        note_tasks: list[Task],
+        resource_links: dict[str, str],
+    ) -> None:
+        title = escape(note.title or "", quote=False)
+
+        out.write('<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n')
+        out.write(f"<title>{title}</title>\n")
+
+        for field_name, field_value in _get_note_fields(
+            note, notebook_name, self.add_guid, self.add_metadata
+        ):
+            if field_name == "title":
+                continue
+            if isinstance(field_value, list):
+                field_value = ", ".join(map(str, field_value))
+            out.write(
+                f'<meta name="{field_name}" content="{escape(str(field_value))}">\n'
+            )
+
+        out.write(f"</head>\n<body>\n<h1>{title}</h1>\n<div>\n")
+
+        converter = _EnmlToHtml(out, _get_note_resources(note), resource_links)
+        converter.convert(note.content)
+
+        out.write("\n</div>\n")
+
+        if note_tasks:
+            out.write("<h2>Tasks</h2>\n<ul>\n")
+            for task in note_tasks:
+                checked = " checked" if task.status == "completed" else ""
+                label = escape(task.label or "", quote=False)
+                out.write(
+                    f'<li><input type="checkbox" disabled{checked}> {label}</li>\n'
+                )
+            out.write("</ul>\n")
+
+        out.write("</body>\n</html>\n")
+
+
+def _get_note_resources(note: Note) -> dict[str, Resource]:
+    note_resources = {}
+    for resource in note.resources or []:
+        resource_hash = get_resource_hash(resource)
+        if resource_hash is not None:
+            note_resources[resource_hash] = resource
+
+    return note_resources
+
+
+def _get_note_fields(
+    note: Note, notebook_name: str, add_guid: bool, add_metadata: bool
+) -> list[tuple[str, object]]:
+    note_fields: list[tuple[str, object]] = [
+        ("title", note.title or ""),
+        ("created", fmt_time(note.created)),
+        ("updated", fmt_time(note.updated)),
+    ]
+
+    if note.tagNames:
+        note_fields.append(("tags", sorted(note.tagNames)))
+
+    if note.attributes:
+        note_fields.extend(
+            (
+                ("author", note.attributes.author),
+                ("source-url", note.attributes.sourceURL),
+            )
+        )
+
+    if add_guid:
+        note_fields.append(("guid", note.guid))
+
+    if add_metadata:
+        note_fields.extend(
+            (
+                ("notebook-guid", note.notebookGuid),
+                ("notebook-name", notebook_name),
+                ("is-active", note.active),
+            )
+        )
+
+    return [(name, value) for name, value in note_fields if value is not None]
+
+
+def _fmt_link(link: str) -> str:
+    # Angle brackets allow spaces and parentheses in Markdown link targets
+    if re.search(r"[\s()]", link):
+        return f"<{link}>"
+    return link
@@ -0,0 +1,95 @@
+import base64
+import dataclasses
+import json
+from typing import Any, Optional
+
+from evernote.edam.type.ttypes import Note, Notebook, Resource
+
+from evernote_backup.evernote_types import Task
+from evernote_backup.note_formatter_enml import get_resource_hash
+from evernote_backup.note_search_util import extract_text
+
+
+class JsonlNoteFormatter:
+    """Note as one compact JSON record, timestamps are kept in milliseconds
+
+    Resource bodies are referenced by hash, unless add_resource_bodies is set.
+    """
+
+    def __init__(self, add_resource_bodies: bool = False) -> None:
+        self.add_resource_bodies = add_resource_bodies
+
+    def format_note(
+        self,
+        note: Note,
+        notebook: Optional[Notebook],
+        note_tasks: list[Task],
+    ) -> str:
+        note_record = {
+            "guid": note.guid,
+            "title": note.title,
+            "notebook_guid": note.notebookGuid,
+            "notebook_name": notebook.name if notebook else None,
+            "stack": notebook.stack if notebook else None,
+            "created": note.created,
+            "updated": note.updated,
+            "deleted": note.deleted,
+            "is_active": note.active,
+            "usn": note.updateSequenceNum,
+            "tags": note.tagNames or [],
+            "attributes": _fmt_attributes(note.attributes),
+            "text": extract_text(note.content),
+            "content": note.content,
+            "resources": [self._fmt_resource(r) for r in note.resources or []],
+            "tasks": [dataclasses.asdict(t) for t in note_tasks],
+        }
+
+        return json.dumps(note_record, ensure_ascii=False, separators=(",", ":"))
+
+    def _fmt_resource(self, resource: Resource) -> dict[str, Any]:
+        resource_body = resource.data.body if resource.data else None
+
+        resource_record = {
+            "guid": resource.guid,
+            "hash": get_resource_hash(resource),
+            "mime": resource.mime,
+            "size": _get_resource_size(resource),
+            "width": resource.width,
+            "height": resource.height,
+            "attributes": _fmt_attributes(resource.attributes),
+        }
+
+        if self.add_resource_bodies:
+            resource_record["body"] = (
+                base64.b64encode(resource_body).decode()
+                if resource_body is not None
+                else None
+            )
+
+        return resource_record
+
+
+def _get_resource_size(resource: Resource) -> Optional[int]:
+    if resource.data is None:
+        return None
+
+    if resource.data.size is not None:
+        return int(resource.data.size)
+
+    if resource.data.body is not None:
+        return len(resource.data.body)
+
+    return None
+
+
+def _fmt_attributes(attributes: Any) -> dict[str, Any]:
+    """Thrift attributes struct as dict, with plain values only"""
+
+    if attributes is None:
+        return {}
+
+    return {
+        field_name: field_value
+        for field_name, field_value in vars(attributes).items()
+        if isinstance(field_value, (str, int, float, dict))
+    }
@@ -1,7 +1,11 @@
 import base64
 import sys
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Optional, TextIO
+
+BINARY_LINE_WIDTH = 120
+# Whole number of lines, so blocks can be encoded independently
+BINARY_BLOCK_SIZE = BINARY_LINE_WIDTH // 4 * 3 * 8192
 
 
 def fmt_utcfromtimestamp(timestamp: int) -> datetime:
@@ -26,14 +30,30 @@ def fmt_time(timestamp: Optional[int]) -> Optional[str]:
 
 
 def fmt_binary(binary_data: bytes) -> str:
-    slice_width = 120
     return (
         "\n"
-        + _slice_str(base64.b64encode(binary_data).decode(), slice_width)
+        + _slice_str(base64.b64encode(binary_data).decode(), BINARY_LINE_WIDTH)
         + "\n      "
     )
 
 
+def write_binary(out: TextIO, binary_data: bytes) -> None:
+    """Same output as fmt_binary, without holding whole encoded body in memory"""
+
+    out.write("\n")
+
+    binary_view = memoryview(binary_data)
+    for block_start in range(0, len(binary_view), BINARY_BLOCK_SIZE):
+        block = binary_view[block_start : block_start + BINARY_BLOCK_SIZE]
+
+        if block_start:
+            out.write("\n")
+
+        out.write(_slice_str(base64.b64encode(block).decode(), BINARY_LINE_WIDTH))
+
+    out.write("\n      ")
+
+
 def fmt_content(content_body: Optional[str]) -> Optional[str]:
     if content_body is None:
         return content_body
@@ -2,8 +2,6 @@ import logging
 from collections.abc import Iterable
 from typing import Optional
 
-from evernote.edam.type.ttypes import Note
-
 from evernote_backup.note_storage import SqliteStorage
 
 logger = logging.getLogger(__name__)
@@ -35,12 +33,14 @@ class NoteLister:
             logger.info(nb.name)
 
             if self.is_list_all or self.notebook:
-                notes = _sorted_note_titles(self.storage.notes.iter_notes(nb.guid))
+                notes = _sorted_note_titles(self.storage.notes.get_note_titles(nb.guid))
                 for n in notes:
                     logger.info(f"- '{n}'")
 
         if self.is_list_all:
-            trash_notes = _sorted_note_titles(self.storage.notes.iter_notes_trash())
+            trash_notes = _sorted_note_titles(
+                self.storage.notes.get_note_titles_trash()
+            )
 
             if trash_notes:
                 logger.info("---")
@@ -50,5 +50,5 @@ class NoteLister:
                     logger.info(f"- '{n}'")
 
 
-def _sorted_note_titles(notes_source: Iterable[Note]) -> list[str]:
-    return sorted((n.title for n in notes_source), key=lambda t: t.lower())
+def _sorted_note_titles(titles: Iterable[str]) -> list[str]:
+    return sorted(titles, key=lambda t: t.lower())
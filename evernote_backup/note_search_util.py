@@ -0,0 +1,81 @@
+from html.parser import HTMLParser
+from typing import NamedTuple, Optional
+
+from evernote.edam.type.ttypes import Note
+
+# Tags that separate words in rendered note, without them text would run together
+BLOCK_TAGS = frozenset(
+    (
+        "br",
+        "div",
+        "en-media",
+        "en-todo",
+        "h1",
+        "h2",
+        "h3",
+        "h4",
+        "h5",
+        "h6",
+        "hr",
+        "item",
+        "li",
+        "p",
+        "t",
+        "td",
+        "th",
+        "tr",
+    )
+)
+
+
+class NoteSearchText(NamedTuple):
+    title: str
+    content: str
+    tags: str
+    recognition: str
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+
+        self.parts: list[str] = []
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        if tag in BLOCK_TAGS:
+            self.parts.append(" ")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in BLOCK_TAGS:
+            self.parts.append(" ")
+
+    def handle_data(self, data: str) -> None:
+        self.parts.append(data)
+
+
+def extract_text(markup: Optional[str]) -> str:
+    """Plain text of ENML or recognition XML, with whitespace collapsed"""
+
+    if not markup:
+        return ""
+
+    parser = _TextExtractor()
+    parser.feed(markup)
+    parser.close()
+
+    return " ".join("".join(parser.parts).split())
+
+
+def get_note_search_text(note: Note) -> NoteSearchText:
+    recognition = []
+    for resource in note.resources or []:
+        if resource.recognition and resource.recognition.body:
+            recognition_xml = resource.recognition.body.decode("utf-8", "replace")
+            recognition.append(extract_text(recognition_xml))
+
+    return NoteSearchText(
+        title=note.title or "",
+        content=extract_text(note.content),
+        tags=" ".join(note.tagNames or []),
+        recognition=" ".join(recognition),
+    )
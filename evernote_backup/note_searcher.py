@@ -0,0 +1,101 @@
+import logging
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Optional
+
+from evernote_backup.cli_app_util import ProgramTerminatedError, get_timestamp
+from evernote_backup.note_formatter_util import fmt_utcfromtimestamp
+from evernote_backup.note_storage import (
+    SearchNotAvailableError,
+    SearchResult,
+    SqliteStorage,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class NoteSearcher:
+    def __init__(  # noqa: WPS211
+        self,
+        storage: SqliteStorage,
+        filter_notebooks: tuple[str, ...],
+        filter_tags: tuple[str, ...],
+        date_from: Optional[datetime],
+        date_to: Optional[datetime],
+        include_trash: bool,
+        limit: int,
+    ) -> None:
+        self.storage = storage
+        self.filter_notebooks = filter_notebooks
+        self.filter_tags = filter_tags
+        self.date_from = date_from
+        self.date_to = date_to
+        self.include_trash = include_trash
+        self.limit = limit
+
+    def search(self, query: str) -> None:
+        notebook_guids = self._get_notebook_guids()
+
+        if self.filter_notebooks and not notebook_guids:
+            logger.info("No notes found.")
+            return
+
+        # Whole day of end date is included
+        updated_to = None
+        if self.date_to:
+            updated_to = get_timestamp(self.date_to + timedelta(days=1))
+
+        try:
+            results = self.storage.notes.search_notes(
+                query,
+                notebook_guids=notebook_guids,
+                tags=self.filter_tags,
+                updated_from=get_timestamp(self.date_from),
+                updated_to=updated_to,
+                include_trash=self.include_trash,
+                limit=self.limit,
+            )
+        except SearchNotAvailableError as e:
+            raise ProgramTerminatedError(e)
+        except sqlite3.OperationalError as e:
+            raise ProgramTerminatedError(f"Invalid search query: {e}")
+
+        if not results:
+            logger.info("No notes found.")
+            return
+
+        logger.info(f"Found notes: {len(results)}")
+
+        for result in results:
+            logger.info("---")
+            logger.info(_format_result(result))
+            logger.info(f"  {result.snippet}")
+
+    def _get_notebook_guids(self) -> list[str]:
+        if not self.filter_notebooks:
+            return []
+
+        notebooks = [
+            nb
+            for nb in self.storage.notebooks.iter_notebooks()
+            if nb.name in self.filter_notebooks
+        ]
+
+        missed_notebooks = set(self.filter_notebooks) - {nb.name for nb in notebooks}
+
+        for n in missed_notebooks:
+            logger.warning(f"Notebook '{n}' not found in database.")
+
+        return [nb.guid for nb in notebooks]
+
+
+def _format_result(result: SearchResult) -> str:
+    notebook_name = result.notebook_name if result.is_active else "Trash"
+
+    result_txt = f"'{result.title}' [{notebook_name}]"
+
+    if result.updated is not None:
+        updated = fmt_utcfromtimestamp(result.updated // 1000)
+        result_txt += f" {updated:%Y-%m-%d}"
+
+    return result_txt
@@ -1,24 +1,155 @@
+import hashlib
 import logging
 import lzma
 import pickle
 import sqlite3
-from collections.abc import Iterable, Iterator
+import zlib
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
 from pathlib import Path
-from typing import NamedTuple, Optional, Union
+from types import TracebackType
+from typing import Any, Literal, NamedTuple, Optional, Union
 
-from evernote.edam.type.ttypes import LinkedNotebook, Note, Notebook
+from evernote.edam.type.ttypes import LinkedNotebook, Note, Notebook, Resource
+from thrift.protocol.TBinaryProtocol import TBinaryProtocolAcceleratedFactory
+from thrift.TSerialization import deserialize, serialize
 
 from evernote_backup.config import CURRENT_DB_VERSION
 from evernote_backup.evernote_types import Reminder, Task
 from evernote_backup.log_util import log_format_note, log_format_notebook
+from evernote_backup.note_search_util import NoteSearchText, get_note_search_text
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
 
 logger = logging.getLogger(__name__)
 
+RECOMPRESS_BATCH_SIZE = 100
+SEARCH_INDEX_BATCH_SIZE = 100
+# bm25() weights for title, content, tags and recognition columns
+SEARCH_RANK_WEIGHTS = (10.0, 1.0, 5.0, 1.0)
+
 
 class NoteForSync(NamedTuple):
     guid: str
     title: str
     linked_notebook_guid: Optional[str]
+    known_resource_hashes: frozenset[bytes] = frozenset()
+
+
+class NoteMetadata(NamedTuple):
+    created: Optional[int]
+    updated: Optional[int]
+    content_length: Optional[int]
+    resources_size: int
+    resources_count: int
+    tag_names: tuple[str, ...]
+
+
+class EncodedNote(NamedTuple):
+    guid: str
+    title: str
+    notebook_guid: str
+    is_active: bool
+    raw_note: bytes
+    usn: Optional[int]
+    content_hash: Optional[bytes]
+    resource_hashes: str
+    codec: str
+    metadata: NoteMetadata
+    search_text: NoteSearchText
+    # Compressed resource bodies, None for ones already in database
+    resources: dict[bytes, Optional[bytes]]
+    # Uncompressed bodies of resources that were in database when note was encoded,
+    # in case another note drops them before this one is written
+    reused_bodies: dict[bytes, bytes]
+
+    @property
+    def size(self) -> int:
+        return (
+            len(self.raw_note)
+            + sum(len(r or b"") for r in self.resources.values())
+            + sum(len(r) for r in self.reused_bodies.values())
+        )
+
+
+class ExportNote(NamedTuple):
+    guid: str
+    title: str
+    usn: Optional[int]
+
+
+class NoteFilter(NamedTuple):
+    """Conditions on stored note metadata, timestamps are in milliseconds
+
+    Notes having any of the tags are selected, "after" bounds are inclusive,
+    "before" bounds are exclusive.
+    """
+
+    tags: tuple[str, ...] = ()
+    created_after: Optional[int] = None
+    created_before: Optional[int] = None
+    updated_after: Optional[int] = None
+    updated_before: Optional[int] = None
+
+
+class SearchResult(NamedTuple):
+    guid: str
+    title: str
+    notebook_name: Optional[str]
+    is_active: bool
+    updated: Optional[int]
+    snippet: str
+
+
+class StorageProfile(NamedTuple):
+    journal_mode: str
+    synchronous: str
+    mmap_size: int
+    cache_size: int
+    temp_store: str
+    # Only takes effect for new databases
+    page_size: int
+
+
+STORAGE_PROFILES = {
+    # SQLite defaults, durable commit on every write
+    "default": StorageProfile(
+        journal_mode="DELETE",
+        synchronous="FULL",
+        mmap_size=0,
+        cache_size=-2000,
+        temp_store="DEFAULT",
+        page_size=4096,
+    ),
+    # WAL requires shared memory, so it is only usable on local disks
+    "fast": StorageProfile(
+        journal_mode="WAL",
+        synchronous="NORMAL",
+        mmap_size=256 * 1024 * 1024,
+        cache_size=-64 * 1024,
+        temp_store="MEMORY",
+        page_size=16384,
+    ),
+    # For databases on network shares, where WAL and mmap are unsafe
+    "network": StorageProfile(
+        journal_mode="TRUNCATE",
+        synchronous="NORMAL",
+        mmap_size=0,
+        cache_size=-64 * 1024,
+        temp_store="MEMORY",
+        page_size=16384,
+    ),
+}
+
+
+class NoteSyncState(NamedTuple):
+    usn: Optional[int]
+    content_hash: Optional[bytes]
+    resource_hashes: Optional[str]
 
 
 DB_SCHEMA = """CREATE TABLE IF NOT EXISTS notebooks(
@@ -36,24 +167,64 @@ DB_SCHEMA = """CREATE TABLE IF NOT EXISTS notebooks(
                         title TEXT,
                         notebook_guid TEXT,
                         is_active BOOLEAN,
-                        raw_note BLOB
+                        raw_note BLOB,
+                        usn INT,
+                        content_hash BLOB,
+                        resource_hashes TEXT,
+                        codec TEXT,
+                        created INT,
+                        updated INT,
+                        content_length INT,
+                        resources_size INT,
+                        resources_count INT
+                    );
+                    CREATE TABLE IF NOT EXISTS note_tags(
+                        note_guid TEXT,
+                        tag_name TEXT,
+                        PRIMARY KEY (note_guid, tag_name)
+                    );
+                    CREATE TABLE IF NOT EXISTS notes_text(
+                        id INTEGER PRIMARY KEY,
+                        guid TEXT UNIQUE,
+                        title TEXT,
+                        content TEXT,
+                        tags TEXT,
+                        recognition TEXT
+                    );
+                    CREATE TABLE IF NOT EXISTS notes_stash(
+                        guid TEXT PRIMARY KEY,
+                        raw_note BLOB,
+                        resource_hashes TEXT,
+                        codec TEXT
+                    );
+                    CREATE TABLE IF NOT EXISTS resources(
+                        body_hash BLOB PRIMARY KEY,
+                        raw_body BLOB,
+                        codec TEXT
+                    );
+                    CREATE TABLE IF NOT EXISTS note_resources(
+                        note_guid TEXT,
+                        body_hash BLOB,
+                        PRIMARY KEY (note_guid, body_hash)
                     );
                     CREATE TABLE IF NOT EXISTS tasks(
                         guid TEXT PRIMARY KEY,
                         note_guid TEXT,
-                        raw_task BLOB
+                        raw_task BLOB,
+                        codec TEXT
                     );
                     CREATE TABLE IF NOT EXISTS reminders(
                         guid TEXT PRIMARY KEY,
                         task_guid TEXT,
-                        raw_reminder BLOB
+                        raw_reminder BLOB,
+                        codec TEXT
                     );
                     CREATE TABLE IF NOT EXISTS config(
                         name TEXT PRIMARY KEY,
                         value TEXT
                     );
-                    CREATE INDEX IF NOT EXISTS idx_notes
-                     ON notes(notebook_guid, is_active);
+                    CREATE INDEX IF NOT EXISTS idx_notes_notebook_title
+                     ON notes(notebook_guid, is_active, title COLLATE NOCASE);
                     CREATE INDEX IF NOT EXISTS idx_notes_title
                      ON notes(title COLLATE NOCASE);
                     CREATE INDEX IF NOT EXISTS idx_notebooks_linked
@@ -64,6 +235,40 @@ DB_SCHEMA = """CREATE TABLE IF NOT EXISTS notebooks(
                      ON tasks(note_guid);
                     CREATE INDEX IF NOT EXISTS idx_reminders
                      ON reminders(task_guid);
+                    CREATE INDEX IF NOT EXISTS idx_note_resources_hash
+                     ON note_resources(body_hash);
+                    CREATE INDEX IF NOT EXISTS idx_note_tags_name
+                     ON note_tags(tag_name);
+                    CREATE INDEX IF NOT EXISTS idx_notes_created
+                     ON notes(created);
+                    CREATE INDEX IF NOT EXISTS idx_notes_updated
+                     ON notes(updated);
+"""
+
+# Created separately, since FTS5 may be missing from SQLite build
+SEARCH_INDEX_SCHEMA = """
+                    CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+                        title,
+                        content,
+                        tags,
+                        recognition,
+                        content='notes_text',
+                        content_rowid='id',
+                        tokenize='unicode61 remove_diacritics 1'
+                    );
+                    CREATE TRIGGER IF NOT EXISTS notes_text_insert
+                     AFTER INSERT ON notes_text BEGIN
+                        INSERT INTO notes_fts(rowid, title, content, tags, recognition)
+                         VALUES (new.id, new.title, new.content, new.tags,
+                          new.recognition);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS notes_text_delete
+                     AFTER DELETE ON notes_text BEGIN
+                        INSERT INTO notes_fts(notes_fts, rowid, title, content, tags,
+                          recognition)
+                         VALUES ('delete', old.id, old.title, old.content, old.tags,
+                          old.recognition);
+                    END;
 """
 
 
@@ -71,18 +276,340 @@ class DatabaseResyncRequiredError(Exception):
     """Raise when database update requires resync"""
 
 
-def initialize_db(database_path: Path) -> None:
+class CodecNotAvailableError(Exception):
+    """Raise when stored data requires codec that is not available"""
+
+
+class SearchNotAvailableError(Exception):
+    """Raise when full-text search index can't be used"""
+
+
+class Codec(ABC):
+    """Compression of stored blobs and serialization of notes
+
+    Notes are stored Thrift binary serialized, except for legacy LzmaCodec.
+    """
+
+    name: str
+
+    @abstractmethod
+    def compress(self, data: bytes) -> bytes:
+        """Compress blob before it is stored"""
+
+    @abstractmethod
+    def decompress(self, data: bytes) -> bytes:
+        """Decompress stored blob"""
+
+    def dumps_note(self, note: Note) -> bytes:
+        return self.compress(
+            serialize(note, protocol_factory=TBinaryProtocolAcceleratedFactory())
+        )
+
+    def loads_note(self, raw_note: bytes) -> Note:
+        return deserialize(
+            Note(),
+            self.decompress(raw_note),
+            protocol_factory=TBinaryProtocolAcceleratedFactory(),
+        )
+
+
+class LzmaCodec(Codec):
+    """Original storage format, pickled notes compressed with LZMA
+
+    Rows without codec tag are stored in this format."""
+
+    name = "lzma"
+
+    def compress(self, data: bytes) -> bytes:
+        return lzma.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return lzma.decompress(data)
+
+    def dumps_note(self, note: Note) -> bytes:
+        return self.compress(pickle.dumps(note))
+
+    def loads_note(self, raw_note: bytes) -> Note:
+        return pickle.loads(self.decompress(raw_note))
+
+
+class ZlibCodec(Codec):
+    """Thrift binary serialized notes compressed with zlib"""
+
+    name = "zlib"
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zlib.decompress(data)
+
+
+class ZstdCodec(Codec):
+    """Thrift binary serialized notes compressed with zstd"""
+
+    name = "zstd"
+
+    def compress(self, data: bytes) -> bytes:
+        compressed: bytes = zstandard.ZstdCompressor().compress(data)
+
+        return compressed
+
+    def decompress(self, data: bytes) -> bytes:
+        decompressed: bytes = zstandard.ZstdDecompressor().decompress(data)
+
+        return decompressed
+
+
+CODECS: dict[str, type[Codec]] = {
+    LzmaCodec.name: LzmaCodec,
+    ZlibCodec.name: ZlibCodec,
+    ZstdCodec.name: ZstdCodec,
+}
+
+
+def is_codec_available(codec_name: str) -> bool:
+    if codec_name == ZstdCodec.name:
+        return zstandard is not None
+
+    return codec_name in CODECS
+
+
+def get_codec(codec_name: Optional[str]) -> Codec:
+    if codec_name is None:
+        return LzmaCodec()
+
+    if codec_name not in CODECS:
+        raise CodecNotAvailableError(f"Unknown storage codec '{codec_name}'!")
+
+    if not is_codec_available(codec_name):
+        raise CodecNotAvailableError(
+            f"Storage codec '{codec_name}' requires 'zstandard' package!"
+            " Install it with 'evernote-backup[zstd]' extra."
+        )
+
+    return CODECS[codec_name]()
+
+
+def get_note_resource_hashes(note: Note) -> str:
+    """Order-independent fingerprint of note attachments"""
+
+    body_hashes = (
+        r.data.bodyHash.hex()
+        for r in note.resources or []
+        if r.data and r.data.bodyHash
+    )
+
+    return ",".join(sorted(body_hashes))
+
+
+def parse_resource_hashes(resource_hashes: Optional[str]) -> frozenset[bytes]:
+    if not resource_hashes:
+        return frozenset()
+
+    return frozenset(bytes.fromhex(h) for h in resource_hashes.split(","))
+
+
+def deflate_note(note: Note, codec: Codec) -> tuple[bytes, dict[bytes, bytes]]:
+    """Serialize note without resource bodies, returning them separately"""
+
+    resource_bodies = {}
+    stripped_data = []
+
+    for resource in note.resources or []:
+        if resource.data is None or resource.data.body is None:
+            continue
+
+        data = resource.data
+        body_hash = data.bodyHash or hashlib.md5(data.body).digest()  # noqa: S324
+
+        resource_bodies[body_hash] = data.body
+        stripped_data.append((data, data.body, data.bodyHash))
+
+        data.body, data.bodyHash = None, body_hash
+
+    try:
+        note_deflated = codec.dumps_note(note)
+    finally:
+        for data, body, orig_hash in stripped_data:
+            data.body, data.bodyHash = body, orig_hash
+
+    return note_deflated, resource_bodies
+
+
+def get_note_metadata(note: Note) -> NoteMetadata:
+    resources = [r for r in note.resources or [] if r.data]
+
+    return NoteMetadata(
+        created=note.created,
+        updated=note.updated,
+        content_length=note.contentLength,
+        resources_size=sum(r.data.size or len(r.data.body or b"") for r in resources),
+        resources_count=len(resources),
+        tag_names=tuple(sorted(set(note.tagNames or []))),
+    )
+
+
+def get_tags_filter(tags: Iterable[str]) -> tuple[str, tuple[str, ...]]:
+    """SQL condition to select notes having any of the tags, if any are given"""
+
+    tags = tuple(tags)
+
+    if not tags:
+        return "", ()
+
+    placeholders = ", ".join("?" for _ in tags)
+
+    return (
+        " and notes.guid in"  # noqa: S608
+        f" (select note_guid from note_tags where tag_name in ({placeholders}))"
+    ), tags
+
+
+def get_note_filter(
+    note_filter: Optional[NoteFilter],
+) -> tuple[str, tuple[Union[str, int], ...]]:
+    """SQL conditions for note filter, run before any note is decompressed"""
+
+    if note_filter is None:
+        return "", ()
+
+    filter_sql, tags_params = get_tags_filter(note_filter.tags)
+    filter_params: tuple[Union[str, int], ...] = tags_params
+
+    date_conditions = (
+        ("created", ">=", note_filter.created_after),
+        ("created", "<", note_filter.created_before),
+        ("updated", ">=", note_filter.updated_after),
+        ("updated", "<", note_filter.updated_before),
+    )
+
+    for column_name, operator, bound in date_conditions:
+        if bound is not None:
+            filter_sql += f" and notes.{column_name} {operator} ?"
+            filter_params += (bound,)
+
+    return filter_sql, filter_params
+
+
+def encode_note(
+    note: Note, codec: Codec, stored_hashes: Iterable[bytes] = ()
+) -> EncodedNote:
+    """Prepare note for writing, safe to run outside of database thread"""
+
+    note_deflated, resource_bodies = deflate_note(note, codec)
+    stored_hashes = frozenset(stored_hashes)
+
+    return EncodedNote(
+        guid=note.guid,
+        title=note.title,
+        notebook_guid=note.notebookGuid,
+        is_active=note.active,
+        raw_note=note_deflated,
+        usn=note.updateSequenceNum,
+        content_hash=note.contentHash,
+        resource_hashes=get_note_resource_hashes(note),
+        codec=codec.name,
+        metadata=get_note_metadata(note),
+        search_text=get_note_search_text(note),
+        resources={
+            body_hash: None if body_hash in stored_hashes else codec.compress(body)
+            for body_hash, body in resource_bodies.items()
+        },
+        reused_bodies={
+            body_hash: body
+            for body_hash, body in resource_bodies.items()
+            if body_hash in stored_hashes
+        },
+    )
+
+
+def _recode_note(raw_note: bytes, old_codec: Codec, new_codec: Codec) -> bytes:
+    return new_codec.dumps_note(old_codec.loads_note(raw_note))
+
+
+def _recode_blob(raw_data: bytes, old_codec: Codec, new_codec: Codec) -> bytes:
+    return new_codec.compress(old_codec.decompress(raw_data))
+
+
+def initialize_db(database_path: Path, storage_profile: str = "default") -> None:
     if database_path.exists():
         raise FileExistsError
 
     db = sqlite3.connect(database_path)
 
+    # Page size can only be changed before any tables are created
+    page_size = STORAGE_PROFILES[storage_profile].page_size
+    db.execute(f"PRAGMA page_size={page_size};")
+
     with db as con:
         con.executescript(DB_SCHEMA)
 
+    create_search_index(db)
+
     db.close()
 
 
+def create_search_index(db: sqlite3.Connection) -> bool:
+    try:
+        with db as con:
+            _execute_statements(con, SEARCH_INDEX_SCHEMA)
+    except sqlite3.OperationalError as e:
+        logger.warning(f"Full-text search is not available: {e}")
+        return False
+
+    return True
+
+
+def _execute_statements(con: sqlite3.Connection, script: str) -> None:
+    """Run SQL script one statement at a time
+
+    Unlike executescript, this doesn't commit transaction that is already open.
+    """
+
+    statement = ""
+
+    for script_line in script.splitlines(keepends=True):
+        statement += script_line
+
+        if sqlite3.complete_statement(statement):
+            con.execute(statement)
+            statement = ""
+
+    if statement.strip():
+        con.execute(statement)
+
+
+class StorageConnection(sqlite3.Connection):
+    """Connection that only commits when the outermost 'with' block exits
+
+    This way separate storage calls can be grouped into a single transaction.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+
+        self.transaction_depth = 0
+
+    def __enter__(self) -> "StorageConnection":
+        self.transaction_depth += 1
+
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> Literal[False]:
+        self.transaction_depth -= 1
+
+        if self.transaction_depth == 0:
+            super().__exit__(exc_type, exc_value, traceback)
+
+        return False
+
+
 class SqliteStorage:
     def __init__(self, database: Union[Path, sqlite3.Connection]) -> None:
         if isinstance(database, sqlite3.Connection):
@@ -91,9 +618,16 @@ class SqliteStorage:
             if not database.exists():
                 raise FileNotFoundError("Database file does not exist.")
 
-            self.db = sqlite3.connect(database)
+            self.db = sqlite3.connect(database, factory=StorageConnection)
             self.db.row_factory = sqlite3.Row
 
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Commit all changes made inside this block at once, or none of them"""
+
+        with self.db:
+            yield
+
     @property
     def config(self) -> "ConfigStorage":
         return ConfigStorage(self.db)
@@ -114,6 +648,35 @@ class SqliteStorage:
     def reminders(self) -> "RemindersStorage":
         return RemindersStorage(self.db)
 
+    def apply_profile(self, profile_name: str) -> None:
+        profile = STORAGE_PROFILES[profile_name]
+
+        journal_mode = self.db.execute(
+            f"PRAGMA journal_mode={profile.journal_mode};"
+        ).fetchone()[0]
+
+        if journal_mode.upper() != profile.journal_mode:
+            logger.warning(
+                f"Failed to set database journal mode to {profile.journal_mode},"
+                f" using {journal_mode.upper()}"
+            )
+
+        self.db.execute(f"PRAGMA synchronous={profile.synchronous};")
+        self.db.execute(f"PRAGMA mmap_size={profile.mmap_size};")
+        self.db.execute(f"PRAGMA cache_size={profile.cache_size};")
+        self.db.execute(f"PRAGMA temp_store={profile.temp_store};")
+
+        logger.debug(f"Applied '{profile_name}' storage profile")
+
+    def get_storage_settings(self) -> dict[str, str]:
+        settings = {}
+
+        for pragma_name in StorageProfile._fields:
+            cur = self.db.execute(f"PRAGMA {pragma_name};")
+            settings[pragma_name] = str(cur.fetchone()[0])
+
+        return settings
+
     def integrity_check(self) -> str:
         with self.db as con:
             cur = con.execute("PRAGMA integrity_check;")
@@ -139,6 +702,9 @@ class SqliteStorage:
 
     def upgrade_db(self, db_version: int) -> None:
         need_resync = False
+        need_resources_migration = False
+        need_metadata_migration = False
+        need_search_index = False
 
         if db_version == 0:
             need_resync = True
@@ -199,12 +765,223 @@ class SqliteStorage:
                     """
                 )
 
+        if db_version < 7:
+            notes_columns = self._get_table_columns("notes")
+
+            with self.db as con6:
+                for column_name, column_type in (
+                    ("usn", "INT"),
+                    ("content_hash", "BLOB"),
+                    ("resource_hashes", "TEXT"),
+                ):
+                    if column_name not in notes_columns:
+                        con6.execute(
+                            f"ALTER TABLE notes ADD COLUMN {column_name} {column_type};"
+                        )
+
+        if db_version < 8:
+            with self.db as con7:
+                con7.execute(
+                    "CREATE TABLE IF NOT EXISTS notes_stash("
+                    " guid TEXT PRIMARY KEY,"
+                    " raw_note BLOB,"
+                    " resource_hashes TEXT"
+                    " );"
+                )
+
+        if db_version < 9:
+            with self.db as con8:
+                con8.executescript(
+                    """
+                    CREATE TABLE IF NOT EXISTS resources(
+                        body_hash BLOB PRIMARY KEY,
+                        raw_body BLOB
+                    );
+                    CREATE TABLE IF NOT EXISTS note_resources(
+                        note_guid TEXT,
+                        body_hash BLOB,
+                        PRIMARY KEY (note_guid, body_hash)
+                    );
+                    CREATE INDEX IF NOT EXISTS idx_note_resources_hash
+                     ON note_resources(body_hash);
+                    """
+                )
+
+            need_resources_migration = True
+
+        if db_version < 10:
+            with self.db as con9:
+                for table_name in (
+                    "notes",
+                    "notes_stash",
+                    "resources",
+                    "tasks",
+                    "reminders",
+                ):
+                    table_columns = self._get_table_columns(table_name)
+                    if table_columns and "codec" not in table_columns:
+                        con9.execute(f"ALTER TABLE {table_name} ADD COLUMN codec TEXT;")
+
+        if db_version < 11:
+            with self.db as con10:
+                con10.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_notes_notebook_title"
+                    " ON notes(notebook_guid, is_active, title COLLATE NOCASE);"
+                )
+                # Superseded by the one above
+                con10.execute("DROP INDEX IF EXISTS idx_notes;")
+
+        if db_version < 12:
+            notes_columns = self._get_table_columns("notes")
+
+            with self.db as con11:
+                for column_name in (
+                    "created",
+                    "updated",
+                    "content_length",
+                    "resources_size",
+                    "resources_count",
+                ):
+                    if column_name not in notes_columns:
+                        con11.execute(
+                            f"ALTER TABLE notes ADD COLUMN {column_name} INT;"
+                        )
+
+                con11.executescript(
+                    """
+                    CREATE TABLE IF NOT EXISTS note_tags(
+                        note_guid TEXT,
+                        tag_name TEXT,
+                        PRIMARY KEY (note_guid, tag_name)
+                    );
+                    CREATE INDEX IF NOT EXISTS idx_note_tags_name
+                     ON note_tags(tag_name);
+                    """
+                )
+
+            need_metadata_migration = True
+
+        if db_version < 13:
+            with self.db as con12:
+                con12.execute(
+                    "CREATE TABLE IF NOT EXISTS notes_text("
+                    "id INTEGER PRIMARY KEY,"
+                    " guid TEXT UNIQUE,"
+                    " title TEXT,"
+                    " content TEXT,"
+                    " tags TEXT,"
+                    " recognition TEXT"
+                    ");"
+                )
+
+            need_search_index = True
+
+        if db_version < 14:
+            with self.db as con13:
+                con13.executescript(
+                    """
+                    CREATE INDEX IF NOT EXISTS idx_notes_created
+                     ON notes(created);
+                    CREATE INDEX IF NOT EXISTS idx_notes_updated
+                     ON notes(updated);
+                    """
+                )
+
+        # Runs after all schema changes, since it writes notes in current format
+        if need_resources_migration:
+            self.notes.migrate_note_resources()
+
+        if need_metadata_migration:
+            self.notes.migrate_note_metadata()
+
+        if need_search_index:
+            self.notes.rebuild_search_index()
+
         self.config.set_config_value("DB_VERSION", str(CURRENT_DB_VERSION))
 
         if need_resync:
             self.config.set_config_value("USN", "0")
             raise DatabaseResyncRequiredError
 
+    def get_write_codec(self) -> Codec:
+        try:
+            codec_name = self.config.get_config_value("storage_codec")
+        except KeyError:
+            return get_codec(None)
+
+        return get_codec(codec_name)
+
+    def _recompress_table(
+        self,
+        table_name: str,
+        key_column: str,
+        blob_column: str,
+        recode: Callable[[bytes, Codec, Codec], bytes],
+        codec: Codec,
+    ) -> int:
+        with self.db as con:
+            cur = con.execute(
+                f"select {key_column} from {table_name}"  # noqa: S608
+                f" where {blob_column} is not NULL and coalesce(codec, 'lzma') != ?",
+                (codec.name,),
+            )
+            keys = [row[0] for row in cur.fetchall()]
+
+        count_recompressed = 0
+
+        for batch_start in range(0, len(keys), RECOMPRESS_BATCH_SIZE):
+            batch_keys = keys[batch_start : batch_start + RECOMPRESS_BATCH_SIZE]
+
+            with self.db as con:
+                for key in batch_keys:
+                    row = con.execute(
+                        f"select {blob_column}, codec from {table_name}"  # noqa: S608
+                        f" where {key_column}=?",
+                        (key,),
+                    ).fetchone()
+
+                    try:
+                        raw_data = recode(row[0], get_codec(row[1]), codec)
+                    except CodecNotAvailableError:
+                        raise
+                    except Exception:
+                        logger.warning(f"Failed to recompress {table_name} [{key}]")
+                        continue
+
+                    con.execute(
+                        f"update {table_name}"  # noqa: S608
+                        f" set {blob_column}=?, codec=? where {key_column}=?",
+                        (raw_data, codec.name, key),
+                    )
+
+                    count_recompressed += 1
+
+        return count_recompressed
+
+    def get_database_path(self) -> Optional[Path]:
+        """Database file path, None for in-memory databases"""
+
+        with self.db as con:
+            for row in con.execute("PRAGMA database_list;"):
+                if row[1] == "main" and row[2]:
+                    return Path(row[2])
+
+        return None
+
+    def is_search_available(self) -> bool:
+        with self.db as con:
+            cur = con.execute(
+                "select 1 from sqlite_master where type='table' and name='notes_fts'"
+            )
+
+            return cur.fetchone() is not None
+
+    def _get_table_columns(self, table_name: str) -> set[str]:
+        with self.db as con:
+            cur = con.execute(f"PRAGMA table_info({table_name});")
+
+            return {row[1] for row in cur.fetchall()}
+
 
 class NoteBookStorage(SqliteStorage):  # noqa: WPS214
     def add_notebooks(self, notebooks: Iterable[Notebook]) -> None:
@@ -219,27 +996,48 @@ class NoteBookStorage(SqliteStorage):  # noqa: WPS214
                 ((nb.guid, nb.name, nb.stack) for nb in notebooks),  # noqa: WPS441
             )
 
-    def iter_notebooks(self) -> Iterator[Notebook]:
+    def iter_notebooks(
+        self, names: Iterable[str] = (), stacks: Iterable[str] = ()
+    ) -> Iterator[Notebook]:
+        """All notebooks, or only ones with any of the names and stacks given"""
+
+        conditions = []
+        params: list[str] = []
+
+        for column_name, values in (("name", tuple(names)), ("stack", tuple(stacks))):
+            if values:
+                placeholders = ", ".join("?" for _ in values)
+                conditions.append(f"{column_name} in ({placeholders})")
+                params.extend(values)
+
+        where_sql = f" where {' and '.join(conditions)}" if conditions else ""
+
         with self.db as con:
             cur = con.execute(
-                "select guid, name, stack from notebooks",
+                f"select guid, name, stack from notebooks{where_sql}",  # noqa: S608
+                params,
             )
 
-            yield from (
-                Notebook(
-                    guid=row["guid"],
-                    name=row["name"],
-                    stack=row["stack"],
-                )
-                for row in cur
+        yield from (
+            Notebook(
+                guid=row["guid"],
+                name=row["name"],
+                stack=row["stack"],
             )
+            for row in cur
+        )
+
+    def get_notebook_notes_count(
+        self, notebook_guid: str, note_filter: Optional[NoteFilter] = None
+    ) -> int:
+        filter_sql, filter_params = get_note_filter(note_filter)
 
-    def get_notebook_notes_count(self, notebook_guid: str) -> int:
         with self.db as con:
             cur = con.execute(
-                "select COUNT(guid) from notes"
-                " where notebook_guid=? and is_active=1 and raw_note is not NULL",
-                (notebook_guid,),
+                "select COUNT(guid) from notes"  # noqa: S608
+                " where notebook_guid=? and is_active=1 and raw_note is not NULL"
+                f"{filter_sql}",
+                (notebook_guid, *filter_params),
             )
 
             return int(cur.fetchone()[0])
@@ -317,15 +1115,31 @@ class NoteBookStorage(SqliteStorage):  # noqa: WPS214
 
 class NoteStorage(SqliteStorage):  # noqa: WPS214
     def add_notes_for_sync(self, notes: Iterable[Note]) -> None:
+        notes = list(notes)
+
         if logger.getEffectiveLevel() == logging.DEBUG:  # pragma: no cover
             for note in notes:
                 n_info = log_format_note(note)
                 logger.debug(f"Scheduling note for sync {n_info}")
 
         with self.db as con:
+            # Keep previous version around, so unchanged resources
+            # can be reused instead of downloading them again
+            con.executemany(
+                "replace into notes_stash(guid, raw_note, resource_hashes, codec)"
+                " select guid, raw_note, resource_hashes, codec"
+                " from notes"
+                " where guid=? and raw_note is not NULL and resource_hashes != ''",
+                ((n.guid,) for n in notes),
+            )
+            # Resource hashes of scheduled note are matched against stored bodies
             con.executemany(
-                "replace into notes(guid, title, notebook_guid) values (?, ?, ?)",
-                ((n.guid, n.title, n.notebookGuid) for n in notes),
+                "replace into notes(guid, title, notebook_guid, resource_hashes)"
+                " values (?, ?, ?, ?)",
+                (
+                    (n.guid, n.title, n.notebookGuid, get_note_resource_hashes(n))
+                    for n in notes
+                ),
             )
 
     def add_note(self, note: Note) -> None:
@@ -333,94 +1147,539 @@ class NoteStorage(SqliteStorage):  # noqa: WPS214
             n_info = log_format_note(note)
             logger.debug(f"Adding/updating note {n_info}")
 
-        note_deflated = lzma.compress(pickle.dumps(note))
+        encoded_note = encode_note(
+            note, self.get_write_codec(), self.get_stored_resource_hashes(note)
+        )
+
+        self.add_encoded_notes([encoded_note])
+
+    def add_encoded_notes(self, encoded_notes: Iterable[EncodedNote]) -> None:
+        """Write notes prepared by encode_note in a single transaction"""
 
         with self.db as con:
-            con.execute(
-                "replace into notes(guid, title, notebook_guid, is_active, raw_note)"
-                " values (?, ?, ?, ?, ?)",
-                (
-                    note.guid,
-                    note.title,
-                    note.notebookGuid,
-                    note.active,
-                    note_deflated,
-                ),
-            )
+            for encoded_note in encoded_notes:
+                old_hashes = self._get_linked_resources(encoded_note.guid)
+
+                con.executemany(
+                    "insert or ignore into resources(body_hash, raw_body, codec)"
+                    " values (?, ?, ?)",
+                    self._get_new_resources(encoded_note),
+                )
+                con.execute(
+                    "replace into notes(guid, title, notebook_guid, is_active, raw_note,"
+                    " usn, content_hash, resource_hashes, codec)"
+                    " values (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        encoded_note.guid,
+                        encoded_note.title,
+                        encoded_note.notebook_guid,
+                        encoded_note.is_active,
+                        encoded_note.raw_note,
+                        encoded_note.usn,
+                        encoded_note.content_hash,
+                        encoded_note.resource_hashes,
+                        encoded_note.codec,
+                    ),
+                )
+                self._set_note_metadata(encoded_note.guid, encoded_note.metadata)
+                self._set_note_search_text(encoded_note.guid, encoded_note.search_text)
+                con.execute(
+                    "delete from note_resources where note_guid=?", (encoded_note.guid,)
+                )
+                con.executemany(
+                    "insert into note_resources(note_guid, body_hash) values (?, ?)",
+                    ((encoded_note.guid, h) for h in encoded_note.resources),
+                )
+                con.execute(
+                    "delete from notes_stash where guid=?", (encoded_note.guid,)
+                )
 
-        logger.debug(f"Added note [{note.guid}]")
+                self._delete_orphan_resources(
+                    old_hashes.difference(encoded_note.resources)
+                )
 
-    def iter_notes(self, notebook_guid: str) -> Iterator[Note]:
-        for note_guid in self._get_notes_by_notebook(notebook_guid):
-            with self.db as con:
-                cur = con.execute(
-                    "select title, guid, raw_note"
-                    " from notes"
-                    " where guid=? and raw_note is not NULL",
-                    (note_guid,),
+                logger.debug(f"Added note [{encoded_note.guid}]")
+
+    def _get_new_resources(
+        self, encoded_note: EncodedNote
+    ) -> list[tuple[bytes, bytes, str]]:
+        new_resources = []
+
+        for body_hash, raw_body in encoded_note.resources.items():
+            if raw_body is None:
+                cur = self.db.execute(
+                    "select 1 from resources where body_hash=?", (body_hash,)
                 )
 
-                row = cur.fetchone()
+                if cur.fetchone() is not None:
+                    continue
 
-                raw_note = self._get_raw_note(
-                    row["title"],
-                    row["guid"],
-                    row["raw_note"],
+                # Reused resource was dropped as orphan after note was encoded
+                raw_body = get_codec(encoded_note.codec).compress(
+                    encoded_note.reused_bodies[body_hash]
                 )
 
-                if raw_note:
-                    yield raw_note
+            new_resources.append((body_hash, raw_body, encoded_note.codec))
+
+        return new_resources
+
+    def migrate_note_metadata(self) -> None:
+        """Fill metadata columns for notes stored before they were introduced"""
 
-    def iter_notes_trash(self) -> Iterator[Note]:
         with self.db as con:
             cur = con.execute(
-                "select title, guid, raw_note"
+                "select guid from notes"
+                " where raw_note is not NULL and resources_count is NULL"
+            )
+            note_guids = [row["guid"] for row in cur.fetchall()]
+
+        if note_guids:
+            logger.info(f"Indexing metadata of {len(note_guids)} notes...")
+
+        for note_guid in note_guids:
+            note = self.get_note(note_guid)
+
+            if note is not None:
+                with self.db:
+                    self._set_note_metadata(note_guid, get_note_metadata(note))
+
+    def rebuild_search_index(self) -> int:
+        """Extract text of all stored notes and build full-text index from scratch"""
+
+        with self.db as con:
+            # Bulk loading first and indexing once is much faster than triggers
+            _execute_statements(
+                con,
+                """
+                DROP TRIGGER IF EXISTS notes_text_insert;
+                DROP TRIGGER IF EXISTS notes_text_delete;
+                DROP TABLE IF EXISTS notes_fts;
+                """,
+            )
+            con.execute("delete from notes_text")
+
+            cur = con.execute("select guid from notes where raw_note is not NULL")
+            note_guids = [row["guid"] for row in cur.fetchall()]
+
+        if note_guids:
+            logger.info(f"Indexing text of {len(note_guids)} notes...")
+
+        count_notes = 0
+        for i in range(0, len(note_guids), SEARCH_INDEX_BATCH_SIZE):
+            with self.db:
+                for note_guid in note_guids[i : i + SEARCH_INDEX_BATCH_SIZE]:
+                    note = self.get_note(note_guid)
+
+                    if note is not None:
+                        self._set_note_search_text(
+                            note_guid, get_note_search_text(note)
+                        )
+                        count_notes += 1
+
+        if create_search_index(self.db):
+            with self.db as con:
+                con.execute("insert into notes_fts(notes_fts) values ('rebuild')")
+
+        return count_notes
+
+    def search_notes(  # noqa: WPS211
+        self,
+        query: str,
+        notebook_guids: Iterable[str] = (),
+        tags: Iterable[str] = (),
+        updated_from: Optional[int] = None,
+        updated_to: Optional[int] = None,
+        include_trash: bool = False,
+        limit: Optional[int] = None,
+    ) -> list[SearchResult]:
+        if not self.is_search_available():
+            raise SearchNotAvailableError(
+                "Full-text search index is missing, SQLite build lacks FTS5 support."
+            )
+
+        conditions = ["notes_fts match ?", "notes.raw_note is not NULL"]
+        params: list[Any] = [query]
+
+        if not include_trash:
+            conditions.append("notes.is_active=1")
+
+        notebook_guids = tuple(notebook_guids)
+        if notebook_guids:
+            placeholders = ", ".join("?" for _ in notebook_guids)
+            conditions.append(f"notes.notebook_guid in ({placeholders})")
+            params.extend(notebook_guids)
+
+        if updated_from is not None:
+            conditions.append("notes.updated >= ?")
+            params.append(updated_from)
+
+        if updated_to is not None:
+            conditions.append("notes.updated < ?")
+            params.append(updated_to)
+
+        tags_filter, tags_params = get_tags_filter(tags)
+        params.extend(tags_params)
+
+        rank_weights = ", ".join(str(w) for w in SEARCH_RANK_WEIGHTS)
+
+        with self.db as con:
+            cur = con.execute(
+                "select notes.guid, notes.title, notes.is_active,"  # noqa: S608
+                " notes.updated, notebooks.name as notebook_name,"
+                " snippet(notes_fts, -1, '[', ']', '...', 16) as snippet"
+                " from notes_fts"
+                " join notes_text on notes_text.id=notes_fts.rowid"
+                " join notes on notes.guid=notes_text.guid"
+                " left join notebooks on notebooks.guid=notes.notebook_guid"
+                f" where {' and '.join(conditions)}{tags_filter}"
+                f" order by bm25(notes_fts, {rank_weights})"
+                " limit ?",
+                (*params, -1 if limit is None else limit),
+            )
+
+            return [
+                SearchResult(
+                    guid=row["guid"],
+                    title=row["title"],
+                    notebook_name=row["notebook_name"],
+                    is_active=bool(row["is_active"]),
+                    updated=row["updated"],
+                    snippet=row["snippet"],
+                )
+                for row in cur
+            ]
+
+    def get_stored_resource_hashes(self, note: Note) -> frozenset[bytes]:
+        """Body hashes of note resources that are already in database"""
+
+        stored_hashes = set()
+
+        for resource in note.resources or []:
+            if resource.data is None or resource.data.bodyHash is None:
+                continue
+
+            cur = self.db.execute(
+                "select 1 from resources where body_hash=?",
+                (resource.data.bodyHash,),
+            )
+
+            if cur.fetchone() is not None:
+                stored_hashes.add(resource.data.bodyHash)
+
+        return frozenset(stored_hashes)
+
+    def get_note(self, note_guid: str) -> Optional[Note]:
+        with self.db as con:
+            cur = con.execute(
+                "select title, guid, raw_note, codec"
+                " from notes"
+                " where guid=? and raw_note is not NULL",
+                (note_guid,),
+            )
+
+            row = cur.fetchone()
+
+            if row is None:
+                return None
+
+            return self._get_raw_note(
+                row["title"], row["guid"], row["raw_note"], row["codec"]
+            )
+
+    def get_known_resource_hashes(self, note_guid: str) -> frozenset[bytes]:
+        """Body hashes of resources of scheduled note that need no download"""
+
+        with self.db as con:
+            cur = con.execute(
+                "select notes.resource_hashes,"
+                " notes_stash.resource_hashes as stashed_hashes"
+                " from notes"
+                " left join notes_stash"
+                " on notes_stash.guid=notes.guid"
+                " where notes.guid=? and notes.raw_note is NULL",
+                (note_guid,),
+            )
+
+            row = cur.fetchone()
+
+            if row is None:
+                return frozenset()
+
+            return self._get_known_resource_hashes(
+                row["resource_hashes"], row["stashed_hashes"]
+            )
+
+    def restore_stashed_resources(self, note: Note) -> bool:
+        """Fill resources downloaded without body from previous version of note
+
+        Resources that are not there are taken from stored notes with same body.
+        """
+
+        missing_resources = [
+            r for r in note.resources or [] if r.data and r.data.body is None
+        ]
+
+        if not missing_resources:
+            return True
+
+        stashed_resources = self._get_stashed_resources(note)
+
+        for resource in missing_resources:
+            stashed_resource = stashed_resources.get(resource.data.bodyHash)
+
+            if stashed_resource is None:
+                stashed_resource = self._get_stored_resource(resource.data.bodyHash)
+
+            if stashed_resource is None or stashed_resource.data.body is None:
+                return False
+
+            resource.data = stashed_resource.data
+            resource.recognition = stashed_resource.recognition
+            resource.alternateData = stashed_resource.alternateData
+
+        return True
+
+    def _get_stashed_resources(self, note: Note) -> dict[bytes, Resource]:
+        with self.db as con:
+            cur = con.execute(
+                "select raw_note, codec from notes_stash where guid=?",
+                (note.guid,),
+            )
+
+            row = cur.fetchone()
+
+        if row is None:
+            return {}
+
+        stashed_note = self._get_raw_note(
+            note.title, note.guid, row["raw_note"], row["codec"]
+        )
+
+        if stashed_note is None:
+            return {}
+
+        return {r.data.bodyHash: r for r in stashed_note.resources or [] if r.data}
+
+    def _get_stored_resource(self, body_hash: bytes) -> Optional[Resource]:
+        """Resource with given body from any stored note, with its recognition"""
+
+        with self.db as con:
+            cur = con.execute(
+                "select notes.guid, title, raw_note, codec"
+                " from note_resources"
+                " join notes"
+                " on notes.guid=note_resources.note_guid"
+                " where body_hash=? and raw_note is not NULL"
+                " limit 1",
+                (body_hash,),
+            )
+
+            row = cur.fetchone()
+
+        if row is None:
+            return None
+
+        stored_note = self._get_raw_note(
+            row["title"], row["guid"], row["raw_note"], row["codec"]
+        )
+
+        if stored_note is None:
+            return None
+
+        return next(
+            (
+                r
+                for r in stored_note.resources or []
+                if r.data and r.data.bodyHash == body_hash
+            ),
+            None,
+        )
+
+    def _get_known_resource_hashes(
+        self, note_hashes: Optional[str], stashed_hashes: Optional[str]
+    ) -> frozenset[bytes]:
+        known_hashes = set(parse_resource_hashes(stashed_hashes))
+
+        # Body counts only if it can be restored, see _get_stored_resource
+        for body_hash in parse_resource_hashes(note_hashes) - known_hashes:
+            cur = self.db.execute(
+                "select 1 from note_resources"
+                " join notes"
+                " on notes.guid=note_resources.note_guid"
+                " where body_hash=? and raw_note is not NULL"
+                " limit 1",
+                (body_hash,),
+            )
+
+            if cur.fetchone() is not None:
+                known_hashes.add(body_hash)
+
+        return frozenset(known_hashes)
+
+    def discard_stashed_note(self, note_guid: str) -> None:
+        with self.db as con:
+            con.execute("delete from notes_stash where guid=?", (note_guid,))
+
+    def get_notes_sync_state(self, guids: Iterable[str]) -> dict[str, NoteSyncState]:
+        sync_state = {}
+
+        with self.db as con:
+            for note_guid in guids:
+                cur = con.execute(
+                    "select usn, content_hash, resource_hashes"
+                    " from notes"
+                    " where guid=? and raw_note is not NULL",
+                    (note_guid,),
+                )
+
+                row = cur.fetchone()
+
+                if row is not None:
+                    sync_state[note_guid] = NoteSyncState(
+                        usn=row["usn"],
+                        content_hash=row["content_hash"],
+                        resource_hashes=row["resource_hashes"],
+                    )
+
+        return sync_state
+
+    def iter_notes(
+        self, notebook_guid: str, note_filter: Optional[NoteFilter] = None
+    ) -> Iterator[Note]:
+        filter_sql, filter_params = get_note_filter(note_filter)
+
+        with self.db as con:
+            # Served by idx_notes_notebook_title, only same titles are sorted by guid,
+            # so names are given in same order as by planned export
+            cur = con.execute(
+                "select title, guid, raw_note, codec"  # noqa: S608
+                " from notes"
+                " where notebook_guid=? and is_active=1 and raw_note is not NULL"
+                f"{filter_sql}"
+                " order by title COLLATE NOCASE, guid",
+                (notebook_guid, *filter_params),
+            )
+
+        for row in cur:
+            raw_note = self._get_raw_note(
+                row["title"],
+                row["guid"],
+                row["raw_note"],
+                row["codec"],
+            )
+
+            if raw_note:
+                yield raw_note
+
+    def iter_notes_trash(
+        self, note_filter: Optional[NoteFilter] = None
+    ) -> Iterator[Note]:
+        filter_sql, filter_params = get_note_filter(note_filter)
+
+        with self.db as con:
+            cur = con.execute(
+                "select title, guid, raw_note, codec"  # noqa: S608
                 " from notes"
                 " where is_active=0 and raw_note is not NULL"
+                f"{filter_sql}"
+                " order by title COLLATE NOCASE, guid",
+                filter_params,
+            )
+
+        for row in cur:
+            raw_note = self._get_raw_note(
+                row["title"],
+                row["guid"],
+                row["raw_note"],
+                row["codec"],
+            )
+
+            if raw_note:
+                yield raw_note
+
+    def get_note_titles(self, notebook_guid: str) -> list[str]:
+        with self.db as con:
+            cur = con.execute(
+                "select title from notes"
+                " where notebook_guid=? and is_active=1 and raw_note is not NULL"
                 " order by title COLLATE NOCASE",
+                (notebook_guid,),
             )
 
-            for row in cur:
-                raw_note = self._get_raw_note(
-                    row["title"],
-                    row["guid"],
-                    row["raw_note"],
-                )
+            return [row["title"] for row in cur]
+
+    def get_export_notes(
+        self, notebook_guid: Optional[str], note_filter: Optional[NoteFilter] = None
+    ) -> list[ExportNote]:
+        """Guids and titles of notes in export order, trashed ones if no notebook"""
+
+        filter_sql, filter_params = get_note_filter(note_filter)
+
+        if notebook_guid is None:
+            notes_filter = "is_active=0"
+            params: tuple[Union[str, int], ...] = filter_params
+        else:
+            notes_filter = "notebook_guid=? and is_active=1"
+            params = (notebook_guid, *filter_params)
+
+        with self.db as con:
+            cur = con.execute(
+                "select guid, title, usn from notes"  # noqa: S608
+                f" where {notes_filter} and raw_note is not NULL{filter_sql}"
+                " order by title COLLATE NOCASE, guid",
+                params,
+            )
+
+            return [ExportNote(row["guid"], row["title"], row["usn"]) for row in cur]
+
+    def get_note_titles_trash(self) -> list[str]:
+        with self.db as con:
+            cur = con.execute(
+                "select title from notes"
+                " where is_active=0 and raw_note is not NULL"
+                " order by title COLLATE NOCASE",
+            )
 
-                if raw_note:
-                    yield raw_note
+            return [row["title"] for row in cur]
 
     def check_notes(self, mark_corrupt: bool) -> Iterator[Optional[Note]]:
         with self.db as con:
             cur = con.execute(
-                "select title, guid, raw_note from notes where raw_note is not NULL",
+                "select title, guid, raw_note, codec"
+                " from notes"
+                " where raw_note is not NULL",
             )
 
-            for row in cur:
-                raw_note = self._get_raw_note(
-                    row["title"],
-                    row["guid"],
-                    row["raw_note"],
-                )
+        for row in cur:
+            raw_note = self._get_raw_note(
+                row["title"],
+                row["guid"],
+                row["raw_note"],
+                row["codec"],
+            )
 
-                if raw_note:
-                    yield raw_note
-                else:
-                    if mark_corrupt:
-                        logger.info(
-                            f"Marking '{row['title']}' [{row['guid']}] note for re-download"
-                        )
-                        self._mark_note_for_redownload(row["guid"])
-                    yield None
+            if raw_note:
+                yield raw_note
+            else:
+                if mark_corrupt:
+                    logger.info(
+                        f"Marking '{row['title']}' [{row['guid']}] note for re-download"
+                    )
+                    self._mark_note_for_redownload(row["guid"])
+                yield None
 
     def get_notes_for_sync(self) -> tuple[NoteForSync, ...]:
         with self.db as con:
             cur = con.execute(
-                "select notes.guid, title, notebooks_linked.guid as l_notebook"
+                "select notes.guid, title, notebooks_linked.guid as l_notebook,"
+                " notes.resource_hashes,"
+                " notes_stash.resource_hashes as stashed_hashes"
                 " from notes"
                 " left join notebooks_linked"
                 " using (notebook_guid)"
-                " where raw_note is NULL"
+                " left join notes_stash"
+                " on notes_stash.guid=notes.guid"
+                " where notes.raw_note is NULL"
             )
 
             notes = (
@@ -428,6 +1687,9 @@ class NoteStorage(SqliteStorage):  # noqa: WPS214
                     guid=row["guid"],
                     title=row["title"],
                     linked_notebook_guid=row["l_notebook"],
+                    known_resource_hashes=self._get_known_resource_hashes(
+                        row["resource_hashes"], row["stashed_hashes"]
+                    ),
                 )
                 for row in cur.fetchall()
             )
@@ -435,59 +1697,208 @@ class NoteStorage(SqliteStorage):  # noqa: WPS214
             return tuple(notes)
 
     def expunge_notes(self, guids: Iterable[str]) -> None:
+        guids = list(guids)
+
         with self.db as con:
+            linked_hashes = set()
+            for note_guid in guids:
+                linked_hashes.update(self._get_linked_resources(note_guid))
+
             con.executemany("delete from notes where guid=?", ((g,) for g in guids))
+            con.executemany(
+                "delete from notes_stash where guid=?", ((g,) for g in guids)
+            )
+            con.executemany(
+                "delete from note_resources where note_guid=?", ((g,) for g in guids)
+            )
+            con.executemany(
+                "delete from note_tags where note_guid=?", ((g,) for g in guids)
+            )
+            con.executemany(
+                "delete from notes_text where guid=?", ((g,) for g in guids)
+            )
+
+            self._delete_orphan_resources(linked_hashes)
 
     def expunge_notes_by_notebook(self, notebook_guid: str) -> None:
         with self.db as con:
+            cur = con.execute(
+                "select distinct body_hash from note_resources"
+                " where note_guid in (select guid from notes where notebook_guid=?)",
+                (notebook_guid,),
+            )
+            linked_hashes = {row["body_hash"] for row in cur.fetchall()}
+
+            con.execute(
+                "delete from notes_stash"
+                " where guid in (select guid from notes where notebook_guid=?)",
+                (notebook_guid,),
+            )
+            con.execute(
+                "delete from note_resources"
+                " where note_guid in (select guid from notes where notebook_guid=?)",
+                (notebook_guid,),
+            )
+            con.execute(
+                "delete from note_tags"
+                " where note_guid in (select guid from notes where notebook_guid=?)",
+                (notebook_guid,),
+            )
+            con.execute(
+                "delete from notes_text"
+                " where guid in (select guid from notes where notebook_guid=?)",
+                (notebook_guid,),
+            )
             con.execute("delete from notes where notebook_guid=?", (notebook_guid,))
 
-    def get_notes_count(self, is_active: bool = True) -> int:
+            self._delete_orphan_resources(linked_hashes)
+
+    def recompress_notes(self, codec: Codec) -> int:
+        count_notes = self._recompress_table(
+            "notes", "guid", "raw_note", _recode_note, codec
+        )
+        self._recompress_table("notes_stash", "guid", "raw_note", _recode_note, codec)
+        self._recompress_table(
+            "resources", "body_hash", "raw_body", _recode_blob, codec
+        )
+
+        return count_notes
+
+    def migrate_note_resources(self) -> None:
+        """Move resource bodies out of stored notes into shared resources table"""
+
         with self.db as con:
             cur = con.execute(
-                "select COUNT(guid)"
-                " from notes"
-                " where is_active=? and raw_note is not NULL",
-                (is_active,),
+                "select guid from notes"
+                " where raw_note is not NULL"
+                " and guid not in (select note_guid from note_resources)"
             )
+            note_guids = [row["guid"] for row in cur.fetchall()]
 
-            return int(cur.fetchone()[0])
+        if note_guids:
+            logger.info(f"Moving attachments of {len(note_guids)} notes...")
+
+        for note_guid in note_guids:
+            note = self.get_note(note_guid)
 
-    def _get_notes_by_notebook(self, notebook_guid: str) -> list[str]:
-        """Due to wrong idx_notes index, SQLite creates a temporary table on
-            from notes where notebook_guid=? and is_active=1
-            order by title COLLATE NOCASE
-        which may cause a memory leak. This method sorts notes alphabetically
-        to prevent SQLite from creating a sort table."""
+            if note is not None and note.resources:
+                self.add_note(note)
+
+    def get_existing_note_guids(
+        self, guids: Iterable[str], include_trash: bool = False
+    ) -> set[str]:
+        existing_guids = set()
 
+        with self.db as con:
+            for note_guid in guids:
+                cur = con.execute(
+                    "select is_active from notes where guid=? and raw_note is not NULL",
+                    (note_guid,),
+                )
+
+                row = cur.fetchone()
+
+                if row is not None and (include_trash or row["is_active"]):
+                    existing_guids.add(note_guid)
+
+        return existing_guids
+
+    def get_notes_count(self, is_active: bool = True) -> int:
         with self.db as con:
             cur = con.execute(
-                "select guid, title"
+                "select COUNT(guid)"
                 " from notes"
-                " where notebook_guid=? and is_active=1 and raw_note is not NULL",
-                (notebook_guid,),
+                " where is_active=? and raw_note is not NULL",
+                (is_active,),
             )
 
-            sorted_notes = sorted(cur, key=lambda x: x["title"])
-
-            return [r["guid"] for r in sorted_notes]
+            return int(cur.fetchone()[0])
 
     def _get_raw_note(
         self,
         note_title: str,
         note_guid: str,
         raw_note: bytes,
+        codec_name: Optional[str] = None,
     ) -> Optional[Note]:
+        codec = get_codec(codec_name)
+
         try:
-            return pickle.loads(lzma.decompress(raw_note))
+            note = codec.loads_note(raw_note)
+            self._inflate_resources(note)
         except Exception:
             if logger.getEffectiveLevel() == logging.DEBUG:
                 logger.exception(f"Note '{note_title}' [{note_guid}] is corrupt")
 
             logger.warning(f"Note '{note_title}' [{note_guid}] is corrupt")
+        else:
+            return note
 
         return None
 
+    def _inflate_resources(self, note: Note) -> None:
+        for resource in note.resources or []:
+            if resource.data is None or resource.data.body is not None:
+                continue
+
+            cur = self.db.execute(
+                "select raw_body, codec from resources where body_hash=?",
+                (resource.data.bodyHash,),
+            )
+
+            row = cur.fetchone()
+
+            if row is None:
+                raise KeyError(f"Resource [{resource.guid}] body is missing")
+
+            resource.data.body = get_codec(row["codec"]).decompress(row["raw_body"])
+
+    def _set_note_metadata(self, note_guid: str, metadata: NoteMetadata) -> None:
+        self.db.execute(
+            "update notes set created=?, updated=?, content_length=?,"
+            " resources_size=?, resources_count=?"
+            " where guid=?",
+            (
+                metadata.created,
+                metadata.updated,
+                metadata.content_length,
+                metadata.resources_size,
+                metadata.resources_count,
+                note_guid,
+            ),
+        )
+        self.db.execute("delete from note_tags where note_guid=?", (note_guid,))
+        self.db.executemany(
+            "insert into note_tags(note_guid, tag_name) values (?, ?)",
+            ((note_guid, t) for t in metadata.tag_names),
+        )
+
+    def _set_note_search_text(
+        self, note_guid: str, search_text: NoteSearchText
+    ) -> None:
+        # Full-text index is kept in sync by notes_text triggers
+        self.db.execute("delete from notes_text where guid=?", (note_guid,))
+        self.db.execute(
+            "insert into notes_text(guid, title, content, tags, recognition)"
+            " values (?, ?, ?, ?, ?)",
+            (note_guid, *search_text),
+        )
+
+    def _get_linked_resources(self, note_guid: str) -> set[bytes]:
+        cur = self.db.execute(
+            "select body_hash from note_resources where note_guid=?",
+            (note_guid,),
+        )
+
+        return {row["body_hash"] for row in cur.fetchall()}
+
+    def _delete_orphan_resources(self, body_hashes: Iterable[bytes]) -> None:
+        self.db.executemany(
+            "delete from resources where body_hash=?"
+            " and not exists (select 1 from note_resources where body_hash=?)",
+            ((h, h) for h in body_hashes),
+        )
+
     def _mark_note_for_redownload(self, note_guid: str) -> None:
         with self.db as con:
             con.execute(
@@ -498,40 +1909,111 @@ class NoteStorage(SqliteStorage):  # noqa: WPS214
 
 class TasksStorage(SqliteStorage):  # noqa: WPS214
     def add_tasks(self, tasks: Iterable[Task]) -> None:
-        for task in tasks:
-            self.add_task(task)
+        codec = self.get_write_codec()
 
-    def add_task(self, task: Task) -> None:
-        logger.debug(f"Adding/updating task [{task.taskId}] note_id [{task.parentId}]")
+        rows = []
+        for task in tasks:
+            logger.debug(
+                f"Adding/updating task [{task.taskId}] note_id [{task.parentId}]"
+            )
 
-        task_deflated = lzma.compress(task.to_json().encode("utf-8"))
+            task_deflated = codec.compress(task.to_json().encode("utf-8"))
+            rows.append((task.taskId, task.parentId, task_deflated, codec.name))
 
         with self.db as con:
-            con.execute(
-                "replace into tasks(guid, note_guid, raw_task) values (?, ?, ?)",
-                (task.taskId, task.parentId, task_deflated),
+            con.executemany(
+                "replace into tasks(guid, note_guid, raw_task, codec)"
+                " values (?, ?, ?, ?)",
+                rows,
             )
 
+    def add_task(self, task: Task) -> None:
+        self.add_tasks([task])
+
     def iter_tasks(self, note_guid: str) -> Iterator[Task]:
         with self.db as con:
             cur = con.execute(
-                "select guid, raw_task from tasks where note_guid=?",
+                "select guid, raw_task, codec from tasks where note_guid=?",
                 (note_guid,),
             )
 
+        for row in cur:
+            raw_task = self._get_raw_task(row["guid"], row["raw_task"], row["codec"])
+
+            if raw_task:
+                yield raw_task
+
+    def iter_notebook_tasks(self, notebook_guid: str) -> Iterator[Task]:
+        """Tasks of all active notes in notebook, fetched in one query"""
+
+        return self._iter_tasks_joined(
+            "notes.notebook_guid=? and notes.is_active=1", (notebook_guid,)
+        )
+
+    def iter_trash_tasks(self) -> Iterator[Task]:
+        return self._iter_tasks_joined("notes.is_active=0", ())
+
+    def get_notes_tasks_digests(self) -> dict[str, str]:
+        """Digest of stored tasks and their reminders for each note
+
+        Task changes don't always bump note USN, this tells them apart without
+        decoding anything.
+        """
+
+        digests: dict[str, Any] = {}
+
+        with self.db as con:
+            cur = con.execute(
+                "select note_guid, guid, raw_task as raw_data from tasks"
+                " union all"
+                " select tasks.note_guid, reminders.guid, reminders.raw_reminder"
+                " from reminders join tasks on tasks.guid=reminders.task_guid"
+                " order by 1, 2"
+            )
+
             for row in cur:
-                raw_task = self._get_raw_task(row["guid"], row["raw_task"])
+                note_digest = digests.get(row["note_guid"])
+                if note_digest is None:
+                    note_digest = hashlib.md5()  # noqa: S324
+                    digests[row["note_guid"]] = note_digest
+
+                note_digest.update(row["guid"].encode())
+                note_digest.update(row["raw_data"])
 
-                if raw_task:
-                    yield raw_task
+        return {note_guid: d.hexdigest() for note_guid, d in digests.items()}
 
     def expunge_tasks(self, guids: Iterable[str]) -> None:
         with self.db as con:
             con.executemany("delete from tasks where guid=?", ((g,) for g in guids))
 
-    def _get_raw_task(self, task_guid: str, raw_task: bytes) -> Optional[Task]:
+    def recompress_tasks(self, codec: Codec) -> int:
+        return self._recompress_table("tasks", "guid", "raw_task", _recode_blob, codec)
+
+    def _iter_tasks_joined(
+        self, notes_filter: str, params: tuple[str, ...]
+    ) -> Iterator[Task]:
+        with self.db as con:
+            cur = con.execute(
+                "select tasks.guid, tasks.raw_task, tasks.codec"  # noqa: S608
+                " from tasks join notes on notes.guid=tasks.note_guid"
+                f" where {notes_filter}"
+                " order by tasks.rowid",
+                params,
+            )
+
+        for row in cur:
+            raw_task = self._get_raw_task(row["guid"], row["raw_task"], row["codec"])
+
+            if raw_task:
+                yield raw_task
+
+    def _get_raw_task(
+        self, task_guid: str, raw_task: bytes, codec_name: Optional[str] = None
+    ) -> Optional[Task]:
+        codec = get_codec(codec_name)
+
         try:
-            return Task.from_json(lzma.decompress(raw_task).decode("utf-8"))
+            return Task.from_json(codec.decompress(raw_task).decode("utf-8"))
         except Exception:
             if logger.getEffectiveLevel() == logging.DEBUG:
                 logger.exception(f"Task [{task_guid}] is corrupt")
@@ -543,43 +2025,93 @@ class TasksStorage(SqliteStorage):  # noqa: WPS214
 
 class RemindersStorage(SqliteStorage):  # noqa: WPS214
     def add_reminders(self, reminders: Iterable[Reminder]) -> None:
-        for reminder in reminders:
-            self.add_reminder(reminder)
+        codec = self.get_write_codec()
 
-    def add_reminder(self, reminder: Reminder) -> None:
-        logger.debug(
-            f"Adding/updating reminder [{reminder.reminderId}] task_id [{reminder.sourceId}]"
-        )
+        rows = []
+        for reminder in reminders:
+            logger.debug(
+                f"Adding/updating reminder [{reminder.reminderId}] task_id [{reminder.sourceId}]"
+            )
 
-        reminder_deflated = lzma.compress(reminder.to_json().encode("utf-8"))
+            reminder_deflated = codec.compress(reminder.to_json().encode("utf-8"))
+            rows.append(
+                (reminder.reminderId, reminder.sourceId, reminder_deflated, codec.name)
+            )
 
         with self.db as con:
-            con.execute(
-                "replace into reminders(guid, task_guid, raw_reminder)"
-                " values (?, ?, ?)",
-                (reminder.reminderId, reminder.sourceId, reminder_deflated),
+            con.executemany(
+                "replace into reminders(guid, task_guid, raw_reminder, codec)"
+                " values (?, ?, ?, ?)",
+                rows,
             )
 
+    def add_reminder(self, reminder: Reminder) -> None:
+        self.add_reminders([reminder])
+
     def iter_reminders(self, task_guid: str) -> Iterator[Reminder]:
         with self.db as con:
             cur = con.execute(
-                "select guid, raw_reminder from reminders where task_guid=?",
+                "select guid, raw_reminder, codec from reminders where task_guid=?",
                 (task_guid,),
             )
 
-            for row in cur:
-                raw_reminder = self._get_raw_reminder(row["guid"], row["raw_reminder"])
+        for row in cur:
+            raw_reminder = self._get_raw_reminder(
+                row["guid"], row["raw_reminder"], row["codec"]
+            )
+
+            if raw_reminder:
+                yield raw_reminder
 
-                if raw_reminder:
-                    yield raw_reminder
+    def iter_notebook_reminders(self, notebook_guid: str) -> Iterator[Reminder]:
+        """Reminders of tasks of all active notes in notebook, in one query"""
+
+        return self._iter_reminders_joined(
+            "notes.notebook_guid=? and notes.is_active=1", (notebook_guid,)
+        )
+
+    def iter_trash_reminders(self) -> Iterator[Reminder]:
+        return self._iter_reminders_joined("notes.is_active=0", ())
 
     def expunge_reminders(self, guids: Iterable[str]) -> None:
         with self.db as con:
             con.executemany("delete from reminders where guid=?", ((g,) for g in guids))
 
-    def _get_raw_reminder(self, guid: str, raw_reminder: bytes) -> Optional[Reminder]:
+    def recompress_reminders(self, codec: Codec) -> int:
+        return self._recompress_table(
+            "reminders", "guid", "raw_reminder", _recode_blob, codec
+        )
+
+    def _iter_reminders_joined(
+        self, notes_filter: str, params: tuple[str, ...]
+    ) -> Iterator[Reminder]:
+        with self.db as con:
+            cur = con.execute(
+                "select reminders.guid, reminders.raw_reminder,"  # noqa: S608
+                " reminders.codec"
+                " from reminders"
+                " join tasks on tasks.guid=reminders.task_guid"
+                " join notes on notes.guid=tasks.note_guid"
+                f" where {notes_filter}"
+                " order by reminders.rowid",
+                params,
+            )
+
+        for row in cur:
+            raw_reminder = self._get_raw_reminder(
+                row["guid"], row["raw_reminder"], row["codec"]
+            )
+
+            if raw_reminder:
+                yield raw_reminder
+
+    def _get_raw_reminder(
+        self, guid: str, raw_reminder: bytes, codec_name: Optional[str] = None
+    ) -> Optional[Reminder]:
+        codec = get_codec(codec_name)
+
         try:
-            return Reminder.from_json(lzma.decompress(raw_reminder).decode("utf-8"))
+            return Reminder.from_json(codec.decompress(raw_reminder).decode("utf-8"))
         except Exception:
             if logger.getEffectiveLevel() == logging.DEBUG:
                 logger.exception(f"Reminder [{guid}] is corrupt")
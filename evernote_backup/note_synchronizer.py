@@ -1,8 +1,19 @@
+import asyncio
 import logging
+import queue
 import threading
+import time
+from collections import deque
 from collections.abc import Iterable
-from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, as_completed, wait
-from typing import Any, Optional
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    FIRST_EXCEPTION,
+    Future,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from typing import TYPE_CHECKING, Any, Optional
 
 from click import progressbar
 from evernote.edam.error.ttypes import EDAMErrorCode, EDAMSystemException
@@ -10,15 +21,36 @@ from evernote.edam.notestore.ttypes import SyncChunk
 from evernote.edam.type.ttypes import LinkedNotebook, Note
 
 from evernote_backup.cli_app_util import chunks, get_progress_output
-from evernote_backup.evernote_client_sync import EvernoteClientSync
+from evernote_backup.evernote_client_api_async import AsyncNoteStoreClient
+from evernote_backup.evernote_client_sync import (
+    NOTE_WITHOUT_RESOURCES_DATA_SPEC,
+    EvernoteClientSync,
+)
 from evernote_backup.evernote_client_util import NotebookAuth
 from evernote_backup.evernote_types import SyncChunkV2
-from evernote_backup.note_storage import NoteForSync, SqliteStorage
+from evernote_backup.log_util import get_time_txt
+from evernote_backup.note_storage import (
+    EncodedNote,
+    NoteForSync,
+    NoteSyncState,
+    SqliteStorage,
+    encode_note,
+    get_note_resource_hashes,
+)
+
+if TYPE_CHECKING:
+    from click._termui_impl import ProgressBar
 
 logger = logging.getLogger(__name__)
 
 
 THREAD_CHUNK_SIZE = 1000
+LINKED_NOTEBOOK_QUEUE_SIZE = 10
+WRITER_ENCODER_WORKERS = 2
+WRITER_MAX_PENDING = 64
+WRITER_BATCH_NOTES = 100
+WRITER_BATCH_MEMORY_LIMIT = 32
+RATE_LIMIT_DEFAULT_DURATION = 300
 
 
 class WrongAuthUserError(Exception):
@@ -45,6 +77,56 @@ def get_note_size(note: Note) -> int:
     return int(size)
 
 
+def patch_note_metadata(stored_note: Note, note: Note) -> Optional[Note]:
+    """Apply metadata from sync chunk note to already downloaded note
+
+    Sync chunk notes have everything except content and resource bodies,
+    so those are carried over from stored note. Returns None if some of
+    the resources cannot be matched.
+    """
+
+    stored_resources = {r.guid: r for r in stored_note.resources or []}
+    stored_resources_by_hash = {
+        r.data.bodyHash: r for r in stored_note.resources or [] if r.data
+    }
+
+    for resource in note.resources or []:
+        stored_resource = stored_resources.get(resource.guid)
+
+        if stored_resource is None or stored_resource.data is None:
+            if resource.data is None:
+                return None
+
+            stored_resource = stored_resources_by_hash.get(resource.data.bodyHash)
+
+            if stored_resource is None:
+                return None
+
+        resource.data = stored_resource.data
+        resource.recognition = stored_resource.recognition
+        resource.alternateData = stored_resource.alternateData
+
+    note.content = stored_note.content
+
+    return note
+
+
+def _drain_download_queue(
+    note_queue: queue.Queue, download_thread: threading.Thread
+) -> None:
+    """Give back download slots of notes left unwritten, until downloads stop"""
+
+    while download_thread.is_alive() or not note_queue.empty():
+        try:
+            queue_item = note_queue.get(timeout=1)
+        except queue.Empty:
+            continue
+
+        if queue_item is not None:
+            _, _, release_slot = queue_item
+            release_slot()
+
+
 class NoteClientMemoryManager:
     def __init__(self, download_cache_memory_limit: int) -> None:
         self.memory_limit = download_cache_memory_limit * 1024 * 1024
@@ -90,6 +172,159 @@ class NoteClientMemoryManager:
             return self.memory < self.memory_limit
 
 
+class RateLimitGovernor:
+    """Pause all download workers while account is rate limited
+
+    Any worker hitting the limit reports it here, then every worker waits
+    until the limit expires and carries on from where it stopped.
+    """
+
+    def __init__(self) -> None:
+        self.total_wait = 0.0
+
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+        self._cancel_event = threading.Event()
+
+    def report_rate_limit(self, duration: Optional[int]) -> None:
+        if duration is None:
+            # Server didn't say how long limit lasts, wait long enough to be safe
+            duration = RATE_LIMIT_DEFAULT_DURATION
+
+        with self._lock:
+            now = time.monotonic()
+            resume_at = now + duration
+
+            if resume_at <= self._resume_at:
+                return
+
+            self.total_wait += resume_at - max(now, self._resume_at)
+            self._resume_at = resume_at
+
+        logger.warning(
+            f"Rate limit reached, downloads paused for {get_time_txt(duration)}..."
+        )
+
+    def wait(self) -> None:
+        pause_left = self.get_pause_left()
+
+        while pause_left > 0 and not self._cancel_event.wait(pause_left):
+            pause_left = self.get_pause_left()
+
+    async def wait_async(self) -> None:
+        pause_left = self.get_pause_left()
+
+        # Poll cancel flag, so aborted sync doesn't sit out the whole pause
+        while pause_left > 0 and not self._cancel_event.is_set():
+            await asyncio.sleep(min(pause_left, 1))
+            pause_left = self.get_pause_left()
+
+    def get_pause_left(self) -> float:
+        with self._lock:
+            return self._resume_at - time.monotonic()
+
+    def cancel(self) -> None:
+        self._cancel_event.set()
+
+
+class NoteWriter:
+    """Encode notes in background threads, write them in batched transactions
+
+    Database is only touched from the calling thread. Notes are written in
+    the order they were submitted, so writer must be flushed before making
+    any other changes to notes in storage.
+    """
+
+    def __init__(self, storage: SqliteStorage) -> None:
+        self.storage = storage
+        self.codec = storage.get_write_codec()
+
+        self.count_commits = 0
+        self.total_commit_time = 0.0
+        self.max_commit_time = 0.0
+        self.max_queue_depth = 0
+
+        self._encoder = ThreadPoolExecutor(max_workers=WRITER_ENCODER_WORKERS)
+        self._pending: deque[Future] = deque()
+        self._batch: list[EncodedNote] = []
+        self._batch_memory = 0
+        self._batch_memory_limit = WRITER_BATCH_MEMORY_LIMIT * 1024 * 1024
+
+    def submit(self, note: Note) -> None:
+        stored_hashes = self.storage.notes.get_stored_resource_hashes(note)
+
+        self._pending.append(
+            self._encoder.submit(encode_note, note, self.codec, stored_hashes)
+        )
+        self.max_queue_depth = max(self.max_queue_depth, len(self._pending))
+
+        # Don't let encoder fall too far behind downloads
+        while len(self._pending) > WRITER_MAX_PENDING:
+            self._add_to_batch(self._pending.popleft().result())
+
+        self.collect()
+
+    def collect(self) -> None:
+        while self._pending and self._pending[0].done():
+            self._add_to_batch(self._pending.popleft().result())
+
+    def flush(self) -> None:
+        while self._pending:
+            self._add_to_batch(self._pending.popleft().result())
+
+        self._commit()
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        finally:
+            self._encoder.shutdown()
+
+    def report(self) -> None:
+        if not self.count_commits:
+            return
+
+        avg_commit_ms = round(self.total_commit_time / self.count_commits * 1000)
+        max_commit_ms = round(self.max_commit_time * 1000)
+
+        logger.debug(
+            f"Note writer commits: {self.count_commits},"
+            f" latency avg {avg_commit_ms} ms, max {max_commit_ms} ms,"
+            f" max encoder queue depth: {self.max_queue_depth}"
+        )
+
+    def _add_to_batch(self, encoded_note: EncodedNote) -> None:
+        self._batch.append(encoded_note)
+        self._batch_memory += encoded_note.size
+
+        if (
+            len(self._batch) >= WRITER_BATCH_NOTES
+            or self._batch_memory >= self._batch_memory_limit
+        ):
+            self._commit()
+
+    def _commit(self) -> None:
+        if not self._batch:
+            return
+
+        batch = self._batch
+        self._batch = []
+        self._batch_memory = 0
+
+        commit_start = time.monotonic()
+        self.storage.notes.add_encoded_notes(batch)
+        commit_time = time.monotonic() - commit_start
+
+        self.count_commits += 1
+        self.total_commit_time += commit_time
+        self.max_commit_time = max(self.max_commit_time, commit_time)
+
+        logger.debug(
+            f"Committed {len(batch)} note(s) in {round(commit_time * 1000)} ms,"
+            f" encoder queue depth: {len(self._pending)}"
+        )
+
+
 class NoteClientWorker:
     def __init__(  # noqa: WPS211
         self,
@@ -108,25 +343,85 @@ class NoteClientWorker:
         self.max_chunk_results = max_chunk_results
 
         self.memory_manager = NoteClientMemoryManager(download_cache_memory_limit)
+        self.rate_limit_governor = RateLimitGovernor()
 
         self._thread_data = threading.local()
         self._note_client: EvernoteClientSync
 
-    def __call__(self, note_id: str, auth_data: Optional[NotebookAuth] = None) -> Note:
+    def __call__(
+        self,
+        note_id: str,
+        auth_data: Optional[NotebookAuth] = None,
+        known_resource_hashes: frozenset[bytes] = frozenset(),
+    ) -> Note:
         self.memory_manager.wait_till_enough_memory()
 
-        if self.stop:
-            raise WorkerStopException
+        self._note_client = self.get_note_client(auth_data)
+
+        while True:
+            self.rate_limit_governor.wait()
+
+            if self.stop:
+                raise WorkerStopException
+
+            try:
+                note = self.download_note(note_id, known_resource_hashes)
+            except EDAMSystemException as e:
+                self.rate_limit_governor.report_rate_limit(e.rateLimitDuration)
+            else:
+                break
+
+        self.memory_manager.add_note_size(note)
+        self.memory_manager.report_memory()
+
+        return note
+
+    def download_note(
+        self, note_id: str, known_resource_hashes: frozenset[bytes] = frozenset()
+    ) -> Note:
+        retry_count = 5
+
+        for _ in range(retry_count):
+            try:
+                if known_resource_hashes:
+                    return self._note_client.get_note_reusing_resources(
+                        note_id, known_resource_hashes
+                    )
+                return self._note_client.get_note(note_id)
+            except EDAMSystemException as e:
+                if e.errorCode == EDAMErrorCode.RATE_LIMIT_REACHED:
+                    raise
+
+                raise NoteDownloadException(
+                    f"Remote server returned system error ({e.errorCode.name} - {e.message})"
+                    f" while downloading note [{note_id}]"
+                )
+            except Exception:
+                # Known errors so far:
+                # EOFError     - thrift.transport.TTransport, empty body from server
+                # struct.error - some of the fields returned wrong type
+                if logger.getEffectiveLevel() == logging.DEBUG:
+                    logger.exception(
+                        f"Remote server returned bad data"
+                        f" while downloading note [{note_id}], retrying..."
+                    )
+
+        raise NoteDownloadException(
+            f"Failed to download note [{note_id}] after {retry_count} attempts!"
+        )
 
+    def get_note_client(
+        self, auth_data: Optional[NotebookAuth] = None
+    ) -> EvernoteClientSync:
         if auth_data is None:
             auth_data = NotebookAuth(token=self.token, shard="")
 
         client_id = auth_data.shard + auth_data.token
 
         try:
-            self._note_client = self.clients[client_id]
+            return self.clients[client_id]  # type: ignore
         except KeyError:
-            self._note_client = EvernoteClientSync(
+            note_client = EvernoteClientSync(
                 token=auth_data.token,
                 backend=self.backend,
                 network_error_retry_count=self.network_error_retry_count,
@@ -135,24 +430,84 @@ class NoteClientWorker:
             )
 
             if auth_data.shard:
-                self._note_client.shard = auth_data.shard
-                self._note_client.shared_mode = True
+                note_client.shard = auth_data.shard
+                note_client.shared_mode = True
 
-            self.clients[client_id] = self._note_client
+            self.clients[client_id] = note_client
 
-        note = self.download_note(note_id)
+            return note_client
 
-        self.memory_manager.add_note_size(note)
-        self.memory_manager.report_memory()
+    @property
+    def clients(self) -> Any:
+        try:
+            return self._thread_data.note_clients
+        except AttributeError:
+            self._thread_data.note_clients = {}
+            return self._thread_data.note_clients
+
+
+class AsyncNoteClientWorker:
+    """Counterpart of NoteClientWorker for asyncio download engine
+
+    Downloads are done with non-blocking HTTP client, so hundreds of requests
+    can be in flight without spawning an OS thread for each of them.
+    """
+
+    def __init__(self, note_worker: NoteClientWorker) -> None:
+        self.stop = False
+        self.note_worker = note_worker
+
+        self._note_stores: dict[int, AsyncNoteStoreClient] = {}
+        # Tag lookups are blocking calls, one thread keeps its tag caches warm
+        self._tags_executor = ThreadPoolExecutor(max_workers=1)
+
+    async def __call__(
+        self,
+        note_id: str,
+        auth_data: Optional[NotebookAuth] = None,
+        known_resource_hashes: frozenset[bytes] = frozenset(),
+    ) -> Note:
+        note_client = self.note_worker.get_note_client(auth_data)
+        note_store = self._get_note_store(note_client)
+
+        rate_limit_governor = self.note_worker.rate_limit_governor
+
+        while True:
+            await rate_limit_governor.wait_async()
+
+            if self.stop:
+                raise WorkerStopException
+
+            try:
+                note = await self.download_note(
+                    note_store, note_id, known_resource_hashes
+                )
+            except EDAMSystemException as e:
+                rate_limit_governor.report_rate_limit(e.rateLimitDuration)
+            else:
+                break
+
+        await asyncio.get_running_loop().run_in_executor(
+            self._tags_executor, self._fill_note_tags, note, auth_data
+        )
 
         return note
 
-    def download_note(self, note_id: str) -> Note:
+    async def download_note(
+        self,
+        note_store: AsyncNoteStoreClient,
+        note_id: str,
+        known_resource_hashes: frozenset[bytes] = frozenset(),
+    ) -> Note:
         retry_count = 5
 
         for _ in range(retry_count):
             try:
-                return self._note_client.get_note(note_id)
+                if known_resource_hashes:
+                    return await self._get_note_reusing_resources(
+                        note_store, note_id, known_resource_hashes
+                    )
+                return await note_store.get_note(note_id)
             except EDAMSystemException as e:
                 if e.errorCode == EDAMErrorCode.RATE_LIMIT_REACHED:
                     raise
@@ -162,9 +517,6 @@ class NoteClientWorker:
                     f" while downloading note [{note_id}]"
                 )
             except Exception:
-                # Known errors so far:
-                # EOFError     - thrift.transport.TTransport, empty body from server
-                # struct.error - some of the fields returned wrong type
                 if logger.getEffectiveLevel() == logging.DEBUG:
                     logger.exception(
                         f"Remote server returned bad data"
@@ -175,13 +527,51 @@ class NoteClientWorker:
             f"Failed to download note [{note_id}] after {retry_count} attempts!"
         )
 
-    @property
-    def clients(self) -> Any:
-        try:
-            return self._thread_data.note_clients
-        except AttributeError:
-            self._thread_data.note_clients = {}
-            return self._thread_data.note_clients
+    async def _get_note_reusing_resources(
+        self,
+        note_store: AsyncNoteStoreClient,
+        note_id: str,
+        known_resource_hashes: frozenset[bytes],
+    ) -> Note:
+        note = await note_store.get_note_with_result_spec(
+            note_id, NOTE_WITHOUT_RESOURCES_DATA_SPEC
+        )
+
+        missing_resources = [
+            r
+            for r in note.resources or []
+            if not (r.data and r.data.bodyHash in known_resource_hashes)
+        ]
+
+        full_resources = await asyncio.gather(
+            *(note_store.get_resource(r.guid) for r in missing_resources)
+        )
+
+        for resource, full_resource in zip(missing_resources, full_resources):
+            resource.data = full_resource.data
+            resource.recognition = full_resource.recognition
+            resource.alternateData = full_resource.alternateData
+
+        return note
+
+    async def close(self) -> None:
+        for note_store in self._note_stores.values():
+            await note_store.close()
+
+        self._tags_executor.shutdown()
+
+    def _fill_note_tags(
+        self, note: Note, auth_data: Optional[NotebookAuth] = None
+    ) -> None:
+        self.note_worker.get_note_client(auth_data).fill_note_tags(note)
+
+    def _get_note_store(self, note_client: EvernoteClientSync) -> AsyncNoteStoreClient:
+        client_id = id(note_client)
+
+        if client_id not in self._note_stores:
+            self._note_stores[client_id] = note_client.get_async_note_store()
+
+        return self._note_stores[client_id]
 
 
 class NoteSynchronizer:  # noqa: WPS214
@@ -192,9 +582,12 @@ class NoteSynchronizer:  # noqa: WPS214
         max_download_workers: int,
         download_cache_memory_limit: int,
         include_tasks: bool,
+        engine: str = "threads",
+        pipelined: bool = False,
     ) -> None:
         self._count_updated_notebooks = 0
         self._count_updated_notes = 0
+        self._count_patched_notes = 0
         self._count_updated_tasks = 0
         self._count_updated_reminders = 0
 
@@ -208,6 +601,8 @@ class NoteSynchronizer:  # noqa: WPS214
         self.storage = note_storage
         self.max_download_workers = max_download_workers
         self.include_tasks = include_tasks
+        self.engine = engine
+        self.pipelined = pipelined
 
         self.note_worker = NoteClientWorker(
             token=str(self.note_client.token),
@@ -219,28 +614,31 @@ class NoteSynchronizer:  # noqa: WPS214
         )
         self.linked_notebooks_auth: dict[str, NotebookAuth] = {}
 
-    def sync(self) -> None:
-        self._raise_on_wrong_user()
+        # Pipelined mode state, notes are downloaded while chunks are still syncing
+        self._pipeline_executor: Optional[ThreadPoolExecutor] = None
+        self._pipeline_futures: dict[Future, Note] = {}
+        self._pipeline_guids: dict[str, Future] = {}
+        self._pipeline_stale: set[Future] = set()
+        self._pipeline_failed: set[str] = set()
 
-        logger.info("Syncing user notebooks...")
-
-        self._sync_chunks()
+        self._note_writer: NoteWriter
 
-        if self.note_client.linked_notebooks:
-            logger.info("Syncing linked notebooks...")
-
-            for l_notebook in self.note_client.linked_notebooks.values():
-                self._sync_linked_notebook(l_notebook)
+    def sync(self) -> None:
+        self._raise_on_wrong_user()
 
-        notes_to_sync = self.storage.notes.get_notes_for_sync()
+        self._note_writer = NoteWriter(self.storage)
 
-        if notes_to_sync:
-            logger.info(f"{len(notes_to_sync)} note(s) to download...")
+        try:
+            if self.pipelined:
+                self._sync_pipelined()
+            else:
+                self._sync_notebooks()
 
-            self._authorize_linked_notebooks_for_notes(notes_to_sync)
-            self._download_scheduled_notes(notes_to_sync)
+            self._download_pending_notes()
+        finally:
+            self._note_writer.close()
 
-            self._count_updated_notes = len(notes_to_sync)
+        self._note_writer.report()
 
         if self.include_tasks:
             logger.info("Syncing tasks...")
@@ -249,6 +647,7 @@ class NoteSynchronizer:  # noqa: WPS214
         report = [
             ("Updated or added notebooks", self._count_updated_notebooks),
             ("Updated or added notes", self._count_updated_notes),
+            ("Updated notes metadata", self._count_patched_notes),
             ("Updated or added tasks", self._count_updated_tasks),
             ("Updated or added reminders", self._count_updated_reminders),
             ("Expunged notebooks", self._count_expunged_notebooks),
@@ -262,11 +661,80 @@ class NoteSynchronizer:  # noqa: WPS214
             if count > 0:
                 logger.info(f"{msg}: {count}")
 
+        rate_limit_wait = round(self.note_worker.rate_limit_governor.total_wait)
+        if rate_limit_wait > 0:
+            logger.info(
+                f"Time spent waiting on rate limits: {get_time_txt(rate_limit_wait)}"
+            )
+
+    def _sync_notebooks(self) -> None:
+        logger.info("Syncing user notebooks...")
+
+        self._sync_chunks()
+
+        if self.note_client.linked_notebooks:
+            logger.info("Syncing linked notebooks...")
+
+            self._sync_linked_notebooks()
+
+    def _sync_pipelined(self) -> None:
+        logger.debug(f"Pipelined sync worker threads: {self.max_download_workers}")
+
+        with ThreadPoolExecutor(max_workers=self.max_download_workers) as executor:
+            self._pipeline_executor = executor
+
+            try:
+                self._sync_notebooks()
+
+                if self._pipeline_futures:
+                    logger.info(
+                        f"Waiting for {len(self._pipeline_futures)} note(s)"
+                        " to finish downloading..."
+                    )
+
+                self._drain_pipeline(wait_all=True)
+            except (KeyboardInterrupt, Exception):
+                logger.warning("Aborting, please wait...")
+
+                self._stop_download_workers()
+
+                wait(
+                    self._pipeline_futures,
+                    timeout=30,  # noqa: WPS432
+                    return_when=FIRST_EXCEPTION,
+                )
+
+                raise
+            finally:
+                self._pipeline_executor = None
+
+    def _download_pending_notes(self) -> None:
+        self._note_writer.flush()
+
+        # In pipelined mode, this only catches up on notes that changed while
+        # being downloaded, or were left over from previous interrupted sync
+        notes_to_sync = tuple(
+            n
+            for n in self.storage.notes.get_notes_for_sync()
+            if n.guid not in self._pipeline_failed
+        )
+
+        if notes_to_sync:
+            logger.info(f"{len(notes_to_sync)} note(s) to download...")
+
+            self._authorize_linked_notebooks_for_notes(notes_to_sync)
+            self._download_scheduled_notes(notes_to_sync)
+
+            self._count_updated_notes += len(notes_to_sync)
+
     def _authorize_linked_notebooks_for_notes(
         self, notes_to_sync: tuple[NoteForSync, ...]
     ) -> None:
         linked_notebooks = {
-            n.linked_notebook_guid for n in notes_to_sync if n.linked_notebook_guid
+            n.linked_notebook_guid
+            for n in notes_to_sync
+            if n.linked_notebook_guid
+            and n.linked_notebook_guid not in self.linked_notebooks_auth
         }
 
         if linked_notebooks:
@@ -274,11 +742,36 @@ class NoteSynchronizer:  # noqa: WPS214
                 f"Requesting access to {len(linked_notebooks)} linked notebook(s)..."
             )
 
-            for ln_guid in linked_notebooks:
-                nb = self.storage.notebooks.get_notebook_by_linked_guid(ln_guid)
-                auth_token = self.note_client.auth_linked_notebook(ln_guid, nb.guid)
+            notebook_guids = {
+                ln_guid: self.storage.notebooks.get_notebook_by_linked_guid(
+                    ln_guid
+                ).guid
+                for ln_guid in linked_notebooks
+            }
+
+            with ThreadPoolExecutor(
+                max_workers=min(self.max_download_workers, len(linked_notebooks))
+            ) as executor:
+                auth_futures = {
+                    ln_guid: executor.submit(
+                        self.note_client.auth_linked_notebook, ln_guid, nb_guid
+                    )
+                    for ln_guid, nb_guid in notebook_guids.items()
+                }
+
+            for ln_guid, auth_f in auth_futures.items():
+                self.linked_notebooks_auth[ln_guid] = auth_f.result()
+
+    def _authorize_linked_notebook(self, ln_guid: str) -> NotebookAuth:
+        try:
+            return self.linked_notebooks_auth[ln_guid]
+        except KeyError:
+            nb = self.storage.notebooks.get_notebook_by_linked_guid(ln_guid)
+            auth_token = self.note_client.auth_linked_notebook(ln_guid, nb.guid)
 
-                self.linked_notebooks_auth[ln_guid] = auth_token
+            self.linked_notebooks_auth[ln_guid] = auth_token
+
+            return auth_token
 
     def _raise_on_wrong_user(self) -> None:
         remote_user = self.note_client.user
@@ -302,33 +795,117 @@ class NoteSynchronizer:  # noqa: WPS214
             file=get_progress_output(),
         ) as chunks_bar:
             for chunk in self.note_client.iter_sync_chunks(current_usn):
-                self._process_chunk(chunk)
+                with self.storage.transaction():
+                    self._process_chunk(chunk)
 
-                self.storage.config.set_config_value("USN", str(chunk.chunkHighUSN))
+                    self.storage.config.set_config_value("USN", str(chunk.chunkHighUSN))
 
                 chunks_bar.update(chunk.chunkHighUSN - last_usn)
                 last_usn = chunk.chunkHighUSN
 
-    def _sync_linked_notebook(self, l_notebook: LinkedNotebook) -> None:
-        current_usn = self.storage.notebooks.get_linked_notebook_usn(l_notebook.guid)
+    def _sync_linked_notebooks(self) -> None:
+        l_notebooks = list(self.note_client.linked_notebooks.values())
 
-        l_notebook_chunks = self.note_client.iter_linked_notebook_sync_chunks(
-            l_notebook, current_usn
-        )
+        current_usns = {
+            ln.guid: self.storage.notebooks.get_linked_notebook_usn(ln.guid)
+            for ln in l_notebooks
+        }
+
+        # Chunks are fetched concurrently, but applied here,
+        # since database connection belongs to this thread
+        chunk_queue: queue.Queue = queue.Queue(maxsize=LINKED_NOTEBOOK_QUEUE_SIZE)
+        stop_event = threading.Event()
+
+        with ThreadPoolExecutor(
+            max_workers=min(self.max_download_workers, len(l_notebooks))
+        ) as executor:
+            for l_notebook in l_notebooks:
+                executor.submit(
+                    self._fetch_linked_notebook_chunks,
+                    l_notebook,
+                    current_usns[l_notebook.guid],
+                    chunk_queue,
+                    stop_event,
+                )
 
-        for chunk in l_notebook_chunks:
+            try:
+                self._apply_linked_notebook_chunks(chunk_queue, len(l_notebooks))
+            except (KeyboardInterrupt, Exception):
+                stop_event.set()
+                raise
+
+    def _fetch_linked_notebook_chunks(
+        self,
+        l_notebook: LinkedNotebook,
+        current_usn: int,
+        chunk_queue: queue.Queue,
+        stop_event: threading.Event,
+    ) -> None:
+        def put_result(result: Any) -> bool:
+            while not stop_event.is_set():
+                try:
+                    chunk_queue.put((l_notebook, result), timeout=1)
+                except queue.Full:
+                    continue
+                return True
+            return False
+
+        try:
+            remote_usn = self.note_client.get_linked_notebook_remote_usn(l_notebook)
+
+            if remote_usn is not None and remote_usn != current_usn:
+                l_notebook_chunks = self.note_client.iter_linked_notebook_sync_chunks(
+                    l_notebook, current_usn
+                )
+
+                for chunk in l_notebook_chunks:
+                    if not put_result(chunk):
+                        return
+            else:
+                logger.debug(
+                    f"Linked notebook '{l_notebook.shareName}' [{l_notebook.guid}]"
+                    " is up to date"
+                )
+        except Exception as e:
+            put_result(e)
+            return
+
+        put_result(None)
+
+    def _apply_linked_notebook_chunks(
+        self, chunk_queue: queue.Queue, l_notebooks_count: int
+    ) -> None:
+        while l_notebooks_count > 0:
+            l_notebook, result = chunk_queue.get()
+
+            if result is None:
+                l_notebooks_count -= 1
+            elif isinstance(result, Exception):
+                raise result
+            else:
+                self._process_linked_notebook_chunk(l_notebook, result)
+
+    def _process_linked_notebook_chunk(
+        self, l_notebook: LinkedNotebook, chunk: SyncChunk
+    ) -> None:
+        with self.storage.transaction():
             for notebook in chunk.notebooks or []:
                 # Correct stack info is in LinkedNotebook
                 notebook.stack = l_notebook.stack
                 self.storage.notebooks.add_linked_notebook(l_notebook, notebook)
 
-            self._process_chunk(chunk)
+            self._process_chunk(chunk, l_notebook)
 
             self.storage.notebooks.set_linked_notebook_usn(
                 l_notebook.guid, chunk.chunkHighUSN
             )
 
-    def _process_chunk(self, chunk: SyncChunk) -> None:
+    def _process_chunk(
+        self, chunk: SyncChunk, l_notebook: Optional[LinkedNotebook] = None
+    ) -> None:
+        # Notes downloaded in pipelined mode must land before chunk changes them
+        self._note_writer.flush()
+
         self._expunge(
             expunged_notebooks=chunk.expungedNotebooks,
             expunged_notes=chunk.expungedNotes,
@@ -340,8 +917,180 @@ class NoteSynchronizer:  # noqa: WPS214
 
             self._count_updated_notebooks += len(chunk.notebooks)
 
-        if chunk.notes:
-            self.storage.notes.add_notes_for_sync(chunk.notes)
+        notes_to_download = self._patch_unchanged_notes(chunk.notes or [], l_notebook)
+
+        if notes_to_download:
+            self.storage.notes.add_notes_for_sync(notes_to_download)
+
+        if self._pipeline_executor is not None:
+            self._schedule_pipelined_notes(notes_to_download, l_notebook)
+            self._drain_pipeline()
+
+    def _patch_unchanged_notes(
+        self, notes: list[Note], l_notebook: Optional[LinkedNotebook]
+    ) -> list[Note]:
+        """Update already downloaded notes in place when their content is the same
+
+        Returns notes that have to be downloaded.
+        """
+
+        if not notes:
+            return []
+
+        notes_state = self.storage.notes.get_notes_sync_state(n.guid for n in notes)
+
+        notes_to_download = []
+
+        for note in notes:
+            note_state = notes_state.get(note.guid)
+
+            if note_state is None or note.guid in self._pipeline_guids:
+                notes_to_download.append(note)
+                continue
+
+            if (
+                note.updateSequenceNum is not None
+                and note_state.usn == note.updateSequenceNum
+            ):
+                logger.debug(f"Note [{note.guid}] is up to date, skipping")
+                continue
+
+            if not self._patch_note(note, note_state, l_notebook):
+                notes_to_download.append(note)
+
+        return notes_to_download
+
+    def _patch_note(
+        self,
+        note: Note,
+        note_state: NoteSyncState,
+        l_notebook: Optional[LinkedNotebook],
+    ) -> bool:
+        if note.contentHash is None:
+            return False
+
+        # Hashes are not stored for notes downloaded by older versions
+        if note_state.content_hash is not None and (
+            note_state.content_hash != note.contentHash
+            or note_state.resource_hashes != get_note_resource_hashes(note)
+        ):
+            return False
+
+        stored_note = self.storage.notes.get_note(note.guid)
+
+        if (
+            stored_note is None
+            or stored_note.contentHash != note.contentHash
+            or get_note_resource_hashes(stored_note) != get_note_resource_hashes(note)
+        ):
+            return False
+
+        patched_note = patch_note_metadata(stored_note, note)
+
+        if patched_note is None:
+            return False
+
+        if patched_note.tagGuids:
+            if l_notebook is None:
+                note_client = self.note_client
+            else:
+                note_client = self.note_worker.get_note_client(
+                    self._authorize_linked_notebook(l_notebook.guid)
+                )
+
+            try:
+                note_client.fill_note_tags(patched_note)
+            except KeyError:
+                # Tag was created after tag list was cached
+                return False
+
+        logger.debug(f"Note [{note.guid}] content is unchanged, updating metadata")
+
+        self.storage.notes.add_note(patched_note)
+        self._count_patched_notes += 1
+
+        return True
+
+    def _schedule_pipelined_notes(
+        self, notes: list[Note], l_notebook: Optional[LinkedNotebook]
+    ) -> None:
+        if not notes:
+            return
+
+        # Notes changed again while still downloading will be re-downloaded
+        # after the pipeline is drained
+        self._discard_pipelined_notes(n.guid for n in notes)
+
+        auth_data = (
+            self._authorize_linked_notebook(l_notebook.guid) if l_notebook else None
+        )
+
+        for note in notes:
+            note_f = self._pipeline_executor.submit(  # type: ignore
+                self.note_worker,
+                note.guid,
+                auth_data,
+                self.storage.notes.get_known_resource_hashes(note.guid),
+            )
+
+            self._pipeline_futures[note_f] = note
+            self._pipeline_guids[note.guid] = note_f
+
+    def _discard_pipelined_notes(self, note_guids: Iterable[str]) -> None:
+        for note_guid in note_guids:
+            note_f = self._pipeline_guids.pop(note_guid, None)
+            if note_f is not None:
+                self._pipeline_stale.add(note_f)
+
+    def _discard_pipelined_notebook(self, notebook_guid: str) -> None:
+        self._discard_pipelined_notes(
+            n.guid
+            for n in self._pipeline_futures.values()
+            if n.notebookGuid == notebook_guid
+        )
+
+    def _drain_pipeline(self, wait_all: bool = False) -> None:
+        while self._pipeline_futures:
+            # Block only when too many notes are pending, to keep memory in check
+            is_blocking = wait_all or len(self._pipeline_futures) > THREAD_CHUNK_SIZE
+
+            done_futures, _ = wait(
+                self._pipeline_futures,
+                timeout=None if is_blocking else 0,
+                return_when=FIRST_COMPLETED,
+            )
+
+            if not done_futures:
+                return
+
+            for note_f in done_futures:
+                self._write_pipelined_note(note_f)
+
+    def _write_pipelined_note(self, note_f: Future) -> None:
+        note_meta = self._pipeline_futures.pop(note_f)
+
+        if self._pipeline_guids.get(note_meta.guid) is note_f:
+            del self._pipeline_guids[note_meta.guid]
+
+        is_stale = note_f in self._pipeline_stale
+        self._pipeline_stale.discard(note_f)
+
+        f_exc = note_f.exception()
+        if f_exc is not None:
+            self._handle_download_error(f_exc, note_meta.title)
+
+            if not is_stale:
+                self._pipeline_failed.add(note_meta.guid)
+            return
+
+        note = note_f.result()
+
+        if is_stale:
+            logger.debug(f"Note [{note.guid}] changed while downloading, skipping")
+        elif self._store_downloaded_note(note):
+            self._count_updated_notes += 1
+
+        self.note_worker.memory_manager.sub_note_size(note)
 
     def _expunge(
         self,
@@ -357,6 +1106,7 @@ class NoteSynchronizer:  # noqa: WPS214
             self._count_expunged_notebooks += len(expunged_notebooks)
 
         if expunged_notes:
+            self._discard_pipelined_notes(expunged_notes)
             self.storage.notes.expunge_notes(expunged_notes)
 
             self._count_expunged_notes += len(expunged_notes)
@@ -387,11 +1137,18 @@ class NoteSynchronizer:  # noqa: WPS214
         except ValueError:
             return
 
+        self._discard_pipelined_notebook(notebook.guid)
+
         self.storage.notebooks.expunge_notebooks((notebook.guid,))
         self.storage.notes.expunge_notes_by_notebook(notebook.guid)
 
     def _download_scheduled_notes(self, notes_to_sync: tuple[NoteForSync, ...]) -> None:
         logger.info(f"Downloading {len(notes_to_sync)} note(s)...")
+
+        if self.engine == "asyncio":
+            self._download_scheduled_notes_async(notes_to_sync)
+            return
+
         logger.debug(f"Sync worker threads: {self.max_download_workers}")
 
         with ThreadPoolExecutor(max_workers=self.max_download_workers) as executor:
@@ -405,6 +1162,8 @@ class NoteSynchronizer:  # noqa: WPS214
                         executor, notes_bar, notes_to_sync_chunk
                     )
 
+        self._note_writer.flush()
+
     def _process_download_chunk(
         self,
         executor: Any,
@@ -416,6 +1175,7 @@ class NoteSynchronizer:  # noqa: WPS214
                 self.note_worker,
                 n.guid,
                 self.linked_notebooks_auth.get(n.linked_notebook_guid),  # type: ignore
+                n.known_resource_hashes,
             ): n.title
             for n in notes_chunk
         }
@@ -424,27 +1184,12 @@ class NoteSynchronizer:  # noqa: WPS214
             for note_f in as_completed(note_futures):
                 f_exc = note_f.exception()
                 if f_exc is not None:
-                    if isinstance(f_exc, NoteDownloadException):
-                        logger.error(f_exc)
-                        logger.warning(
-                            f"Note '{note_futures[note_f]}' will be skipped for this run"
-                            " and retried during the next sync."
-                        )
-                        notes_bar.update(1)
-                        continue
-                    elif isinstance(f_exc, EDAMSystemException):
-                        # Only for rate limit error
-                        raise f_exc
-                    else:
-                        logger.critical(
-                            f"Unknown exception caught while downloading note"
-                            f" '{note_futures[note_f]}'!"
-                        )
-
-                        raise f_exc
+                    self._handle_download_error(f_exc, note_futures[note_f])
+                    notes_bar.update(1)
+                    continue
 
                 note = note_f.result(timeout=120)  # noqa: WPS432
-                self.storage.notes.add_note(note)
+                self._store_downloaded_note(note)
 
                 self.note_worker.memory_manager.sub_note_size(note)
 
@@ -453,13 +1198,181 @@ class NoteSynchronizer:  # noqa: WPS214
         except (KeyboardInterrupt, Exception):
             logger.warning("Aborting, please wait...")
 
-            self.note_worker.stop = True
-            self.note_worker.memory_manager.reset_memory()
+            self._stop_download_workers()
 
             wait(note_futures, timeout=30, return_when=FIRST_EXCEPTION)  # noqa: WPS432
 
             raise
 
+    def _store_downloaded_note(self, note: Note) -> bool:
+        if not self.storage.notes.restore_stashed_resources(note):
+            logger.error(
+                f"Failed to restore stored resources of note '{note.title}'"
+                f" [{note.guid}]"
+            )
+            logger.warning(
+                f"Note '{note.title}' will be skipped for this run"
+                " and fully downloaded during the next sync."
+            )
+
+            self.storage.notes.discard_stashed_note(note.guid)
+
+            return False
+
+        self._note_writer.submit(note)
+
+        return True
+
+    def _stop_download_workers(self) -> None:
+        self.note_worker.stop = True
+        self.note_worker.memory_manager.reset_memory()
+        self.note_worker.rate_limit_governor.cancel()
+
+    def _handle_download_error(self, f_exc: BaseException, note_title: str) -> None:
+        if isinstance(f_exc, NoteDownloadException):
+            logger.error(f_exc)
+            logger.warning(
+                f"Note '{note_title}' will be skipped for this run"
+                " and retried during the next sync."
+            )
+        else:
+            logger.critical(
+                f"Unknown exception caught while downloading note '{note_title}'!"
+            )
+
+            raise f_exc
+
+    def _download_scheduled_notes_async(
+        self, notes_to_sync: tuple[NoteForSync, ...]
+    ) -> None:
+        logger.debug(f"Sync concurrent downloads: {self.max_download_workers}")
+
+        note_worker = AsyncNoteClientWorker(self.note_worker)
+        note_queue: queue.Queue = queue.Queue()
+        download_errors: list[BaseException] = []
+
+        # Event loop only does network in its own thread, downloaded notes are
+        # written here, since database connection belongs to this thread
+        download_thread = threading.Thread(
+            target=self._run_download_loop,
+            args=(notes_to_sync, note_worker, note_queue, download_errors),
+        )
+
+        notes_bar: ProgressBar[int]
+        with progressbar(
+            length=len(notes_to_sync),
+            show_pos=True,
+            file=get_progress_output(),
+        ) as notes_bar:
+            download_thread.start()
+
+            try:
+                self._write_downloaded_notes(note_queue, notes_bar)
+            except (KeyboardInterrupt, Exception):
+                logger.warning("Aborting, please wait...")
+
+                note_worker.stop = True
+                self._stop_download_workers()
+
+                _drain_download_queue(note_queue, download_thread)
+
+                raise
+            finally:
+                download_thread.join()
+
+        if download_errors:
+            raise download_errors[0]
+
+        self._note_writer.flush()
+
+    def _run_download_loop(
+        self,
+        notes_to_sync: tuple[NoteForSync, ...],
+        note_worker: AsyncNoteClientWorker,
+        note_queue: queue.Queue,
+        download_errors: list[BaseException],
+    ) -> None:
+        try:
+            asyncio.run(
+                self._download_notes_async(notes_to_sync, note_worker, note_queue)
+            )
+        except BaseException as e:
+            download_errors.append(e)
+        finally:
+            note_queue.put(None)
+
+    async def _download_notes_async(
+        self,
+        notes_to_sync: tuple[NoteForSync, ...],
+        note_worker: AsyncNoteClientWorker,
+        note_queue: queue.Queue,
+    ) -> None:
+        loop = asyncio.get_running_loop()
+
+        # Slot is given back only after note is written, so slow disk slows
+        # down downloads instead of piling notes up in memory
+        download_slots = asyncio.Semaphore(self.max_download_workers)
+
+        def release_slot() -> None:
+            loop.call_soon_threadsafe(download_slots.release)
+
+        async def download(note_for_sync: NoteForSync) -> None:
+            try:
+                note = await note_worker(
+                    note_for_sync.guid,
+                    self.linked_notebooks_auth.get(
+                        note_for_sync.linked_notebook_guid  # type: ignore
+                    ),
+                    note_for_sync.known_resource_hashes,
+                )
+            except Exception as e:
+                note_queue.put((note_for_sync, e, release_slot))
+            else:
+                note_queue.put((note_for_sync, note, release_slot))
+
+        download_tasks = []
+
+        try:
+            for note_for_sync in notes_to_sync:
+                await download_slots.acquire()
+
+                if note_worker.stop:
+                    download_slots.release()
+                    break
+
+                download_tasks.append(asyncio.create_task(download(note_for_sync)))
+
+            await asyncio.gather(*download_tasks)
+
+            # Wait for the rest of notes to be written, so no slot is released late
+            for _ in range(self.max_download_workers):
+                await download_slots.acquire()
+        finally:
+            note_worker.stop = True
+
+            await note_worker.close()
+
+    def _write_downloaded_notes(self, note_queue: queue.Queue, notes_bar: Any) -> None:
+        while True:
+            queue_item = note_queue.get()
+
+            if queue_item is None:
+                break
+
+            note_for_sync, result, release_slot = queue_item
+
+            try:
+                if isinstance(result, BaseException):
+                    self._handle_download_error(result, note_for_sync.title)
+                    notes_bar.update(1)
+                    continue
+
+                self._store_downloaded_note(result)
+
+                notes_bar.update(1, result)
+            finally:
+                release_slot()
+
     def _sync_chunks_v2(self) -> None:
         last_connection_tasks = int(
             self.storage.config.get_config_value("last_connection_tasks")
@@ -471,10 +1384,11 @@ class NoteSynchronizer:  # noqa: WPS214
             chunk_iter, show_pos=True, file=get_progress_output()
         ) as chunks_bar:
             for chunk in chunks_bar:
-                self._process_chunk_v2(chunk)
-                self.storage.config.set_config_value(
-                    "last_connection_tasks", str(chunk.last_timestamp + 1)
-                )
+                with self.storage.transaction():
+                    self._process_chunk_v2(chunk)
+                    self.storage.config.set_config_value(
+                        "last_connection_tasks", str(chunk.last_timestamp + 1)
+                    )
 
     def _process_chunk_v2(self, chunk: SyncChunkV2) -> None:
         self._expunge(
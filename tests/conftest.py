@@ -1,3 +1,4 @@
+import copy
 import json
 import sqlite3
 import uuid
@@ -80,6 +81,9 @@ class FakeEvernoteValues:
 
         self.fake_updates = []
 
+        self.fake_note_spec_calls = []
+        self.fake_resource_calls = []
+
 
 class FakeEvernoteUserStore:
     fake_values = None
@@ -218,6 +222,25 @@ class FakeEvernoteNoteStore:
 
         return next(n for n in self.fake_values.fake_notes if n.guid == guid)
 
+    def getNoteWithResultSpec(self, guid, resultSpec):
+        self.fake_values.fake_note_spec_calls.append(guid)
+
+        note = copy.deepcopy(self.getNote(guid, True, True, True, True))
+
+        for resource in note.resources or []:
+            resource.data.body = None
+
+        return note
+
+    def getResource(
+        self, guid, withData, withRecognition, withAttributes, withAlternateData
+    ):
+        self.fake_values.fake_resource_calls.append(guid)
+
+        all_notes = self.fake_values.fake_notes + self.fake_values.fake_l_notes
+
+        return next(r for n in all_notes for r in n.resources or [] if r.guid == guid)
+
     def getFilteredSyncChunk(self, afterUSN, maxEntries, filter):
         self.fake_values.last_maxEntries = maxEntries
 
@@ -259,6 +282,12 @@ class FakeEvernoteNoteStore:
 
         return fake_chunk
 
+    def getLinkedNotebookSyncState(self, linkedNotebook):
+        if self.fake_values.fake_auth_linked_notebook_error:
+            raise EDAMNotFoundException
+
+        return MagicMock(updateCount=self.fake_values.fake_l_usn)
+
     def listLinkedNotebooks(self):
         return self.fake_values.fake_linked_notebooks
 
@@ -271,6 +300,23 @@ class FakeEvernoteNoteStore:
         return self.fake_values.fake_l_tags
 
 
+class FakeEvernoteAsyncNoteStore(FakeEvernoteNoteStore):
+    def __init__(self, auth_token: str, store_url: str, user_agent: str, **kwargs):
+        super().__init__(auth_token, store_url, user_agent)
+
+    async def get_note(self, note_guid):
+        return self.getNote(note_guid, True, True, True, True)
+
+    async def get_note_with_result_spec(self, note_guid, result_spec):
+        return self.getNoteWithResultSpec(note_guid, result_spec)
+
+    async def get_resource(self, resource_guid):
+        return self.getResource(resource_guid, True, True, False, True)
+
+    async def close(self):
+        pass
+
+
 class FakeSyncEventSource(MagicMock):
     fake_values = None
 
@@ -337,6 +383,7 @@ def mock_evernote_client(mocker):
 
     FakeEvernoteUserStore.fake_values = fake_values
     FakeEvernoteNoteStore.fake_values = fake_values
+    FakeEvernoteAsyncNoteStore.fake_values = fake_values
     FakeSyncEventSource.fake_values = fake_values
 
     class FakeUserStoreClientRetryable(RetryableMixin, FakeEvernoteUserStore):
@@ -355,6 +402,11 @@ def mock_evernote_client(mocker):
         new=FakeNoteStoreClientRetryable,
     )
 
+    mocker.patch(
+        "evernote_backup.evernote_client.AsyncNoteStoreClient",
+        new=FakeEvernoteAsyncNoteStore,
+    )
+
     mocker.patch("evernote_backup.evernote_client.EventSource", new=FakeSyncEventSource)
 
     return fake_values
@@ -368,12 +420,14 @@ def cli_invoker():
 
 @pytest.fixture
 def fake_storage(monkeypatch):
-    db = sqlite3.connect(":memory:")
+    db = sqlite3.connect(":memory:", factory=note_storage.StorageConnection)
     db.row_factory = sqlite3.Row
 
     with db as con:
         con.executescript(note_storage.DB_SCHEMA)
 
+    note_storage.create_search_index(db)
+
     fake_storage = note_storage.SqliteStorage(db)
 
     monkeypatch.setattr(cli_app, "get_storage", lambda *a, **kw: fake_storage)
@@ -400,6 +454,7 @@ def fake_init_db(fake_storage, fake_token, mock_evernote_client):
         network_retry_count=50,
         use_system_ssl_ca=False,
         custom_api_data=None,
+        storage_profile=None,
     )
 
 
@@ -419,6 +474,7 @@ def fake_init_db_china(fake_storage, fake_token, mock_evernote_client):
         network_retry_count=50,
         use_system_ssl_ca=False,
         custom_api_data=None,
+        storage_profile=None,
     )
 
 
@@ -155,6 +155,18 @@ def test_cli_program_error_rate_limit(cli_invoker, mocker):
     assert "Rate limit reached" in result.output
 
 
+def test_cli_program_error_rate_limit_no_duration(cli_invoker, mocker):
+    cli_app_mock = mocker.patch("evernote_backup.cli.cli_app")
+    cli_app_mock.init_db.side_effect = EDAMSystemException(
+        errorCode=EDAMErrorCode.RATE_LIMIT_REACHED
+    )
+
+    result = cli_invoker("init-db")
+
+    assert result.exit_code == 1
+    assert "Rate limit reached. Restart program later." in result.output
+
+
 def test_cli_program_error_ssl_error(cli_invoker, mocker):
     cli_app_mock = mocker.patch("evernote_backup.cli.cli_app")
     cli_app_mock.init_db.side_effect = SSLError("test ssl error")
@@ -0,0 +1,124 @@
+import threading
+
+import pytest
+from evernote.edam.notestore.ttypes import SyncChunk
+from evernote.edam.type.ttypes import Note, Notebook, Resource
+
+from evernote_backup.evernote_client_sync import (
+    SYNC_CHUNK_ENTRY_SIZE,
+    SyncChunkPrefetcher,
+    get_chunk_size,
+)
+
+
+def _make_chunks(count):
+    return [
+        SyncChunk(
+            currentTime=0,
+            chunkHighUSN=i,
+            updateCount=count,
+            notes=[Note(guid=f"id{i}", title="test")],
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+def test_get_chunk_size():
+    test_chunk = SyncChunk(
+        currentTime=0,
+        updateCount=1,
+        notes=[
+            Note(guid="id1", resources=[Resource(guid="rid1"), Resource(guid="rid2")]),
+            Note(guid="id2"),
+        ],
+        notebooks=[Notebook(guid="nbid1")],
+        expungedNotes=["id3"],
+    )
+
+    assert get_chunk_size(test_chunk) == 6 * SYNC_CHUNK_ENTRY_SIZE
+    assert get_chunk_size(SyncChunk(currentTime=0, updateCount=1)) == 0
+
+
+def test_prefetcher_order():
+    test_chunks = _make_chunks(10)
+
+    prefetcher = SyncChunkPrefetcher(
+        (c for c in test_chunks), depth=3, memory_limit=1024
+    )
+
+    assert list(prefetcher) == test_chunks
+
+
+def test_prefetcher_error():
+    def fake_chunks():
+        yield from _make_chunks(2)
+        raise ConnectionError("test")
+
+    prefetcher = SyncChunkPrefetcher(fake_chunks(), depth=3, memory_limit=1024)
+
+    chunk_iter = iter(prefetcher)
+
+    assert len([next(chunk_iter), next(chunk_iter)]) == 2
+
+    with pytest.raises(ConnectionError):
+        next(chunk_iter)
+
+
+@pytest.mark.parametrize(
+    ("depth", "memory_chunks", "expected_ahead"),
+    [
+        (2, 100, 2),
+        (10, 3, 3),
+        # Single chunk over memory limit is still fetched
+        (10, 0, 1),
+    ],
+)
+def test_prefetcher_limits(depth, memory_chunks, expected_ahead):
+    test_chunks = _make_chunks(10)
+    chunk_size = get_chunk_size(test_chunks[0])
+
+    fetched = []
+    fetched_cond = threading.Condition()
+
+    def fake_chunks():
+        for chunk in test_chunks:
+            with fetched_cond:
+                fetched.append(chunk)
+                fetched_cond.notify_all()
+            yield chunk
+
+    prefetcher = SyncChunkPrefetcher(
+        fake_chunks(), depth=depth, memory_limit=chunk_size * memory_chunks
+    )
+
+    chunk_iter = iter(prefetcher)
+    next(chunk_iter)
+
+    with fetched_cond:
+        fetched_cond.wait_for(lambda: len(fetched) >= expected_ahead + 1, timeout=5)
+
+    # Give producer a chance to overrun the limit
+    threading.Event().wait(0.1)
+
+    # Consumed 1, buffered up to limit, 1 more fetched and waiting for room
+    assert len(fetched) == expected_ahead + 2
+
+    chunk_iter.close()
+
+
+def test_prefetcher_stop_early():
+    is_finished = threading.Event()
+
+    def fake_chunks():
+        try:
+            yield from _make_chunks(10)
+        finally:
+            is_finished.set()
+
+    prefetcher = SyncChunkPrefetcher(fake_chunks(), depth=1, memory_limit=1024)
+
+    chunk_iter = iter(prefetcher)
+    next(chunk_iter)
+    chunk_iter.close()
+
+    assert is_finished.wait(timeout=5)
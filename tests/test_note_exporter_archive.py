@@ -0,0 +1,81 @@
+import hashlib
+import io
+import tarfile
+import tracemalloc
+import zipfile
+
+import pytest
+
+from evernote_backup import note_exporter_archive
+from evernote_backup.note_exporter_archive import open_archive
+
+
+def test_tar_large_member_memory_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(note_exporter_archive, "TAR_MEMBER_SPOOL_SIZE", 1024 * 1024)
+
+    test_archive = tmp_path / "export.tar.gz"
+    test_chunk = "x" * 64 * 1024
+    test_chunks_count = 512  # 32 MB member
+
+    expected_hash = hashlib.md5()
+
+    tracemalloc.start()
+    try:
+        with test_archive.open("wb") as f, open_archive(f, "tar.gz") as archive:
+            with archive.open_member("big.enex") as member_out:
+                for _ in range(test_chunks_count):
+                    member_out.write(test_chunk)
+                    expected_hash.update(test_chunk.encode())
+
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    with tarfile.open(test_archive) as tf:
+        member = tf.getmember("big.enex")
+        member_data = tf.extractfile(member).read()
+
+    assert peak_memory < 8 * 1024 * 1024
+    assert member.size == len(test_chunk) * test_chunks_count
+    assert hashlib.md5(member_data).hexdigest() == expected_hash.hexdigest()
+
+
+def test_tar_small_members(tmp_path):
+    test_archive = tmp_path / "export.tar.gz"
+
+    with test_archive.open("wb") as f, open_archive(f, "tar.gz") as archive:
+        for member_name in ("a.enex", "b/c.enex"):
+            with archive.open_member(member_name) as member_out:
+                member_out.write(f"test {member_name} 😁")
+
+    with tarfile.open(test_archive) as tf:
+        archive_files = {
+            m.name: tf.extractfile(m).read().decode() for m in tf.getmembers()
+        }
+
+    assert archive_files == {
+        "a.enex": "test a.enex 😁",
+        "b/c.enex": "test b/c.enex 😁",
+    }
+
+
+@pytest.mark.parametrize("archive_format", ["tar.gz", "zip"])
+def test_archive_not_finalized_on_error(archive_format):
+    test_output = io.BytesIO()
+
+    with pytest.raises(RuntimeError):  # noqa: PT012
+        with open_archive(test_output, archive_format) as archive:
+            with archive.open_member("test1.enex") as member:
+                member.write("test1")
+
+            raise RuntimeError("test")
+
+    test_output.seek(0)
+
+    if archive_format == "zip":
+        with pytest.raises(zipfile.BadZipFile):
+            zipfile.ZipFile(test_output)
+    else:
+        with pytest.raises((tarfile.TarError, EOFError)):
+            with tarfile.open(fileobj=test_output) as tf:
+                tf.getmembers()
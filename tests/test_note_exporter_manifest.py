@@ -0,0 +1,114 @@
+import json
+import os
+
+from evernote_backup.note_exporter_manifest import (
+    MANIFEST_VERSION,
+    ExportManifest,
+    get_file_entry,
+    get_file_hash,
+)
+
+
+def _add_test_file(manifest, file_name, content):
+    file_path = manifest.target_dir / file_name
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    file_path.write_text(content)
+
+    manifest.add_file(
+        file_path,
+        get_file_entry(
+            file_path,
+            export_state="state",
+            notes={},
+            file_hash=get_file_hash(file_path),
+        ),
+    )
+
+    return file_path
+
+
+def test_is_up_to_date_same_size_edit(tmp_path):
+    manifest = ExportManifest(tmp_path)
+    test_file = _add_test_file(manifest, "test.enex", "content1")
+
+    assert manifest.is_up_to_date(test_file, "state")
+
+    test_mtime = test_file.stat().st_mtime_ns
+    test_file.write_text("content2")
+    os.utime(test_file, ns=(test_mtime + 10**9, test_mtime + 10**9))
+
+    assert not manifest.is_up_to_date(test_file, "state")
+
+
+def test_is_up_to_date_touched_file(tmp_path):
+    manifest = ExportManifest(tmp_path)
+    test_file = _add_test_file(manifest, "test.enex", "content1")
+
+    test_mtime = test_file.stat().st_mtime_ns
+    os.utime(test_file, ns=(test_mtime + 10**9, test_mtime + 10**9))
+
+    assert manifest.is_up_to_date(test_file, "state")
+
+
+def test_is_up_to_date_old_manifest(tmp_path):
+    test_file = tmp_path / "test.enex"
+    test_file.write_text("content1")
+
+    manifest_data = {
+        "version": MANIFEST_VERSION,
+        "files": {
+            "test.enex": {
+                "export_state": "state",
+                "notes": {},
+                "file_hash": get_file_hash(test_file),
+                "file_size": test_file.stat().st_size,
+            },
+        },
+    }
+    (tmp_path / ".export-manifest.json").write_text(json.dumps(manifest_data))
+
+    manifest = ExportManifest.load(tmp_path)
+
+    assert manifest.is_up_to_date(test_file, "state")
+
+    test_file.write_text("content2")
+
+    assert not manifest.is_up_to_date(test_file, "state")
+
+
+def test_remove_stale_files_outside_target_dir(tmp_path, caplog):
+    target_dir = tmp_path / "export"
+    outside_file = tmp_path / "outside.txt"
+    outside_file.write_text("keep")
+
+    old_manifest = ExportManifest(target_dir)
+    stale_file = _add_test_file(old_manifest, "dir/stale.enex", "stale")
+    old_manifest.files["../outside.txt"] = old_manifest.files["dir/stale.enex"]
+    old_manifest.files[str(outside_file)] = old_manifest.files["dir/stale.enex"]
+
+    count_removed = old_manifest.remove_stale_files(ExportManifest(target_dir))
+
+    assert count_removed == 1
+    assert not stale_file.parent.exists()
+    assert outside_file.read_text() == "keep"
+    assert "Not removing ../outside.txt" in caplog.text
+
+
+def test_remove_stale_files_symlink_outside(tmp_path):
+    target_dir = tmp_path / "export"
+    outside_dir = tmp_path / "outside"
+    outside_dir.mkdir()
+    (outside_dir / "test.enex").write_text("keep")
+
+    target_dir.mkdir()
+    (target_dir / "link").symlink_to(outside_dir, target_is_directory=True)
+
+    old_manifest = ExportManifest(target_dir)
+    old_manifest.files["link/test.enex"] = get_file_entry(
+        outside_dir / "test.enex", export_state="state", notes={}, file_hash=""
+    )
+
+    count_removed = old_manifest.remove_stale_files(ExportManifest(target_dir))
+
+    assert count_removed == 0
+    assert (outside_dir / "test.enex").read_text() == "keep"
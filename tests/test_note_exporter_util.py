@@ -1,6 +1,14 @@
+import os
+from pathlib import Path
+
 import pytest
 
-from evernote_backup.note_exporter_util import MAX_FILE_NAME_LEN, SafePath
+from evernote_backup.note_exporter_util import (
+    MAX_FILE_NAME_LEN,
+    SafePath,
+    ShardedFileWriter,
+    _trim_string,
+)
 
 
 def test_safe_path_dir(tmp_path):
@@ -41,6 +49,21 @@ def test_safe_path_dir_existing_overwrite(tmp_path):
     assert result_dir == existing_dir
 
 
+def test_safe_path_file_ignore_existing(tmp_path):
+    test_dir = tmp_path / "test"
+
+    existing_file = test_dir / "test1" / "test2.enex"
+    existing_file.parent.mkdir(parents=True)
+    existing_file.touch()
+
+    safe_path = SafePath(test_dir, ignore_existing=True)
+
+    assert safe_path.get_file("test1", "test2.enex") == existing_file
+    assert safe_path.get_file("test1", "test2.enex") == (
+        test_dir / "test1" / "test2 (1).enex"
+    )
+
+
 def test_safe_path_file(tmp_path):
     test_dir = tmp_path / "test"
     expected_file = tmp_path / "test" / "test1" / "test2" / "test3.txt"
@@ -226,3 +249,129 @@ def test_safe_path_no_trim(tmp_path):
 
     assert expected_file.is_file()
     assert result_file_path == expected_file
+
+
+def test_safe_path_many_same_names(tmp_path, mocker):
+    """Test that SafePath scans a directory once and numbers names in order"""
+    test_dir = tmp_path / "test"
+    test_dir.mkdir()
+    (test_dir / "Untitled.enex").touch()
+    (test_dir / "Untitled (2).enex").touch()
+
+    scandir_spy = mocker.spy(os, "scandir")
+    exists_spy = mocker.spy(Path, "exists")
+
+    safe_path = SafePath(test_dir)
+    result_names = [safe_path.get_file("Untitled.enex").name for _ in range(1000)]
+
+    assert result_names[:3] == [
+        "Untitled (1).enex",
+        "Untitled (3).enex",
+        "Untitled (4).enex",
+    ]
+    assert result_names[-1] == "Untitled (1001).enex"
+    assert len(set(result_names)) == 1000
+    assert scandir_spy.call_count == 1
+    assert exists_spy.call_count == 0
+
+
+def test_safe_path_numbered_name_taken(tmp_path):
+    test_dir = tmp_path / "test"
+
+    safe_path = SafePath(test_dir)
+
+    assert safe_path.get_file("test (1).enex").name == "test (1).enex"
+    assert safe_path.get_file("test.enex").name == "test.enex"
+    assert safe_path.get_file("test.enex").name == "test (2).enex"
+
+
+@pytest.mark.parametrize("overwrite", [False, True])
+def test_safe_path_reserved_name(tmp_path, overwrite):
+    test_dir = tmp_path / "test"
+
+    safe_path = SafePath(test_dir, overwrite=overwrite)
+
+    assert safe_path.reserve("_resources") == test_dir / "_resources"
+    assert safe_path.get("_resources") == test_dir / "_resources (1)"
+    assert safe_path.get("test", "_resources") == test_dir / "test" / "_resources"
+
+
+def test_safe_path_case_sensitive_fs(tmp_path):
+    test_dir = tmp_path / "test"
+
+    safe_path = SafePath(test_dir)
+
+    assert safe_path.get_file("test.enex").name == "test.enex"
+    assert safe_path.get_file("Test.enex").name == "Test.enex"
+    assert list(test_dir.iterdir()) == []
+
+
+def test_safe_path_case_insensitive_fs(tmp_path, mocker):
+    test_dir = tmp_path / "test"
+    test_dir.mkdir()
+    (test_dir / "TEST.enex").touch()
+
+    probe_mock = mocker.patch(
+        "evernote_backup.note_exporter_util._is_case_insensitive_dir",
+        return_value=True,
+    )
+
+    safe_path = SafePath(test_dir)
+
+    assert safe_path.get_file("test.enex").name == "test (1).enex"
+    assert safe_path.get_file("Test.enex").name == "Test (2).enex"
+    probe_mock.assert_called_once_with(test_dir)
+
+
+def test_safe_path_case_insensitive_archive():
+    safe_path = SafePath(Path(), ignore_existing=True, create_dirs=False)
+
+    assert safe_path.get_file("test.enex").name == "test.enex"
+    assert safe_path.get_file("Test.enex").name == "Test (1).enex"
+
+
+@pytest.mark.parametrize("max_len", range(12))
+def test_trim_string_multibyte(max_len):
+    test_string = "aé€😁b"
+
+    trimmed = _trim_string(test_string, max_len)
+
+    assert test_string.startswith(trimmed)
+    assert len(trimmed.encode("utf-8")) <= max_len
+    assert len(test_string[: len(trimmed) + 1].encode("utf-8")) > max_len or (
+        trimmed == test_string
+    )
+
+
+def test_sharded_file_writer(tmp_path):
+    writer = ShardedFileWriter(SafePath(tmp_path), "notes", ".jsonl", shard_size=10)
+
+    for line in ("line1", "line2", "line3"):
+        writer.write_line(line)
+    writer.close()
+
+    assert writer.files == [
+        tmp_path / "notes-00001.jsonl",
+        tmp_path / "notes-00002.jsonl",
+    ]
+    assert writer.files[0].read_text() == "line1\nline2\n"
+    assert writer.files[1].read_text() == "line3\n"
+
+
+def test_sharded_file_writer_no_limit(tmp_path):
+    writer = ShardedFileWriter(SafePath(tmp_path), "notes", ".jsonl", shard_size=0)
+
+    for line in ("line1", "line2", "line3"):
+        writer.write_line(line)
+    writer.close()
+
+    assert writer.files == [tmp_path / "notes.jsonl"]
+    assert writer.files[0].read_text() == "line1\nline2\nline3\n"
+
+
+def test_sharded_file_writer_empty(tmp_path):
+    writer = ShardedFileWriter(SafePath(tmp_path), "notes", ".jsonl", shard_size=0)
+    writer.close()
+
+    assert writer.files == []
+    assert list(tmp_path.iterdir()) == []
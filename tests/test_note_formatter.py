@@ -1,3 +1,5 @@
+import io
+
 from evernote.edam.type.ttypes import (
     Data,
     Note,
@@ -8,6 +10,7 @@ from evernote.edam.type.ttypes import (
 
 from evernote_backup.evernote_types import Reminder, Task
 from evernote_backup.note_formatter import NoteFormatter
+from evernote_backup.note_formatter_util import fmt_binary
 
 test_note_data = Note(
     guid="7473cb3f-411e-4545-9df4-5eb731de4358",
@@ -418,3 +421,34 @@ def test_note_with_metadata_no_tags(mocker):
     formatted_note = formatter.format_note(test_note, "Test Notebook", [])
 
     assert formatted_note == expected_note
+
+
+def test_formatter_large_resource_streamed(mocker):
+    formatter = NoteFormatter()
+
+    mocker.patch("evernote_backup.note_formatter_util.BINARY_BLOCK_SIZE", 180)
+
+    test_body = bytes(range(256)) * 3
+    test_note = Note(
+        title="test",
+        resources=[
+            Resource(
+                data=Data(body=test_body),
+                attributes=ResourceAttributes(),
+            )
+        ],
+    )
+
+    out = io.StringIO()
+    spy_write = mocker.spy(out, "write")
+
+    formatter.write_note(out, test_note, "", [])
+
+    expected_data = (
+        '    <resource>\n      <data encoding="base64">'
+        f"{fmt_binary(test_body)}</data>\n"
+    )
+
+    assert expected_data in out.getvalue()
+    assert out.getvalue() == formatter.format_note(test_note, "", [])
+    assert max(len(c.args[0]) for c in spy_write.call_args_list) < len(test_body)
@@ -0,0 +1,184 @@
+import io
+
+from evernote.edam.type.ttypes import Data, Note, Resource, ResourceAttributes
+
+from evernote_backup.evernote_types import Task
+from evernote_backup.note_formatter_enml import (
+    HtmlNoteFormatter,
+    MarkdownNoteFormatter,
+    get_resource_hash,
+)
+
+test_enml = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<!DOCTYPE en-note SYSTEM "http://xml.evernote.com/pub/enml2.dtd">'
+    "<en-note>"
+    "<div>Hello <b>world</b> 1*2 &amp; &lt;x&gt;</div>"
+    "<div><br/></div>"
+    "<h2>Heading</h2>"
+    "<ul><li>one</li><li>two<ol><li>a</li><li>b</li></ol></li></ul>"
+    '<div><en-todo checked="true"/>done</div>'
+    "<div><en-todo/>todo</div>"
+    '<div><a href="https://example.com/">link</a></div>'
+    '<div><en-media hash="abcd" type="image/png"/></div>'
+    '<div><en-media hash="ef01" type="application/pdf"/></div>'
+    '<div style="-en-codeblock:true"><div>def f():</div><div><br/></div>'
+    "<div>    return 1</div></div>"
+    "<table><tr><td>a|x</td><td>b</td></tr><tr><td>c</td><td>d</td></tr></table>"
+    "<blockquote>quoted</blockquote>"
+    "<en-crypt>SECRET</en-crypt>"
+    "</en-note>"
+)
+
+test_note = Note(
+    guid="id1",
+    title="Test Title",
+    content=test_enml,
+    created=1612902877000,
+    updated=1617813805000,
+    tagNames=["test2", "test1"],
+    resources=[
+        Resource(
+            mime="image/png",
+            data=Data(bodyHash=bytes.fromhex("abcd"), body=b"1234"),
+            attributes=ResourceAttributes(fileName="test.png"),
+        ),
+        Resource(
+            mime="application/pdf",
+            data=Data(bodyHash=bytes.fromhex("ef01"), body=b"5678"),
+            attributes=ResourceAttributes(fileName="test file.pdf"),
+        ),
+    ],
+)
+
+test_resource_links = {
+    "abcd": "../_resources/abcd.png",
+    "ef01": "../_resources/ef01.pdf",
+}
+
+test_tasks = [
+    Task(taskId="tid1", label="task1", status="completed"),
+    Task(taskId="tid2", label="task2", status="open"),
+]
+
+
+def test_markdown_note():
+    expected = """---
+title: "Test Title"
+created: "20210209T203437Z"
+updated: "20210407T164325Z"
+tags: ["test1", "test2"]
+---
+
+# Test Title
+
+Hello **world** 1\\*2 & \\<x\\>
+
+## Heading
+
+- one
+- two
+    1. a
+    2. b
+
+- [x] done
+
+- [ ] todo
+
+[link](https://example.com/)
+
+![test.png](../_resources/abcd.png)
+
+[test file.pdf](../_resources/ef01.pdf)
+
+```
+def f():
+
+    return 1
+```
+
+| a\\|x | b |
+| --- | --- |
+| c | d |
+
+> quoted
+
+\\[Encrypted content\\]
+
+## Tasks
+
+- [x] task1
+- [ ] task2
+"""
+
+    out = io.StringIO()
+
+    MarkdownNoteFormatter().write_note(
+        out, test_note, "notebook1", test_tasks, test_resource_links
+    )
+
+    assert out.getvalue() == expected
+
+
+def test_markdown_note_guid_metadata():
+    out = io.StringIO()
+
+    MarkdownNoteFormatter(add_guid=True, add_metadata=True).write_note(
+        out, Note(guid="id1", title="test", active=True), "notebook1", [], {}
+    )
+
+    assert out.getvalue() == (
+        "---\n"
+        'title: "test"\n'
+        'guid: "id1"\n'
+        'notebook-name: "notebook1"\n'
+        "is-active: true\n"
+        "---\n\n"
+        "# test\n\n"
+    )
+
+
+def test_html_note():
+    out = io.StringIO()
+
+    HtmlNoteFormatter(add_guid=True).write_note(
+        out, test_note, "notebook1", test_tasks, test_resource_links
+    )
+
+    html_note = out.getvalue()
+
+    assert html_note.startswith("<!DOCTYPE html>\n<html>\n<head>\n")
+    assert "<title>Test Title</title>" in html_note
+    assert '<meta name="tags" content="test1, test2">' in html_note
+    assert '<meta name="guid" content="id1">' in html_note
+    assert "<div>Hello <b>world</b> 1*2 &amp; &lt;x&gt;</div>" in html_note
+    assert '<input type="checkbox" disabled checked>done' in html_note
+    assert '<img src="../_resources/abcd.png" alt="test.png">' in html_note
+    assert '<a href="../_resources/ef01.pdf">test file.pdf</a>' in html_note
+    assert "SECRET" not in html_note
+    assert "<pre>[Encrypted content]</pre>" in html_note
+    assert '<li><input type="checkbox" disabled> task2</li>' in html_note
+    assert html_note.endswith("</body>\n</html>\n")
+
+
+def test_note_missing_resource():
+    out = io.StringIO()
+
+    MarkdownNoteFormatter().write_note(
+        out,
+        Note(title="test", content='<en-note><en-media hash="ff"/>text</en-note>'),
+        "notebook1",
+        [],
+        {},
+    )
+
+    assert out.getvalue().endswith("# test\n\ntext\n")
+
+
+def test_get_resource_hash():
+    assert get_resource_hash(Resource()) is None
+    assert get_resource_hash(Resource(data=Data(bodyHash=b"\x12\x34"))) == "1234"
+    assert (
+        get_resource_hash(Resource(data=Data(body=b"test")))
+        == "098f6bcd4621d373cade4e832627b4f6"
+    )
@@ -0,0 +1,38 @@
+from evernote.edam.type.ttypes import Note
+
+from evernote_backup.note_search_util import (
+    NoteSearchText,
+    extract_text,
+    get_note_search_text,
+)
+
+
+def test_extract_text():
+    test_enml = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<!DOCTYPE en-note SYSTEM "http://xml.evernote.com/pub/enml2.dtd">'
+        "<en-note><div>first&nbsp;line</div><div>second <b>bold</b>"
+        "<br/>third &amp; last</div></en-note>"
+    )
+
+    assert extract_text(test_enml) == "first line second bold third & last"
+
+
+def test_extract_text_empty():
+    assert extract_text(None) == ""
+    assert extract_text("") == ""
+
+
+def test_get_note_search_text():
+    test_note = Note(
+        title="test",
+        content="<en-note>body</en-note>",
+        tagNames=["tag1", "tag2"],
+    )
+
+    assert get_note_search_text(test_note) == NoteSearchText(
+        title="test",
+        content="body",
+        tags="tag1 tag2",
+        recognition="",
+    )
@@ -1,11 +1,25 @@
 import logging
+import lzma
+import pickle
+import sqlite3
 from pathlib import Path
 
 import pytest
-from evernote.edam.type.ttypes import LinkedNotebook, Note, Notebook
+from evernote.edam.type.ttypes import Data, LinkedNotebook, Note, Notebook, Resource
 
+from evernote_backup.config import CURRENT_DB_VERSION
 from evernote_backup.evernote_types import Reminder, Task
-from evernote_backup.note_storage import NoteForSync, SqliteStorage, initialize_db
+from evernote_backup.note_storage import (
+    DB_SCHEMA,
+    Codec,
+    NoteFilter,
+    NoteForSync,
+    NoteSyncState,
+    SqliteStorage,
+    TasksStorage,
+    get_codec,
+    initialize_db,
+)
 
 
 def test_database_file_missing():
@@ -13,6 +27,21 @@ def test_database_file_missing():
         SqliteStorage(Path("fake_file"))
 
 
+def test_iter_notes_no_transaction_held(fake_storage):
+    for note in (Note(guid="id1", title="test1"), Note(guid="id2", title="test2")):
+        note.notebookGuid = "nbid1"
+        note.active = True
+        fake_storage.notes.add_note(note)
+
+    notes_iter = fake_storage.notes.iter_notes("nbid1")
+    next(notes_iter)
+
+    fake_storage.config.set_config_value("test", "test_value")
+
+    assert fake_storage.db.transaction_depth == 0
+    assert not fake_storage.db.in_transaction
+
+
 def test_database_file_opened(tmp_path):
     test_db_path = tmp_path / "test.db"
 
@@ -748,3 +777,596 @@ def test_note_count_before_sync(fake_storage):
 
     assert result_active == 1
     assert result_trash == 1
+
+
+def test_upgrade_db_note_hashes():
+    db = sqlite3.connect(":memory:")
+    db.row_factory = sqlite3.Row
+
+    with db as con:
+        con.executescript(
+            """
+            CREATE TABLE notes(
+                guid TEXT PRIMARY KEY,
+                title TEXT,
+                notebook_guid TEXT,
+                is_active BOOLEAN,
+                raw_note BLOB
+            );
+            CREATE TABLE config(
+                name TEXT PRIMARY KEY,
+                value TEXT
+            );
+            """
+        )
+
+    storage = SqliteStorage(db)
+    storage.config.set_config_value("DB_VERSION", "6")
+
+    storage.check_version()
+
+    assert {"usn", "content_hash", "resource_hashes"} <= storage._get_table_columns(
+        "notes"
+    )
+    assert storage.config.get_config_value("DB_VERSION") == str(CURRENT_DB_VERSION)
+
+
+def test_notes_sync_state(fake_storage):
+    test_note = Note(
+        guid="id1",
+        title="test",
+        notebookGuid="nbid1",
+        active=True,
+        updateSequenceNum=10,
+        contentHash=b"hash1",
+        resources=[
+            Resource(data=Data(bodyHash=b"\x02")),
+            Resource(data=Data(bodyHash=b"\x01")),
+        ],
+    )
+
+    fake_storage.notes.add_note(test_note)
+    fake_storage.notes.add_notes_for_sync([Note(guid="id2", title="test")])
+
+    result = fake_storage.notes.get_notes_sync_state(["id1", "id2", "id3"])
+
+    assert result == {
+        "id1": NoteSyncState(usn=10, content_hash=b"hash1", resource_hashes="01,02")
+    }
+
+
+def _make_resource_note(guid, *bodies):
+    return Note(
+        guid=guid,
+        title=guid,
+        notebookGuid="nbid1",
+        active=True,
+        resources=[
+            Resource(guid=f"{guid}-r{i}", data=Data(bodyHash=body[:1], body=body))
+            for i, body in enumerate(bodies)
+        ],
+    )
+
+
+def _get_stored_resources(storage):
+    with storage.db as con:
+        return {r[0] for r in con.execute("select body_hash from resources")}
+
+
+def test_resources_deduplicated(fake_storage):
+    note1 = _make_resource_note("id1", b"a-body", b"b-body")
+    note2 = _make_resource_note("id2", b"a-body")
+
+    fake_storage.notes.add_note(note1)
+    fake_storage.notes.add_note(note2)
+
+    assert _get_stored_resources(fake_storage) == {b"a", b"b"}
+    # Caller's note is left intact
+    assert note1.resources[0].data.body == b"a-body"
+
+    with fake_storage.db as con:
+        raw_note = con.execute(
+            "select raw_note from notes where guid=?", ("id1",)
+        ).fetchone()[0]
+
+    stored_note = pickle.loads(lzma.decompress(raw_note))
+    assert stored_note.resources[0].data.body is None
+
+    assert fake_storage.notes.get_note("id1") == note1
+    assert fake_storage.notes.get_note("id2") == note2
+
+
+def test_resources_cleanup_on_expunge(fake_storage):
+    fake_storage.notes.add_note(_make_resource_note("id1", b"a-body", b"b-body"))
+    fake_storage.notes.add_note(_make_resource_note("id2", b"a-body"))
+
+    fake_storage.notes.expunge_notes(["id1"])
+
+    assert _get_stored_resources(fake_storage) == {b"a"}
+
+    fake_storage.notes.expunge_notes_by_notebook("nbid1")
+
+    assert _get_stored_resources(fake_storage) == set()
+
+
+def test_resources_cleanup_on_update(fake_storage):
+    fake_storage.notes.add_note(_make_resource_note("id1", b"a-body", b"b-body"))
+    fake_storage.notes.add_note(_make_resource_note("id1", b"c-body"))
+
+    assert _get_stored_resources(fake_storage) == {b"c"}
+
+
+def test_resource_missing_note_corrupt(fake_storage, caplog):
+    fake_storage.notes.add_note(_make_resource_note("id1", b"a-body"))
+
+    with fake_storage.db as con:
+        con.execute("delete from resources")
+
+    with caplog.at_level(logging.WARNING):
+        assert fake_storage.notes.get_note("id1") is None
+
+    assert "Note 'id1' [id1] is corrupt" in caplog.text
+
+
+def test_upgrade_db_resources():
+    db = sqlite3.connect(":memory:")
+    db.row_factory = sqlite3.Row
+
+    with db as con:
+        con.executescript(DB_SCHEMA)
+        con.execute("DROP TABLE resources")
+        con.execute("DROP TABLE note_resources")
+
+    test_note = _make_resource_note("id1", b"a-body")
+
+    with db as con:
+        con.execute(
+            "insert into notes(guid, title, notebook_guid, is_active, raw_note)"
+            " values (?, ?, ?, ?, ?)",
+            ("id1", "id1", "nbid1", True, lzma.compress(pickle.dumps(test_note))),
+        )
+
+    storage = SqliteStorage(db)
+    storage.config.set_config_value("DB_VERSION", "8")
+
+    storage.check_version()
+
+    assert _get_stored_resources(storage) == {b"a"}
+    assert storage.notes.get_note("id1") == test_note
+    assert storage.config.get_config_value("DB_VERSION") == str(CURRENT_DB_VERSION)
+
+
+def test_transaction_nested_rollback(fake_storage):
+    def failing_transaction():
+        with fake_storage.transaction():
+            fake_storage.config.set_config_value("test1", "value")
+
+            with fake_storage.transaction():
+                fake_storage.config.set_config_value("test2", "value")
+
+            raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        failing_transaction()
+
+    with pytest.raises(KeyError):
+        fake_storage.config.get_config_value("test1")
+
+    with pytest.raises(KeyError):
+        fake_storage.config.get_config_value("test2")
+
+
+def test_transaction_commit(fake_storage):
+    with fake_storage.transaction():
+        fake_storage.config.set_config_value("test1", "value")
+
+        assert fake_storage.db.in_transaction
+
+    assert not fake_storage.db.in_transaction
+    assert fake_storage.config.get_config_value("test1") == "value"
+
+
+def test_transaction_rebuild_search_index_rollback(fake_storage):
+    fake_storage.notes.add_note(
+        Note(
+            guid="id1",
+            title="test",
+            content="<en-note>searchable</en-note>",
+            notebookGuid="nbid1",
+            active=True,
+        )
+    )
+
+    def failing_transaction():
+        with fake_storage.transaction():
+            fake_storage.config.set_config_value("test1", "value")
+
+            fake_storage.notes.rebuild_search_index()
+
+            assert fake_storage.db.in_transaction
+
+            raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        failing_transaction()
+
+    with pytest.raises(KeyError):
+        fake_storage.config.get_config_value("test1")
+
+    assert [r.guid for r in fake_storage.notes.search_notes("searchable")] == ["id1"]
+
+
+def test_notes_order_query_plan(fake_storage):
+    with fake_storage.db as con:
+        query_plan = " ".join(
+            row["detail"]
+            for row in con.execute(
+                "EXPLAIN QUERY PLAN"
+                " select title, guid, raw_note, codec"
+                " from notes"
+                " where notebook_guid=? and is_active=1 and raw_note is not NULL"
+                " order by title COLLATE NOCASE",
+                ("notebook1",),
+            )
+        )
+
+    assert "idx_notes_notebook_title" in query_plan
+    assert "TEMP B-TREE" not in query_plan
+
+
+def test_notes_order_case_insensitive(fake_storage):
+    for guid, title in (("id1", "b"), ("id2", "C"), ("id3", "a")):
+        fake_storage.notes.add_note(
+            Note(guid=guid, title=title, notebookGuid="notebook1", active=True)
+        )
+
+    result_titles = [n.title for n in fake_storage.notes.iter_notes("notebook1")]
+
+    assert result_titles == ["a", "b", "C"]
+
+
+def test_upgrade_db_notes_index():
+    db = sqlite3.connect(":memory:")
+    db.row_factory = sqlite3.Row
+
+    with db as con:
+        con.executescript(DB_SCHEMA)
+        con.execute("DROP INDEX idx_notes_notebook_title")
+        con.execute("CREATE INDEX idx_notes ON notes(notebook_guid, is_active)")
+
+    storage = SqliteStorage(db)
+    storage.config.set_config_value("DB_VERSION", "10")
+
+    storage.check_version()
+
+    with db as con:
+        indexes = {
+            row["name"]
+            for row in con.execute("select name from sqlite_master where type='index'")
+        }
+
+    assert "idx_notes_notebook_title" in indexes
+    assert "idx_notes" not in indexes
+
+
+def _make_tagged_note(guid, notebook_guid, tag_names, active=True):
+    return Note(
+        guid=guid,
+        title=guid,
+        notebookGuid=notebook_guid,
+        active=active,
+        tagNames=tag_names,
+    )
+
+
+def test_note_metadata(fake_storage):
+    test_note = _make_resource_note("id1", b"a-body", b"bb-body")
+    test_note.created = 1000
+    test_note.updated = 2000
+    test_note.contentLength = 30
+    test_note.tagNames = ["tag2", "tag1"]
+
+    fake_storage.notes.add_note(test_note)
+
+    with fake_storage.db as con:
+        metadata = con.execute(
+            "select created, updated, content_length, resources_size,"
+            " resources_count from notes where guid=?",
+            ("id1",),
+        ).fetchone()
+        tags = con.execute("select tag_name from note_tags order by tag_name")
+
+        assert tuple(metadata) == (1000, 2000, 30, 13, 2)
+        assert [row["tag_name"] for row in tags] == ["tag1", "tag2"]
+
+
+def test_note_tags_cleanup(fake_storage):
+    fake_storage.notes.add_note(_make_tagged_note("id1", "nbid1", ["tag1"]))
+    fake_storage.notes.add_note(_make_tagged_note("id2", "nbid1", ["tag1"]))
+    fake_storage.notes.add_note(_make_tagged_note("id3", "nbid2", ["tag2"]))
+
+    fake_storage.notes.add_note(_make_tagged_note("id1", "nbid1", ["tag3"]))
+    fake_storage.notes.expunge_notes(["id2"])
+    fake_storage.notes.expunge_notes_by_notebook("nbid2")
+
+    with fake_storage.db as con:
+        tags = con.execute("select note_guid, tag_name from note_tags")
+
+        assert [tuple(row) for row in tags] == [("id1", "tag3")]
+
+
+def test_notes_tags_filter(fake_storage):
+    test_notes = [
+        _make_tagged_note("id1", "nbid1", None),
+        _make_tagged_note("id2", "nbid1", ["tag1", "tag2"]),
+        _make_tagged_note("id3", "nbid1", ["tag2"]),
+        _make_tagged_note("id4", "nbid1", ["tag3"]),
+        _make_tagged_note("id5", "nbid1", ["tag1"], active=False),
+    ]
+
+    for note in test_notes:
+        fake_storage.notes.add_note(note)
+
+    notes = fake_storage.notes
+    notebooks = fake_storage.notebooks
+
+    assert [
+        n.guid for n in notes.iter_notes("nbid1", NoteFilter(tags=("tag1", "tag2")))
+    ] == [
+        "id2",
+        "id3",
+    ]
+    assert [n.guid for n in notes.iter_notes_trash(NoteFilter(tags=("tag1",)))] == [
+        "id5"
+    ]
+    assert list(notes.iter_notes_trash(NoteFilter(tags=("tag2",)))) == []
+    assert notebooks.get_notebook_notes_count("nbid1", NoteFilter(tags=("tag3",))) == 1
+    assert notebooks.get_notebook_notes_count("nbid1", NoteFilter(tags=("tag4",))) == 0
+    assert notebooks.get_notebook_notes_count("nbid1") == 4
+
+
+def test_notes_date_filter(fake_storage, mocker):
+    for guid, created, updated, active in (
+        ("id1", 1000, 5000, True),
+        ("id2", 2000, 4000, True),
+        ("id3", 3000, 3000, True),
+        ("id4", 2000, 4000, False),
+    ):
+        test_note = _make_tagged_note(guid, "nbid1", ["tag1"], active)
+        test_note.created = created
+        test_note.updated = updated
+        fake_storage.notes.add_note(test_note)
+
+    notes = fake_storage.notes
+
+    spy_get_raw_note = mocker.spy(notes, "_get_raw_note")
+
+    assert [
+        n.guid for n in notes.iter_notes("nbid1", NoteFilter(created_after=2000))
+    ] == ["id2", "id3"]
+    assert [
+        n.guid
+        for n in notes.iter_notes(
+            "nbid1", NoteFilter(created_before=3000, updated_after=4500)
+        )
+    ] == ["id1"]
+    assert [
+        n.guid
+        for n in notes.iter_notes_trash(NoteFilter(tags=("tag1",), updated_before=4001))
+    ] == ["id4"]
+    assert spy_get_raw_note.call_count == 4
+    assert [
+        n.guid for n in notes.get_export_notes("nbid1", NoteFilter(updated_before=4000))
+    ] == ["id3"]
+    assert (
+        fake_storage.notebooks.get_notebook_notes_count(
+            "nbid1", NoteFilter(updated_after=3000, updated_before=5000)
+        )
+        == 2
+    )
+
+
+def test_notebooks_filter(fake_storage):
+    fake_storage.notebooks.add_notebooks(
+        [
+            Notebook(guid="nbid1", name="name1", stack="stack1"),
+            Notebook(guid="nbid2", name="name2", stack="stack1"),
+            Notebook(guid="nbid3", name="name3", stack=None),
+        ]
+    )
+
+    notebooks = fake_storage.notebooks
+
+    assert {n.guid for n in notebooks.iter_notebooks()} == {"nbid1", "nbid2", "nbid3"}
+    assert {n.guid for n in notebooks.iter_notebooks(stacks=["stack1"])} == {
+        "nbid1",
+        "nbid2",
+    }
+    assert {n.guid for n in notebooks.iter_notebooks(names=["name2", "name3"])} == {
+        "nbid2",
+        "nbid3",
+    }
+    assert {
+        n.guid
+        for n in notebooks.iter_notebooks(names=["name2", "name3"], stacks=["stack1"])
+    } == {"nbid2"}
+
+
+def test_upgrade_db_date_indexes():
+    db = sqlite3.connect(":memory:")
+    db.row_factory = sqlite3.Row
+
+    with db as con:
+        con.executescript(DB_SCHEMA)
+        con.execute("DROP INDEX idx_notes_created")
+        con.execute("DROP INDEX idx_notes_updated")
+
+    storage = SqliteStorage(db)
+    storage.config.set_config_value("DB_VERSION", "13")
+
+    storage.check_version()
+
+    with db as con:
+        indexes = {
+            row["name"]
+            for row in con.execute("select name from sqlite_master where type='index'")
+        }
+
+    assert {"idx_notes_created", "idx_notes_updated"} <= indexes
+    assert storage.config.get_config_value("DB_VERSION") == str(CURRENT_DB_VERSION)
+
+
+def test_note_titles_without_decoding(fake_storage, mocker):
+    fake_storage.notes.add_note(_make_tagged_note("id2", "nbid1", None))
+    fake_storage.notes.add_note(_make_tagged_note("id1", "nbid1", None))
+    fake_storage.notes.add_note(_make_tagged_note("id3", "nbid1", None, False))
+
+    spy_get_raw_note = mocker.spy(fake_storage.notes, "_get_raw_note")
+
+    assert fake_storage.notes.get_note_titles("nbid1") == ["id1", "id2"]
+    assert fake_storage.notes.get_note_titles_trash() == ["id3"]
+    spy_get_raw_note.assert_not_called()
+
+
+def test_upgrade_db_note_metadata():
+    db = sqlite3.connect(":memory:")
+    db.row_factory = sqlite3.Row
+
+    with db as con:
+        con.executescript(DB_SCHEMA)
+        con.execute("DROP TABLE note_tags")
+        con.execute("DROP INDEX idx_notes_created")
+        con.execute("DROP INDEX idx_notes_updated")
+
+        for column_name in (
+            "created",
+            "updated",
+            "content_length",
+            "resources_size",
+            "resources_count",
+        ):
+            con.execute(f"ALTER TABLE notes DROP COLUMN {column_name}")
+
+    test_note = _make_tagged_note("id1", "nbid1", ["tag1"])
+    test_note.created = 1000
+
+    with db as con:
+        con.execute(
+            "insert into notes(guid, title, notebook_guid, is_active, raw_note)"
+            " values (?, ?, ?, ?, ?)",
+            ("id1", "id1", "nbid1", True, lzma.compress(pickle.dumps(test_note))),
+        )
+
+    storage = SqliteStorage(db)
+    storage.config.set_config_value("DB_VERSION", "11")
+
+    storage.check_version()
+
+    with db as con:
+        metadata = con.execute(
+            "select created, resources_count from notes where guid=?", ("id1",)
+        ).fetchone()
+
+    assert tuple(metadata) == (1000, 0)
+    assert (
+        storage.notebooks.get_notebook_notes_count("nbid1", NoteFilter(tags=("tag1",)))
+        == 1
+    )
+    assert storage.config.get_config_value("DB_VERSION") == str(CURRENT_DB_VERSION)
+
+
+def test_tasks_batch_write(fake_storage, mocker):
+    spy_get_write_codec = mocker.spy(TasksStorage, "get_write_codec")
+
+    fake_storage.tasks.add_tasks(
+        [Task(taskId=f"tid{i}", parentId="nid1") for i in range(3)]
+    )
+
+    spy_get_write_codec.assert_called_once()
+    assert [t.taskId for t in fake_storage.tasks.iter_tasks("nid1")] == [
+        "tid0",
+        "tid1",
+        "tid2",
+    ]
+
+
+def test_notebook_tasks_and_reminders(fake_storage):
+    for guid, notebook_guid, is_active in (
+        ("nid1", "nbid1", True),
+        ("nid2", "nbid2", True),
+        ("nid3", "nbid1", False),
+    ):
+        fake_storage.notes.add_note(
+            Note(guid=guid, title=guid, notebookGuid=notebook_guid, active=is_active)
+        )
+
+    fake_storage.tasks.add_tasks(
+        [
+            Task(taskId="tid1", parentId="nid1"),
+            Task(taskId="tid2", parentId="nid2"),
+            Task(taskId="tid3", parentId="nid3"),
+        ]
+    )
+    fake_storage.reminders.add_reminders(
+        [
+            Reminder(reminderId="rid1", sourceId="tid1"),
+            Reminder(reminderId="rid2", sourceId="tid2"),
+            Reminder(reminderId="rid3", sourceId="tid3"),
+        ]
+    )
+
+    tasks = fake_storage.tasks
+    reminders = fake_storage.reminders
+
+    assert [t.taskId for t in tasks.iter_notebook_tasks("nbid1")] == ["tid1"]
+    assert [t.taskId for t in tasks.iter_trash_tasks()] == ["tid3"]
+    assert [r.reminderId for r in reminders.iter_notebook_reminders("nbid1")] == [
+        "rid1"
+    ]
+    assert [r.reminderId for r in reminders.iter_trash_reminders()] == ["rid3"]
+
+
+def test_upgrade_db_search_index():
+    db = sqlite3.connect(":memory:")
+    db.row_factory = sqlite3.Row
+
+    with db as con:
+        con.executescript(DB_SCHEMA)
+        con.execute("DROP TABLE notes_text")
+
+    test_note = Note(
+        guid="id1",
+        title="test",
+        content="<en-note>searchable body</en-note>",
+        notebookGuid="nbid1",
+        active=True,
+    )
+
+    with db as con:
+        con.execute(
+            "insert into notes(guid, title, notebook_guid, is_active, raw_note)"
+            " values (?, ?, ?, ?, ?)",
+            ("id1", "test", "nbid1", True, lzma.compress(pickle.dumps(test_note))),
+        )
+
+    storage = SqliteStorage(db)
+    storage.config.set_config_value("DB_VERSION", "12")
+
+    storage.check_version()
+
+    results = storage.notes.search_notes("searchable")
+
+    assert [r.guid for r in results] == ["id1"]
+    assert results[0].snippet == "[searchable] body"
+    assert storage.config.get_config_value("DB_VERSION") == str(CURRENT_DB_VERSION)
+
+
+@pytest.mark.parametrize("codec_name", ["lzma", "zlib"])
+def test_codec_note_roundtrip(codec_name):
+    test_note = Note(guid="id1", title="test", content="test")
+
+    codec = get_codec(codec_name)
+
+    assert isinstance(codec, Codec)
+    assert codec.loads_note(codec.dumps_note(test_note)) == test_note
+    assert codec.decompress(codec.compress(b"test")) == b"test"
@@ -1,8 +1,19 @@
+import hashlib
+import io
+import json
+import tarfile
+import zipfile
+from pathlib import Path
+
 import pytest
-from evernote.edam.type.ttypes import Note, Notebook
+from click.testing import CliRunner
+from evernote.edam.type.ttypes import Data, Note, Notebook, Resource
 
+from evernote_backup import note_exporter, note_exporter_archive, note_storage
+from evernote_backup.cli import cli
 from evernote_backup.config import CURRENT_DB_VERSION
 from evernote_backup.evernote_types import Reminder, Task
+from evernote_backup.note_exporter import NoteExporter
 
 
 @pytest.mark.usefixtures("fake_init_db")
@@ -936,3 +947,1000 @@ def test_export_note_with_tasks(cli_invoker, fake_storage, tmp_path):
 
     assert result.exit_code == 0
     assert expected_tasks_xml in book1_xml
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_export_tasks_prefetched(cli_invoker, fake_storage, tmp_path, mocker):
+    test_out_path = tmp_path / "test_out"
+
+    fake_storage.notebooks.add_notebooks([Notebook(guid="nbid1", name="name1")])
+
+    for guid, is_active in (("id1", True), ("id2", True), ("id3", False)):
+        fake_storage.notes.add_note(
+            Note(
+                guid=guid,
+                title=guid,
+                content="test",
+                notebookGuid="nbid1",
+                active=is_active,
+            )
+        )
+
+    fake_storage.tasks.add_tasks(
+        [
+            Task(taskId="tid1", parentId="id1", label="test task1"),
+            Task(taskId="tid2", parentId="id3", label="test task2"),
+        ]
+    )
+
+    spy_iter_tasks = mocker.spy(note_storage.TasksStorage, "iter_tasks")
+    spy_iter_reminders = mocker.spy(note_storage.RemindersStorage, "iter_reminders")
+
+    result = cli_invoker(
+        "export",
+        "--database",
+        "fake_db",
+        "--include-trash",
+        str(test_out_path),
+    )
+
+    book1_xml = (test_out_path / "name1.enex").read_text()
+    trash_xml = (test_out_path / "Trash.enex").read_text()
+
+    assert result.exit_code == 0
+    assert book1_xml.count("<task>") == 1
+    assert "test task1" in book1_xml
+    assert trash_xml.count("<task>") == 1
+    assert "test task2" in trash_xml
+    spy_iter_tasks.assert_not_called()
+    spy_iter_reminders.assert_not_called()
+
+
+def _fill_export_db(test_db_path):
+    storage = note_storage.SqliteStorage(test_db_path)
+
+    storage.notebooks.add_notebooks(
+        [
+            Notebook(guid="nbid1", name="name1", stack="stack1"),
+            Notebook(guid="nbid2", name="name2"),
+            Notebook(guid="nbid3", name="name2"),
+        ]
+    )
+
+    test_notes = [
+        ("id1", "title1", "nbid1", True),
+        ("id2", "title1", "nbid1", True),
+        ("id3", "title3", "nbid2", True),
+        ("id4", "title4", "nbid3", True),
+        ("id5", "title5", "nbid1", False),
+    ]
+
+    for guid, title, notebook_guid, is_active in test_notes:
+        storage.notes.add_note(
+            Note(
+                guid=guid,
+                title=title,
+                content="test",
+                notebookGuid=notebook_guid,
+                active=is_active,
+            )
+        )
+
+    storage.tasks.add_task(Task(taskId="tid1", parentId="id2", label="test task1"))
+
+    storage.db.close()
+
+
+def _read_export_dir(export_path):
+    return {
+        str(p.relative_to(export_path)): p.read_text()
+        for p in export_path.rglob("*.enex")
+    }
+
+
+@pytest.mark.usefixtures("mock_evernote_client")
+@pytest.mark.parametrize("single_notes", [[], ["--single-notes"]])
+def test_export_workers(cli_invoker, tmp_path, fake_token, single_notes):
+    test_db_path = tmp_path / "test.db"
+
+    cli_invoker("init-db", "--database", test_db_path, "--token", fake_token)
+
+    _fill_export_db(test_db_path)
+
+    # Added last, but goes first among notes with same title
+    storage = note_storage.SqliteStorage(test_db_path)
+    storage.notes.add_note(
+        Note(
+            guid="id0",
+            title="title1",
+            content="zero",
+            notebookGuid="nbid1",
+            active=True,
+        )
+    )
+    storage.db.close()
+
+    export_args = ["--no-export-date", "--include-trash", *single_notes]
+
+    cli_invoker(
+        "export",
+        "--database",
+        test_db_path,
+        *export_args,
+        str(tmp_path / "sequential"),
+    )
+    result = cli_invoker(
+        "export",
+        "--database",
+        test_db_path,
+        "--workers",
+        "2",
+        *export_args,
+        str(tmp_path / "parallel"),
+    )
+
+    sequential_files = _read_export_dir(tmp_path / "sequential")
+    parallel_files = _read_export_dir(tmp_path / "parallel")
+
+    assert result.exit_code == 0
+    assert len(sequential_files) == (6 if single_notes else 4)
+    assert parallel_files == sequential_files
+    assert any("test task1" in f for f in parallel_files.values())
+
+    if single_notes:
+        assert "zero" in parallel_files["stack1/name1/title1.enex"]
+    else:
+        notebook_file = parallel_files["stack1/name1.enex"]
+        assert notebook_file.index("zero") < notebook_file.index("test task1")
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_export_single_notes_planned_tasks_prefetched(
+    cli_invoker, fake_storage, tmp_path, mocker
+):
+    test_out_path = tmp_path / "test_out"
+
+    fake_storage.notebooks.add_notebooks([Notebook(guid="nbid1", name="name1")])
+
+    for guid, is_active in (("id1", True), ("id2", True), ("id3", False)):
+        fake_storage.notes.add_note(
+            Note(
+                guid=guid,
+                title=guid,
+                content="test",
+                notebookGuid="nbid1",
+                active=is_active,
+            )
+        )
+
+    fake_storage.tasks.add_tasks(
+        [
+            Task(taskId="tid1", parentId="id1", label="test task1"),
+            Task(taskId="tid2", parentId="id3", label="test task2"),
+        ]
+    )
+
+    spy_iter_tasks = mocker.spy(note_storage.TasksStorage, "iter_tasks")
+    spy_iter_reminders = mocker.spy(note_storage.RemindersStorage, "iter_reminders")
+    spy_notebook_tasks = mocker.spy(note_storage.TasksStorage, "iter_notebook_tasks")
+
+    # Incremental export runs planned tasks in process, same as workers do
+    result = _export_incremental(
+        cli_invoker, test_out_path, "--single-notes", "--include-trash"
+    )
+
+    assert result.exit_code == 0
+    assert "test task1" in (test_out_path / "name1" / "id1.enex").read_text()
+    assert "<task>" not in (test_out_path / "name1" / "id2.enex").read_text()
+    assert "test task2" in (test_out_path / "Trash" / "id3.enex").read_text()
+    spy_iter_tasks.assert_not_called()
+    spy_iter_reminders.assert_not_called()
+    assert spy_notebook_tasks.call_count == 1
+
+
+@pytest.mark.usefixtures("mock_evernote_client")
+def test_export_workers_corrupt_note_overwrite(cli_invoker, tmp_path, fake_token):
+    test_db_path = tmp_path / "test.db"
+    test_out_path = tmp_path / "test_out"
+
+    cli_invoker("init-db", "--database", test_db_path, "--token", fake_token)
+
+    _fill_export_db(test_db_path)
+
+    storage = note_storage.SqliteStorage(test_db_path)
+    with storage.db as con:
+        con.execute("update notes set raw_note=? where guid=?", (b"123", "id3"))
+    storage.db.close()
+
+    existing_file = test_out_path / "name2" / "title3.enex"
+    existing_file.parent.mkdir(parents=True)
+    existing_file.write_text("previous export")
+
+    result = cli_invoker(
+        "export",
+        "--database",
+        test_db_path,
+        "--workers",
+        "2",
+        "--single-notes",
+        "--overwrite",
+        str(test_out_path),
+    )
+
+    assert result.exit_code == 0
+    assert existing_file.read_text() == "previous export"
+
+
+@pytest.mark.usefixtures("mock_evernote_client")
+def test_export_worker_storage_connection(
+    cli_invoker, tmp_path, fake_token, monkeypatch
+):
+    test_db_path = tmp_path / "test.db"
+
+    cli_invoker("init-db", "--database", test_db_path, "--token", fake_token)
+
+    _fill_export_db(test_db_path)
+
+    storage = note_storage.SqliteStorage(test_db_path)
+    exporter = NoteExporter(
+        storage=storage,
+        target_dir=tmp_path / "test_out",
+        single_notes=True,
+        export_trash=False,
+        no_export_date=False,
+        add_guid=False,
+        add_metadata=False,
+        overwrite=False,
+        filter_notebooks=(),
+        note_filter=note_storage.NoteFilter(),
+    )
+    storage.db.close()
+
+    monkeypatch.setattr(note_exporter, "_worker_exporter", None)
+
+    note_exporter._init_export_worker(test_db_path, exporter._get_worker_options())
+
+    worker_db = note_exporter._worker_exporter.storage.db
+    notes_iter = note_exporter._worker_exporter.storage.notes.iter_notes("nbid1")
+
+    assert isinstance(worker_db, note_storage.StorageConnection)
+    assert next(notes_iter).guid
+    assert worker_db.transaction_depth == 0
+
+    worker_db.close()
+
+
+def _export_incremental(cli_invoker, test_out_path, *export_args):
+    return cli_invoker(
+        "export",
+        "--database",
+        "fake_db",
+        "--incremental",
+        "--no-export-date",
+        *export_args,
+        str(test_out_path),
+    )
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_export_incremental(cli_invoker, fake_storage, tmp_path, mocker):
+    test_out_path = tmp_path / "test_out"
+
+    fake_storage.notebooks.add_notebooks(
+        [
+            Notebook(guid="nbid1", name="name1"),
+            Notebook(guid="nbid2", name="name2"),
+            Notebook(guid="nbid3", name="name3"),
+        ]
+    )
+
+    for guid, notebook_guid in (("id1", "nbid1"), ("id2", "nbid2"), ("id3", "nbid3")):
+        fake_storage.notes.add_note(
+            Note(
+                guid=guid,
+                title=guid,
+                content="test",
+                notebookGuid=notebook_guid,
+                active=True,
+                updateSequenceNum=1,
+            )
+        )
+
+    first_result = _export_incremental(cli_invoker, test_out_path)
+
+    manifest = json.loads((test_out_path / ".export-manifest.json").read_text())
+
+    assert first_result.exit_code == 0
+    assert sorted(manifest["files"]) == ["name1.enex", "name2.enex", "name3.enex"]
+    assert manifest["files"]["name1.enex"]["notes"] == {"id1": 1}
+
+    fake_storage.notes.add_note(
+        Note(
+            guid="id1",
+            title="id1",
+            content="updated",
+            notebookGuid="nbid1",
+            active=True,
+            updateSequenceNum=2,
+        )
+    )
+    fake_storage.tasks.add_task(Task(taskId="tid1", parentId="id2", label="task1"))
+    fake_storage.notes.expunge_notes(["id3"])
+
+    spy_write = mocker.spy(NoteExporter, "_write_export_file")
+
+    second_result = _export_incremental(cli_invoker, test_out_path)
+
+    written_files = sorted(c.args[1].name for c in spy_write.call_args_list)
+
+    assert second_result.exit_code == 0
+    assert written_files == ["name1.enex", "name2.enex"]
+    assert "updated" in (test_out_path / "name1.enex").read_text()
+    assert "task1" in (test_out_path / "name2.enex").read_text()
+    assert not (test_out_path / "name3.enex").exists()
+    assert "Removed files: 1" in second_result.output
+
+    spy_write.reset_mock()
+
+    third_result = _export_incremental(cli_invoker, test_out_path)
+
+    assert third_result.exit_code == 0
+    assert "Unchanged files: 2" in third_result.output
+    spy_write.assert_not_called()
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_export_incremental_single_notes(cli_invoker, fake_storage, tmp_path):
+    test_out_path = tmp_path / "test_out"
+
+    fake_storage.notebooks.add_notebooks(
+        [Notebook(guid="nbid1", name="name1", stack="stack1")]
+    )
+
+    for guid in ("id1", "id2"):
+        fake_storage.notes.add_note(
+            Note(
+                guid=guid,
+                title="title",
+                content="test",
+                notebookGuid="nbid1",
+                active=True,
+            )
+        )
+
+    # Leftover not written by incremental export is never overwritten
+    (test_out_path / "stack1" / "name1").mkdir(parents=True)
+    (test_out_path / "stack1" / "name1" / "title.enex").write_text("old")
+
+    _export_incremental(cli_invoker, test_out_path, "--single-notes")
+
+    notebook_dir = test_out_path / "stack1" / "name1"
+    expected_names = ["title (1).enex", "title (2).enex", "title.enex"]
+
+    assert sorted(p.name for p in notebook_dir.iterdir()) == expected_names
+    assert (notebook_dir / "title.enex").read_text() == "old"
+
+    # Names written by previous run are taken again, not shifted
+    _export_incremental(cli_invoker, test_out_path, "--single-notes")
+
+    assert sorted(p.name for p in notebook_dir.iterdir()) == expected_names
+
+    fake_storage.notes.expunge_notes(["id1", "id2"])
+    fake_storage.notes.add_note(
+        Note(guid="id3", title="trash", notebookGuid="nbid1", active=False)
+    )
+
+    result = _export_incremental(cli_invoker, test_out_path, "--single-notes")
+
+    assert result.exit_code == 0
+    assert "Removed files: 2" in result.output
+    assert [p.name for p in notebook_dir.iterdir()] == ["title.enex"]
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_export_incremental_overwrite(cli_invoker, fake_storage, tmp_path):
+    test_out_path = tmp_path / "test_out"
+
+    fake_storage.notebooks.add_notebooks([Notebook(guid="nbid1", name="name1")])
+    fake_storage.notes.add_note(
+        Note(guid="id1", title="id1", content="test", notebookGuid="nbid1", active=True)
+    )
+
+    test_out_path.mkdir()
+    (test_out_path / "name1.enex").write_text("old")
+
+    _export_incremental(cli_invoker, test_out_path, "--overwrite")
+
+    assert sorted(p.name for p in test_out_path.iterdir()) == [
+        ".export-manifest.json",
+        "name1.enex",
+    ]
+    assert "id1" in (test_out_path / "name1.enex").read_text()
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_export_incremental_filter_changed(cli_invoker, fake_storage, tmp_path):
+    test_out_path = tmp_path / "test_out"
+
+    fake_storage.notebooks.add_notebooks(
+        [
+            Notebook(guid="nbid1", name="name1"),
+            Notebook(guid="nbid2", name="name2"),
+        ]
+    )
+
+    for guid, notebook_guid in (("id1", "nbid1"), ("id2", "nbid2")):
+        fake_storage.notes.add_note(
+            Note(
+                guid=guid,
+                title=guid,
+                content="test",
+                notebookGuid=notebook_guid,
+                active=True,
+            )
+        )
+
+    _export_incremental(cli_invoker, test_out_path, "--notebook", "name1")
+
+    # Notes left out by filter are not deleted
+    result = _export_incremental(cli_invoker, test_out_path, "--notebook", "name2")
+
+    manifest = json.loads((test_out_path / ".export-manifest.json").read_text())
+
+    assert result.exit_code == 0
+    assert "Removed files: 0" in result.output
+    assert (test_out_path / "name1.enex").is_file()
+    assert sorted(manifest["files"]) == ["name1.enex", "name2.enex"]
+
+    fake_storage.notes.add_note(
+        Note(guid="id1", title="id1", notebookGuid="nbid1", active=False)
+    )
+
+    result = _export_incremental(cli_invoker, test_out_path, "--notebook", "name2")
+
+    assert result.exit_code == 0
+    assert "Removed files: 1" in result.output
+    assert not (test_out_path / "name1.enex").exists()
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_export_incremental_file_changed(cli_invoker, fake_storage, tmp_path):
+    test_out_path = tmp_path / "test_out"
+
+    fake_storage.notebooks.add_notebooks([Notebook(guid="nbid1", name="name1")])
+    fake_storage.notes.add_note(
+        Note(guid="id1", title="id1", content="test", notebookGuid="nbid1", active=True)
+    )
+
+    _export_incremental(cli_invoker, test_out_path)
+
+    exported_xml = (test_out_path / "name1.enex").read_text()
+    (test_out_path / "name1.enex").write_text("damaged")
+
+    _export_incremental(cli_invoker, test_out_path)
+
+    assert (test_out_path / "name1.enex").read_text() == exported_xml
+
+
+def _read_export_archive(archive_path, archive_format):
+    if archive_format == "zip":
+        with zipfile.ZipFile(archive_path) as zf:
+            return {n: zf.read(n).decode("utf-8") for n in zf.namelist()}
+
+    with tarfile.open(archive_path) as tf:
+        return {
+            m.name: tf.extractfile(m).read().decode("utf-8") for m in tf.getmembers()
+        }
+
+
+@pytest.mark.usefixtures("mock_evernote_client")
+@pytest.mark.parametrize("archive_format", ["tar.gz", "zip"])
+@pytest.mark.parametrize("single_notes", [[], ["--single-notes"]])
+def test_export_archive(
+    cli_invoker, tmp_path, fake_token, archive_format, single_notes
+):
+    test_db_path = tmp_path / "test.db"
+    test_archive_path = tmp_path / f"export.{archive_format}"
+
+    cli_invoker("init-db", "--database", test_db_path, "--token", fake_token)
+
+    _fill_export_db(test_db_path)
+
+    export_args = ["--no-export-date", "--include-trash", *single_notes]
+
+    cli_invoker(
+        "export",
+        "--database",
+        test_db_path,
+        *export_args,
+        str(tmp_path / "directory"),
+    )
+    result = cli_invoker(
+        "export",
+        "--database",
+        test_db_path,
+        "--archive",
+        str(test_archive_path),
+        *export_args,
+    )
+
+    directory_files = {
+        Path(p).as_posix(): f
+        for p, f in _read_export_dir(tmp_path / "directory").items()
+    }
+    archive_files = _read_export_archive(test_archive_path, archive_format)
+
+    assert result.exit_code == 0
+    assert archive_files == directory_files
+    assert any(n.startswith("stack1/") for n in archive_files)
+
+
+@pytest.mark.usefixtures("mock_evernote_client")
+def test_export_archive_stdout(tmp_path, fake_token):
+    test_db_path = tmp_path / "test.db"
+
+    cli_runner = CliRunner(mix_stderr=False)
+    cli_runner.invoke(
+        cli, ["init-db", "--database", test_db_path, "--token", fake_token]
+    )
+
+    _fill_export_db(test_db_path)
+
+    result = cli_runner.invoke(
+        cli,
+        [
+            "export",
+            "--database",
+            test_db_path,
+            "--archive",
+            "-",
+            "--archive-format",
+            "tar.gz",
+        ],
+        catch_exceptions=False,
+    )
+
+    with tarfile.open(fileobj=io.BytesIO(result.stdout_bytes)) as tf:
+        member_names = tf.getnames()
+
+    assert result.exit_code == 0
+    assert set(member_names) == {
+        "stack1/name1.enex",
+        "name2.enex",
+        "name2 (1).enex",
+    }
+    assert "All notes have been exported!" in result.stderr
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_export_archive_unknown_format(cli_invoker, fake_storage, tmp_path):
+    result = cli_invoker(
+        "export", "--database", "fake_db", "--archive", str(tmp_path / "export.rar")
+    )
+
+    assert result.exit_code == 1
+    assert "Can't tell archive format" in result.output
+    assert not (tmp_path / "export.rar").exists()
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_export_archive_zstd_not_available(
+    cli_invoker, fake_storage, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(note_exporter_archive, "zstandard", None)
+
+    result = cli_invoker(
+        "export",
+        "--database",
+        "fake_db",
+        "--archive",
+        str(tmp_path / "export.tar.zst"),
+    )
+
+    assert result.exit_code == 1
+    assert "require 'zstandard' package" in result.output
+    assert not (tmp_path / "export.tar.zst").exists()
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_export_archive_error_partial_removed(
+    cli_invoker, fake_storage, tmp_path, mocker
+):
+    fake_storage.notebooks.add_notebooks([Notebook(guid="nbid1", name="name1")])
+    fake_storage.notes.add_note(
+        Note(guid="id1", title="id1", content="test", notebookGuid="nbid1", active=True)
+    )
+
+    mocker.patch.object(
+        NoteExporter, "_write_export_file", side_effect=RuntimeError("test")
+    )
+
+    result = cli_invoker(
+        "export",
+        "--database",
+        "fake_db",
+        "--archive",
+        str(tmp_path / "export.zip"),
+    )
+
+    assert result.exit_code == 1
+    assert not (tmp_path / "export.zip").exists()
+
+
+@pytest.mark.usefixtures("fake_init_db")
+@pytest.mark.parametrize(
+    "export_args",
+    [["--incremental"], ["--workers", "2"]],
+)
+def test_export_archive_unsupported_options(
+    cli_invoker, fake_storage, tmp_path, export_args
+):
+    result = cli_invoker(
+        "export",
+        "--database",
+        "fake_db",
+        "--archive",
+        str(tmp_path / "export.zip"),
+        *export_args,
+    )
+
+    assert result.exit_code == 1
+    assert "can't be used with '--archive'" in result.output
+
+
+@pytest.mark.usefixtures("fake_init_db")
+@pytest.mark.parametrize(
+    "export_args",
+    [[], ["--archive", "export.zip", "test_out"]],
+)
+def test_export_archive_or_output_path(cli_invoker, fake_storage, export_args):
+    result = cli_invoker("export", "--database", "fake_db", *export_args)
+
+    assert result.exit_code == 1
+    assert "Specify either OUTPUT_PATH or '--archive'" in result.output
+
+
+@pytest.mark.usefixtures("fake_init_db")
+@pytest.mark.parametrize(
+    ("export_format", "file_ext"),
+    [("markdown", "md"), ("html", "html")],
+)
+def test_export_document_format(
+    cli_invoker, fake_storage, tmp_path, mocker, export_format, file_ext
+):
+    test_out_path = tmp_path / "test_out"
+
+    fake_storage.notebooks.add_notebooks(
+        [
+            Notebook(guid="nbid1", name="name1", stack="stack1"),
+            Notebook(guid="nbid2", name="name2", stack=None),
+        ]
+    )
+
+    test_body = b"test image"
+    test_hash = hashlib.md5(test_body).digest()
+    test_content = (
+        f'<en-note><en-media hash="{test_hash.hex()}" type="image/png"/></en-note>'
+    )
+
+    for guid, notebook_guid in (("id1", "nbid1"), ("id2", "nbid2")):
+        fake_storage.notes.add_note(
+            Note(
+                guid=guid,
+                title="title",
+                content=test_content,
+                notebookGuid=notebook_guid,
+                active=True,
+                resources=[
+                    Resource(
+                        mime="image/png",
+                        data=Data(body=test_body, bodyHash=test_hash),
+                    )
+                ],
+            )
+        )
+
+    write_resource_spy = mocker.spy(note_exporter, "_write_resource_file")
+
+    result = cli_invoker(
+        "export",
+        "--database",
+        "fake_db",
+        "--format",
+        export_format,
+        str(test_out_path),
+    )
+
+    resource_path = test_out_path / "_resources" / f"{test_hash.hex()}.png"
+    note1_path = test_out_path / "stack1" / "name1" / f"title.{file_ext}"
+    note2_path = test_out_path / "name2" / f"title.{file_ext}"
+
+    assert result.exit_code == 0
+    assert write_resource_spy.call_count == 1
+    assert resource_path.read_bytes() == test_body
+    assert list(resource_path.parent.iterdir()) == [resource_path]
+    assert f"../../_resources/{test_hash.hex()}.png" in note1_path.read_text()
+    assert f"../_resources/{test_hash.hex()}.png" in note2_path.read_text()
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_export_document_format_resources_notebook(cli_invoker, fake_storage, tmp_path):
+    test_out_path = tmp_path / "test_out"
+
+    fake_storage.notebooks.add_notebooks([Notebook(guid="nbid1", name="_resources")])
+
+    test_body = b"test image"
+    test_hash = hashlib.md5(test_body).digest()
+
+    fake_storage.notes.add_note(
+        Note(
+            guid="id1",
+            title="title",
+            content="<en-note/>",
+            notebookGuid="nbid1",
+            active=True,
+            resources=[
+                Resource(
+                    mime="image/png", data=Data(body=test_body, bodyHash=test_hash)
+                )
+            ],
+        )
+    )
+
+    result = cli_invoker(
+        "export",
+        "--database",
+        "fake_db",
+        "--format",
+        "markdown",
+        "--overwrite",
+        str(test_out_path),
+    )
+
+    assert result.exit_code == 0
+    assert sorted(p.name for p in test_out_path.iterdir()) == [
+        "_resources",
+        "_resources (1)",
+    ]
+    assert (test_out_path / "_resources (1)" / "title.md").is_file()
+    assert (test_out_path / "_resources" / f"{test_hash.hex()}.png").is_file()
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_export_incremental_document_resources(
+    cli_invoker, fake_storage, tmp_path, mocker
+):
+    test_out_path = tmp_path / "test_out"
+
+    fake_storage.notebooks.add_notebooks([Notebook(guid="nbid1", name="name1")])
+
+    test_bodies = (b"test image1", b"test image2")
+    test_hashes = [hashlib.md5(b).hexdigest() for b in test_bodies]
+
+    for guid, test_body in zip(("id1", "id2"), test_bodies):
+        fake_storage.notes.add_note(
+            Note(
+                guid=guid,
+                title=guid,
+                content="<en-note/>",
+                notebookGuid="nbid1",
+                active=True,
+                updateSequenceNum=1,
+                resources=[
+                    Resource(
+                        mime="image/png",
+                        data=Data(
+                            body=test_body, bodyHash=hashlib.md5(test_body).digest()
+                        ),
+                    )
+                ],
+            )
+        )
+
+    resource_names = [f"_resources/{h}.png" for h in test_hashes]
+
+    _export_incremental(cli_invoker, test_out_path, "--format", "markdown")
+
+    manifest = json.loads((test_out_path / ".export-manifest.json").read_text())
+
+    assert sorted(manifest["files"]) == [
+        *resource_names,
+        "name1/id1.md",
+        "name1/id2.md",
+    ]
+    assert manifest["files"]["name1/id1.md"]["resources"] == [resource_names[0]]
+
+    spy_write = mocker.spy(NoteExporter, "_write_export_file")
+
+    second_result = _export_incremental(
+        cli_invoker, test_out_path, "--format", "markdown"
+    )
+
+    assert second_result.exit_code == 0
+    spy_write.assert_not_called()
+    assert (test_out_path / resource_names[0]).is_file()
+
+    # Missing attachment makes note that links to it be written again
+    (test_out_path / resource_names[0]).unlink()
+    fake_storage.notes.expunge_notes(["id2"])
+
+    third_result = _export_incremental(
+        cli_invoker, test_out_path, "--format", "markdown"
+    )
+
+    assert third_result.exit_code == 0
+    assert "Removed files: 2" in third_result.output
+    assert (test_out_path / resource_names[0]).is_file()
+    assert not (test_out_path / resource_names[1]).exists()
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_export_document_format_archive(cli_invoker, fake_storage, tmp_path):
+    result = cli_invoker(
+        "export",
+        "--database",
+        "fake_db",
+        "--format",
+        "markdown",
+        "--archive",
+        str(tmp_path / "export.zip"),
+    )
+
+    assert result.exit_code == 1
+    assert "'--format markdown' can't be used with '--archive'" in result.output
+
+
+@pytest.mark.usefixtures("fake_init_db")
+@pytest.mark.parametrize("resource_bodies", [[], ["--jsonl-resource-bodies"]])
+def test_export_jsonl(cli_invoker, fake_storage, tmp_path, resource_bodies):
+    test_out_path = tmp_path / "test_out"
+
+    fake_storage.notebooks.add_notebooks(
+        [Notebook(guid="nbid1", name="name1", stack="stack1")]
+    )
+
+    test_notes = [
+        Note(
+            guid="id1",
+            title="title1",
+            content="<en-note><div>first</div><div>second</div></en-note>",
+            notebookGuid="nbid1",
+            active=True,
+            tagNames=["tag1"],
+            resources=[
+                Resource(
+                    mime="image/png",
+                    data=Data(body=b"test", bodyHash=b"\x12\x34", size=4),
+                )
+            ],
+        ),
+        Note(
+            guid="id2",
+            title="title2",
+            content="<en-note>deleted</en-note>",
+            notebookGuid="nbid1",
+            active=False,
+        ),
+    ]
+
+    for note in test_notes:
+        fake_storage.notes.add_note(note)
+
+    fake_storage.tasks.add_task(Task(taskId="tid1", parentId="id1", label="task1"))
+    fake_storage.reminders.add_reminder(Reminder(reminderId="rid1", sourceId="tid1"))
+
+    result = cli_invoker(
+        "export",
+        "--database",
+        "fake_db",
+        "--format",
+        "jsonl",
+        "--include-trash",
+        *resource_bodies,
+        str(test_out_path),
+    )
+
+    note_records = [
+        json.loads(line)
+        for line in (test_out_path / "notes.jsonl").read_text().splitlines()
+    ]
+
+    assert result.exit_code == 0
+    assert [r["guid"] for r in note_records] == ["id1", "id2"]
+    assert note_records[0]["notebook_name"] == "name1"
+    assert note_records[0]["stack"] == "stack1"
+    assert note_records[0]["tags"] == ["tag1"]
+    assert note_records[0]["text"] == "first second"
+    assert note_records[0]["content"] == test_notes[0].content
+    assert note_records[0]["tasks"][0]["label"] == "task1"
+    assert note_records[0]["tasks"][0]["reminders"][0]["reminderId"] == "rid1"
+    assert note_records[0]["resources"][0]["hash"] == "1234"
+    assert note_records[0]["resources"][0]["size"] == 4
+    assert note_records[1]["is_active"] is False
+    assert note_records[1]["notebook_name"] == "name1"
+
+    if resource_bodies:
+        assert note_records[0]["resources"][0]["body"] == "dGVzdA=="
+    else:
+        assert "body" not in note_records[0]["resources"][0]
+
+
+@pytest.mark.usefixtures("fake_init_db")
+@pytest.mark.parametrize(
+    "export_args",
+    [["--incremental"], ["--workers", "2"]],
+)
+def test_export_jsonl_unsupported_options(
+    cli_invoker, fake_storage, tmp_path, export_args
+):
+    result = cli_invoker(
+        "export",
+        "--database",
+        "fake_db",
+        "--format",
+        "jsonl",
+        *export_args,
+        str(tmp_path / "test_out"),
+    )
+
+    assert result.exit_code == 1
+    assert "can't be used with '--format jsonl'" in result.output
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_export_filters(cli_invoker, fake_storage, tmp_path):
+    test_out_path = tmp_path / "test_out"
+
+    fake_storage.notebooks.add_notebooks(
+        [
+            Notebook(guid="nbid1", name="name1", stack="stack1"),
+            Notebook(guid="nbid2", name="name2", stack="stack1"),
+            Notebook(guid="nbid3", name="name3", stack=None),
+        ]
+    )
+
+    # 2024-01-01, 2024-02-01, 2024-03-01 UTC
+    jan, feb, mar = 1704067200000, 1706745600000, 1709251200000
+
+    test_notes = [
+        ("id1", "nbid1", jan, mar),
+        ("id2", "nbid1", feb, feb),
+        ("id3", "nbid2", mar, mar),
+        ("id4", "nbid3", jan, mar),
+    ]
+
+    for guid, notebook_guid, created, updated in test_notes:
+        fake_storage.notes.add_note(
+            Note(
+                guid=guid,
+                title=guid,
+                content="test",
+                notebookGuid=notebook_guid,
+                active=True,
+                created=created,
+                updated=updated,
+            )
+        )
+
+    result = cli_invoker(
+        "export",
+        "--database",
+        "fake_db",
+        "--single-notes",
+        "--stack",
+        "stack1",
+        "--stack",
+        "stack2",
+        "--created-before",
+        "2024-03-01",
+        "--updated-after",
+        "2024-02-01",
+        str(test_out_path),
+    )
+
+    assert result.exit_code == 0
+    assert sorted(_read_export_dir(test_out_path)) == [
+        "stack1/name1/id1.enex",
+        "stack1/name1/id2.enex",
+    ]
+    assert "Stack 'stack2' not found in database." in result.output
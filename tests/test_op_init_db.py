@@ -85,3 +85,27 @@ def test_init_db_touch_token(cli_invoker, mocker):
 
     assert result.exit_code == 1
     assert "test error" in result.output
+
+
+def test_init_db_storage_profile(
+    tmp_path, cli_invoker, mock_evernote_client, fake_token
+):
+    test_db_path = tmp_path / "test.db"
+
+    result = cli_invoker(
+        "init-db",
+        "--database",
+        test_db_path,
+        "--token",
+        fake_token,
+        "--storage-profile",
+        "fast",
+    )
+
+    storage = SqliteStorage(test_db_path)
+    storage_settings = storage.get_storage_settings()
+
+    assert result.exit_code == 0
+    assert storage.config.get_config_value("storage_profile") == "fast"
+    assert storage_settings["page_size"] == "16384"
+    assert storage_settings["journal_mode"] == "wal"
@@ -0,0 +1,67 @@
+import pytest
+from evernote.edam.type.ttypes import Data, Note, Resource
+
+from evernote_backup.evernote_types import Reminder, Task
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_manage_recompress(cli_invoker, fake_storage):
+    test_note = Note(
+        guid="id1",
+        title="test",
+        content="test",
+        notebookGuid="nbid1",
+        active=True,
+        resources=[Resource(data=Data(bodyHash=b"\x01", body=b"test"))],
+    )
+    test_task = Task(taskId="t1", parentId="id1")
+    test_reminder = Reminder(reminderId="r1", sourceId="t1")
+
+    fake_storage.notes.add_note(test_note)
+    fake_storage.tasks.add_task(test_task)
+    fake_storage.reminders.add_reminder(test_reminder)
+
+    result = cli_invoker("manage", "recompress", "--database", "fake_db")
+
+    assert result.exit_code == 0
+    assert "Recompressed notes: 1" in result.output
+
+    with fake_storage.db as con:
+        for table_name in ("notes", "resources", "tasks", "reminders"):
+            codecs = {r[0] for r in con.execute(f"select codec from {table_name}")}
+            assert codecs == {"zlib"}
+
+    assert fake_storage.config.get_config_value("storage_codec") == "zlib"
+    assert fake_storage.notes.get_note("id1") == test_note
+    assert list(fake_storage.tasks.iter_tasks("id1")) == [test_task]
+    assert list(fake_storage.reminders.iter_reminders("t1")) == [test_reminder]
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_manage_recompress_codec_unavailable(cli_invoker, mocker):
+    mocker.patch("evernote_backup.note_storage.zstandard", None)
+
+    result = cli_invoker(
+        "manage", "recompress", "--database", "fake_db", "--codec", "zstd"
+    )
+
+    assert result.exit_code == 1
+    assert "requires 'zstandard' package" in result.output
+    assert "'evernote-backup[zstd]' extra" in result.output
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_manage_recompress_stored_codec_unavailable(cli_invoker, fake_storage, mocker):
+    fake_storage.notes.add_note(Note(guid="id1", title="test", active=True))
+
+    with fake_storage.db as con:
+        con.execute("update notes set codec='zstd'")
+
+    mocker.patch("evernote_backup.note_storage.zstandard", None)
+
+    result = cli_invoker(
+        "manage", "recompress", "--database", "fake_db", "--codec", "zlib"
+    )
+
+    assert result.exit_code == 1
+    assert "Storage codec 'zstd' requires 'zstandard' package" in result.output
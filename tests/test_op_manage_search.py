@@ -0,0 +1,192 @@
+import pytest
+from evernote.edam.type.ttypes import Data, Note, Notebook, Resource
+
+ENML_TEMPLATE = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<!DOCTYPE en-note SYSTEM "http://xml.evernote.com/pub/enml2.dtd">'
+    "<en-note><div>{0}</div></en-note>"
+)
+
+RECOGNITION_XML = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<recoIndex docType="picture"><item x="1" y="1" w="10" h="10">'
+    '<t w="80">scanned</t><t w="40">scammed</t>'
+    "</item></recoIndex>"
+)
+
+
+@pytest.fixture
+def search_notes(fake_storage):
+    fake_storage.notebooks.add_notebooks(
+        [
+            Notebook(guid="nbid1", name="Work"),
+            Notebook(guid="nbid2", name="Home"),
+        ]
+    )
+
+    test_notes = [
+        Note(
+            guid="id1",
+            title="Quarterly invoice",
+            content=ENML_TEMPLATE.format("Payment for consulting services"),
+            notebookGuid="nbid1",
+            active=True,
+            updated=1704067200000,  # 2024-01-01
+            tagNames=["finance"],
+        ),
+        Note(
+            guid="id2",
+            title="Shopping list",
+            content=ENML_TEMPLATE.format("Milk, bread and invoice paper"),
+            notebookGuid="nbid2",
+            active=True,
+            updated=1717200000000,  # 2024-06-01
+        ),
+        Note(
+            guid="id3",
+            title="Receipt",
+            content=ENML_TEMPLATE.format("<en-media hash='00' type='image/png'/>"),
+            notebookGuid="nbid2",
+            active=True,
+            updated=1717200000000,
+            resources=[
+                Resource(
+                    data=Data(bodyHash=b"\x00", body=b"image"),
+                    recognition=Data(body=RECOGNITION_XML.encode()),
+                )
+            ],
+        ),
+        Note(
+            guid="id4",
+            title="Old invoice",
+            content=ENML_TEMPLATE.format("Deleted"),
+            notebookGuid="nbid1",
+            active=False,
+        ),
+    ]
+
+    for note in test_notes:
+        fake_storage.notes.add_note(note)
+
+    return test_notes
+
+
+@pytest.mark.usefixtures("fake_init_db", "search_notes")
+def test_manage_search_ranked(cli_invoker):
+    result = cli_invoker("manage", "search", "invoice")
+
+    assert result.exit_code == 0
+    assert "Found notes: 2" in result.output
+    # Title match ranks above text match
+    assert result.output.index("'Quarterly invoice' [Work] 2024-01-01") < (
+        result.output.index("'Shopping list' [Home] 2024-06-01")
+    )
+    assert "Milk, bread and [invoice] paper" in result.output
+    assert "Old invoice" not in result.output
+
+
+@pytest.mark.usefixtures("fake_init_db", "search_notes")
+def test_manage_search_recognition(cli_invoker):
+    result = cli_invoker("manage", "search", "scanned")
+
+    assert result.exit_code == 0
+    assert "'Receipt' [Home]" in result.output
+
+
+@pytest.mark.usefixtures("fake_init_db", "search_notes")
+@pytest.mark.parametrize(
+    ("search_args", "expected_title"),
+    [
+        (["--notebook", "Home"], "Shopping list"),
+        (["--tag", "finance"], "Quarterly invoice"),
+        (["--date-from", "2024-03-01"], "Shopping list"),
+        (["--date-to", "2024-01-01"], "Quarterly invoice"),
+    ],
+)
+def test_manage_search_filters(cli_invoker, search_args, expected_title):
+    result = cli_invoker("manage", "search", *search_args, "invoice")
+
+    assert result.exit_code == 0
+    assert "Found notes: 1" in result.output
+    assert expected_title in result.output
+
+
+@pytest.mark.usefixtures("fake_init_db", "search_notes")
+def test_manage_search_include_trash(cli_invoker):
+    result = cli_invoker("manage", "search", "--include-trash", "invoice")
+
+    assert result.exit_code == 0
+    assert "'Old invoice' [Trash]" in result.output
+
+
+@pytest.mark.usefixtures("fake_init_db", "search_notes")
+def test_manage_search_notebook_missing(cli_invoker):
+    result = cli_invoker("manage", "search", "--notebook", "Fake", "invoice")
+
+    assert result.exit_code == 0
+    assert "Notebook 'Fake' not found in database." in result.output
+    assert "No notes found." in result.output
+
+
+@pytest.mark.usefixtures("fake_init_db", "search_notes")
+def test_manage_search_bad_query(cli_invoker):
+    result = cli_invoker("manage", "search", '"unclosed')
+
+    assert result.exit_code == 1
+    assert "Invalid search query" in result.output
+
+
+@pytest.mark.usefixtures("fake_init_db", "search_notes")
+def test_manage_search_updated_note(cli_invoker, fake_storage):
+    fake_storage.notes.add_note(
+        Note(
+            guid="id1",
+            title="Quarterly report",
+            content=ENML_TEMPLATE.format("Revenue"),
+            notebookGuid="nbid1",
+            active=True,
+        )
+    )
+    fake_storage.notes.expunge_notes(["id2"])
+
+    result = cli_invoker("manage", "search", "invoice")
+
+    assert result.exit_code == 0
+    assert "No notes found." in result.output
+
+
+@pytest.mark.usefixtures("fake_init_db", "search_notes")
+def test_manage_reindex(cli_invoker, fake_storage):
+    with fake_storage.db as con:
+        con.executescript(
+            """
+            DROP TRIGGER notes_text_insert;
+            DROP TRIGGER notes_text_delete;
+            DROP TABLE notes_fts;
+            """
+        )
+        con.execute("delete from notes_text")
+
+    result = cli_invoker("manage", "reindex")
+    search_result = cli_invoker("manage", "search", "consulting")
+
+    assert result.exit_code == 0
+    assert "Indexed notes: 4" in result.output
+    assert "'Quarterly invoice' [Work]" in search_result.output
+
+
+@pytest.mark.usefixtures("fake_init_db", "search_notes")
+def test_manage_search_not_available(cli_invoker, fake_storage):
+    with fake_storage.db as con:
+        con.executescript(
+            """
+            DROP TRIGGER notes_text_insert;
+            DROP TRIGGER notes_text_delete;
+            DROP TABLE notes_fts;
+            """
+        )
+
+    result = cli_invoker("manage", "search", "invoice")
+
+    assert result.exit_code == 1
+    assert "lacks FTS5 support" in result.output
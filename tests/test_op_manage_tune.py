@@ -0,0 +1,50 @@
+import pytest
+
+from evernote_backup.note_storage import SqliteStorage
+
+
+@pytest.mark.usefixtures("mock_evernote_client")
+def test_manage_tune_report(tmp_path, cli_invoker, fake_token):
+    test_db_path = tmp_path / "test.db"
+
+    cli_invoker("init-db", "--database", test_db_path, "--token", fake_token)
+
+    result = cli_invoker("manage", "tune", "--database", test_db_path)
+
+    assert result.exit_code == 0
+    assert "Storage profile: not set" in result.output
+    assert "journal_mode: delete" in result.output
+    assert "page_size: 4096" in result.output
+
+
+@pytest.mark.usefixtures("mock_evernote_client")
+def test_manage_tune_apply_profile(tmp_path, cli_invoker, fake_token):
+    test_db_path = tmp_path / "test.db"
+
+    cli_invoker("init-db", "--database", test_db_path, "--token", fake_token)
+
+    result = cli_invoker(
+        "manage", "tune", "--database", test_db_path, "--profile", "network"
+    )
+
+    storage = SqliteStorage(test_db_path)
+
+    assert result.exit_code == 0
+    assert "Storage profile: network" in result.output
+    assert "journal_mode: truncate" in result.output
+    assert "synchronous: 1" in result.output
+    assert storage.config.get_config_value("storage_profile") == "network"
+
+
+@pytest.mark.usefixtures("mock_evernote_client")
+def test_manage_tune_stored_profile_applied(tmp_path, cli_invoker, fake_token):
+    test_db_path = tmp_path / "test.db"
+
+    cli_invoker("init-db", "--database", test_db_path, "--token", fake_token)
+    cli_invoker("manage", "tune", "--database", test_db_path, "--profile", "fast")
+
+    result = cli_invoker("manage", "tune", "--database", test_db_path)
+
+    assert result.exit_code == 0
+    assert "journal_mode: wal" in result.output
+    assert "temp_store: 2" in result.output
@@ -1,9 +1,11 @@
 import struct
+import threading
 import time
 from hashlib import md5
 
 import pytest
 from evernote.edam.error.ttypes import EDAMErrorCode, EDAMSystemException
+from evernote.edam.notestore.ttypes import SyncChunk
 from evernote.edam.type.ttypes import (
     Data,
     LinkedNotebook,
@@ -13,8 +15,10 @@ from evernote.edam.type.ttypes import (
     Tag,
 )
 
-from evernote_backup import note_synchronizer
+from evernote_backup import note_storage, note_synchronizer
+from evernote_backup.evernote_client_sync import EvernoteClientSync
 from evernote_backup.evernote_types import Reminder, Task
+from tests import conftest
 
 
 @pytest.mark.usefixtures("fake_init_db")
@@ -36,6 +40,20 @@ def test_sync_add_notebook(cli_invoker, mock_evernote_client, fake_storage):
     assert result_notebooks == test_notebooks
 
 
+@pytest.mark.usefixtures("fake_init_db")
+def test_sync_storage_codec_unavailable(
+    cli_invoker, mock_evernote_client, fake_storage, mocker
+):
+    fake_storage.config.set_config_value("storage_codec", "zstd")
+    mocker.patch.object(note_storage, "zstandard", None)
+
+    result = cli_invoker("sync", "--database", "fake_db")
+
+    assert result.exit_code == 1
+    assert "Storage codec 'zstd' requires 'zstandard' package" in result.output
+    assert mock_evernote_client.fake_note_spec_calls == []
+
+
 @pytest.mark.usefixtures("fake_init_db")
 def test_sync_add_note(cli_invoker, mock_evernote_client, fake_storage):
     mock_evernote_client.fake_notebooks.append(
@@ -603,8 +621,10 @@ def test_sync_interrupt_download(
     )
     mock_get_note.side_effect = fake_slow_get_note
 
-    mock_add_note = mocker.patch("evernote_backup.note_storage.NoteStorage.add_note")
-    mock_add_note.side_effect = interrupter
+    mock_write_note = mocker.patch(
+        "evernote_backup.note_synchronizer.NoteWriter.submit"
+    )
+    mock_write_note.side_effect = interrupter
 
     result = cli_invoker("sync", "--database", "fake_db")
 
@@ -691,23 +711,28 @@ def test_sync_edam_exception_while_download(
 def test_sync_edam_rate_limit_exception_while_download(
     cli_invoker, mock_evernote_client, fake_storage, mocker
 ):
+    mock_evernote_client.fake_notebooks.append(Notebook(guid="nbid1", name="name1"))
+
     test_notes = [Note(guid=f"id{i}", title="test") for i in range(10)]
 
     mock_evernote_client.fake_notes.extend(test_notes)
 
+    rate_limited_notes = {"id3"}
+
     def fake_get_note(note_guid):
-        if note_guid == "id3":
+        if note_guid in rate_limited_notes:
+            rate_limited_notes.remove(note_guid)
             raise EDAMSystemException(
                 errorCode=EDAMErrorCode.RATE_LIMIT_REACHED,
                 message="Test rate limit",
-                rateLimitDuration=10,
+                rateLimitDuration=1,
             )
 
         return Note(
             guid=note_guid,
             title="test",
             content="test",
-            notebookGuid="test",
+            notebookGuid="nbid1",
             contentLength=100,
             active=True,
         )
@@ -719,8 +744,13 @@ def test_sync_edam_rate_limit_exception_while_download(
 
     result = cli_invoker("sync", "--database", "fake_db")
 
-    assert result.exit_code == 1
-    assert "Rate limit reached. Restart program in 0:10" in result.output
+    result_notes = list(fake_storage.notes.iter_notes("nbid1"))
+
+    assert result.exit_code == 0
+    assert len(result_notes) == 10
+    assert mock_get_note.call_count == 11
+    assert "Rate limit reached, downloads paused for 0:01" in result.output
+    assert "Time spent waiting on rate limits: 0:01" in result.output
 
 
 @pytest.mark.usefixtures("fake_init_db")
@@ -901,7 +931,206 @@ def test_sync_custom_max_download_workers(
 
     assert result.exit_code == 0
     assert result_notes == [test_note]
-    thread_pool_spy.assert_called_once_with(max_workers=test_max_download_workers)
+    assert thread_pool_spy.call_args_list == [
+        mocker.call(max_workers=note_synchronizer.WRITER_ENCODER_WORKERS),
+        mocker.call(max_workers=test_max_download_workers),
+    ]
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_sync_async_engine(cli_invoker, mock_evernote_client, fake_storage):
+    mock_evernote_client.fake_tags = [Tag(guid="tid1", name="tag1")]
+
+    mock_evernote_client.fake_notebooks.append(
+        Notebook(guid="nbid1", name="name1", stack="stack1"),
+    )
+
+    for i in range(10):
+        mock_evernote_client.fake_notes.append(
+            Note(
+                guid=f"id{i}",
+                title=f"title{i}",
+                content="body1",
+                notebookGuid="nbid1",
+                contentLength=100,
+                active=True,
+                tagGuids=["tid1"],
+            )
+        )
+
+    result = cli_invoker(
+        "sync",
+        "--database",
+        "fake_db",
+        "--engine",
+        "asyncio",
+        "--max-download-workers",
+        3,
+    )
+
+    result_notes = sorted(
+        fake_storage.notes.iter_notes("nbid1"), key=lambda x: int(x.guid[2:])
+    )
+
+    assert result.exit_code == 0
+    assert result_notes == mock_evernote_client.fake_notes
+    assert all(n.tagNames == ["tag1"] for n in result_notes)
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_sync_async_engine_blocking_calls_off_loop(
+    cli_invoker, mock_evernote_client, fake_storage, mocker
+):
+    mock_evernote_client.fake_tags = [Tag(guid="tid1", name="tag1")]
+    mock_evernote_client.fake_notebooks.append(Notebook(guid="nbid1", name="name1"))
+
+    for i in range(5):
+        mock_evernote_client.fake_notes.append(
+            Note(
+                guid=f"id{i}",
+                title=f"title{i}",
+                notebookGuid="nbid1",
+                active=True,
+                tagGuids=["tid1"],
+            )
+        )
+
+    threads = {"loop": set(), "tags": set(), "write": set()}
+
+    async def fake_get_note(self, note_guid):
+        threads["loop"].add(threading.get_ident())
+        return self.getNote(note_guid, True, True, True, True)
+
+    orig_fill_note_tags = EvernoteClientSync.fill_note_tags
+    orig_submit = note_synchronizer.NoteWriter.submit
+
+    def fill_note_tags_spy(self, note):
+        threads["tags"].add(threading.get_ident())
+        return orig_fill_note_tags(self, note)
+
+    def submit_spy(self, note):
+        threads["write"].add(threading.get_ident())
+        return orig_submit(self, note)
+
+    mocker.patch(
+        "tests.conftest.FakeEvernoteAsyncNoteStore.get_note", new=fake_get_note
+    )
+    mocker.patch.object(EvernoteClientSync, "fill_note_tags", new=fill_note_tags_spy)
+    mocker.patch.object(note_synchronizer.NoteWriter, "submit", new=submit_spy)
+
+    result = cli_invoker("sync", "--database", "fake_db", "--engine", "asyncio")
+
+    assert result.exit_code == 0
+    assert len(list(fake_storage.notes.iter_notes("nbid1"))) == 5
+    assert threads["write"] == {threading.main_thread().ident}
+    assert len(threads["loop"]) == 1
+    assert threads["loop"].isdisjoint(threads["tags"] | threads["write"])
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_sync_async_engine_linked_notebook_note(
+    cli_invoker, mock_evernote_client, fake_storage
+):
+    mock_evernote_client.fake_l_tags = [Tag(guid="tid1", name="tag1")]
+
+    mock_evernote_client.fake_l_notebooks.append(
+        Notebook(guid="nbid1", name="name1"),
+    )
+
+    test_note = Note(
+        guid="id1",
+        title="title1",
+        content="body1",
+        notebookGuid="nbid1",
+        active=True,
+        contentLength=100,
+        tagGuids=["tid1"],
+    )
+
+    mock_evernote_client.fake_l_notes.append(test_note)
+
+    mock_evernote_client.fake_linked_notebooks.append(
+        LinkedNotebook(guid="id3", shardId="s100")
+    )
+    mock_evernote_client.fake_linked_notebook_auth_token = (
+        "S=s200:U=ff:E=fff:C=ff:P=1:A=test222:V=2:H=ff"
+    )
+
+    result = cli_invoker("sync", "--database", "fake_db", "--engine", "asyncio")
+
+    result_notes = list(fake_storage.notes.iter_notes("nbid1"))
+
+    assert result.exit_code == 0
+    assert result_notes == [test_note]
+    assert result_notes[0].tagNames == ["tag1"]
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_sync_async_engine_exception_while_download(
+    cli_invoker, mock_evernote_client, fake_storage, mocker
+):
+    mock_evernote_client.fake_notebooks.append(Notebook(guid="nbid1", name="name1"))
+
+    test_notes = [
+        Note(
+            guid=f"id{i}",
+            title="test",
+            content="test",
+            notebookGuid="nbid1",
+            contentLength=100,
+            active=True,
+        )
+        for i in range(10)
+    ]
+
+    mock_evernote_client.fake_notes.extend(test_notes)
+
+    async def fake_get_note(self, note_guid):
+        if note_guid == "id3":
+            raise EDAMSystemException(
+                errorCode=EDAMErrorCode.INTERNAL_ERROR, message="Test error"
+            )
+
+        return self.getNote(note_guid, True, True, True, True)
+
+    mocker.patch(
+        "tests.conftest.FakeEvernoteAsyncNoteStore.get_note", new=fake_get_note
+    )
+
+    result = cli_invoker("sync", "--database", "fake_db", "--engine", "asyncio")
+
+    result_notes = list(fake_storage.notes.iter_notes("nbid1"))
+
+    assert result.exit_code == 0
+    assert len(result_notes) == 9
+    assert (
+        "Remote server returned system error (INTERNAL_ERROR - Test error) while downloading note [id3]"
+        in result.output
+    )
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_sync_async_engine_unknown_exception_on_write(
+    cli_invoker, mock_evernote_client, fake_storage, mocker
+):
+    test_notes = [Note(guid=f"id{i}", title="test") for i in range(10)]
+
+    mock_evernote_client.fake_notes.extend(test_notes)
+
+    def interrupter(note):
+        if note.guid == "id3":
+            raise RuntimeError("Test error")
+
+    mock_write_note = mocker.patch(
+        "evernote_backup.note_synchronizer.NoteWriter.submit"
+    )
+    mock_write_note.side_effect = interrupter
+
+    result = cli_invoker("sync", "--database", "fake_db", "--engine", "asyncio")
+
+    assert result.exit_code == 1
+    assert "Aborting, please wait" in result.output
+    assert "Test error" in result.output
 
 
 @pytest.mark.usefixtures("fake_init_db")
@@ -1284,3 +1513,705 @@ def test_sync_unknown_error_on_jwt(cli_invoker, mock_evernote_client, fake_stora
 
     assert result.exit_code == 1
     assert "EDAMUserException" in result.output
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_sync_async_engine_rate_limit_exception_while_download(
+    cli_invoker, mock_evernote_client, fake_storage, mocker
+):
+    mock_evernote_client.fake_notebooks.append(Notebook(guid="nbid1", name="name1"))
+
+    test_notes = [
+        Note(
+            guid=f"id{i}",
+            title="test",
+            content="test",
+            notebookGuid="nbid1",
+            contentLength=100,
+            active=True,
+        )
+        for i in range(10)
+    ]
+
+    mock_evernote_client.fake_notes.extend(test_notes)
+
+    rate_limited_notes = {"id3"}
+
+    async def fake_get_note(self, note_guid):
+        if note_guid in rate_limited_notes:
+            rate_limited_notes.remove(note_guid)
+            raise EDAMSystemException(
+                errorCode=EDAMErrorCode.RATE_LIMIT_REACHED,
+                message="Test rate limit",
+                rateLimitDuration=1,
+            )
+
+        return self.getNote(note_guid, True, True, True, True)
+
+    mocker.patch(
+        "tests.conftest.FakeEvernoteAsyncNoteStore.get_note", new=fake_get_note
+    )
+
+    result = cli_invoker("sync", "--database", "fake_db", "--engine", "asyncio")
+
+    result_notes = list(fake_storage.notes.iter_notes("nbid1"))
+
+    assert result.exit_code == 0
+    assert len(result_notes) == 10
+    assert "Rate limit reached, downloads paused for 0:01" in result.output
+    assert "Time spent waiting on rate limits: 0:01" in result.output
+
+
+def test_rate_limit_governor_overlapping_limits(mocker):
+    mock_time = mocker.patch("evernote_backup.note_synchronizer.time.monotonic")
+    mock_time.return_value = 100
+
+    governor = note_synchronizer.RateLimitGovernor()
+
+    governor.report_rate_limit(10)
+    governor.report_rate_limit(5)
+
+    mock_time.return_value = 105
+    governor.report_rate_limit(10)
+
+    assert governor.get_pause_left() == 10
+    assert governor.total_wait == 15
+
+
+def test_rate_limit_governor_no_duration(mocker):
+    mock_time = mocker.patch("evernote_backup.note_synchronizer.time.monotonic")
+    mock_time.return_value = 100
+
+    governor = note_synchronizer.RateLimitGovernor()
+
+    governor.report_rate_limit(None)
+
+    assert governor.get_pause_left() == note_synchronizer.RATE_LIMIT_DEFAULT_DURATION
+
+
+def test_rate_limit_governor_cancel():
+    governor = note_synchronizer.RateLimitGovernor()
+
+    governor.report_rate_limit(100)
+    governor.cancel()
+
+    governor.wait()
+
+    assert governor.get_pause_left() > 0
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_sync_pipelined(cli_invoker, mock_evernote_client, fake_storage):
+    mock_evernote_client.fake_notebooks.append(Notebook(guid="nbid1", name="name1"))
+    mock_evernote_client.fake_l_notebooks.append(Notebook(guid="nbid2", name="name2"))
+
+    test_notes = [
+        Note(
+            guid=f"id{i}",
+            title="test",
+            content="test",
+            notebookGuid="nbid1",
+            contentLength=100,
+            active=True,
+        )
+        for i in range(10)
+    ]
+    test_l_note = Note(
+        guid="lid1",
+        title="test",
+        content="test",
+        notebookGuid="nbid2",
+        contentLength=100,
+        active=True,
+    )
+
+    mock_evernote_client.fake_notes.extend(test_notes)
+    mock_evernote_client.fake_l_notes.append(test_l_note)
+
+    mock_evernote_client.fake_linked_notebooks.append(
+        LinkedNotebook(guid="id3", shardId="s100")
+    )
+    mock_evernote_client.fake_linked_notebook_auth_token = (
+        "S=s200:U=ff:E=fff:C=ff:P=1:A=test222:V=2:H=ff"
+    )
+
+    result = cli_invoker("sync", "--database", "fake_db", "--pipelined")
+
+    result_notes = list(fake_storage.notes.iter_notes("nbid1"))
+    result_l_notes = list(fake_storage.notes.iter_notes("nbid2"))
+
+    assert result.exit_code == 0
+    assert len(result_notes) == 10
+    assert result_l_notes == [test_l_note]
+    assert fake_storage.notes.get_notes_for_sync() == ()
+    assert fake_storage.config.get_config_value("USN") == "100"
+    assert "Updated or added notes: 11" in result.output
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_sync_pipelined_note_changed_while_downloading(
+    cli_invoker, mock_evernote_client, fake_storage, mocker
+):
+    chunk_notes = [
+        Note(guid="id1", title="test1", notebookGuid="nbid1"),
+        Note(guid="id2", title="test2", notebookGuid="nbid1"),
+    ]
+
+    downloads_released = threading.Event()
+
+    def fake_iter_sync_chunks(after_usn):
+        yield SyncChunk(
+            chunkHighUSN=50,
+            notebooks=[Notebook(guid="nbid1", name="name1")],
+            notes=chunk_notes,
+        )
+        # Notes from first chunk are still downloading
+        yield SyncChunk(chunkHighUSN=100, notes=chunk_notes[:1], expungedNotes=["id2"])
+        downloads_released.set()
+
+    mocker.patch(
+        "evernote_backup.evernote_client_sync.EvernoteClientSync.iter_sync_chunks",
+        side_effect=fake_iter_sync_chunks,
+    )
+
+    def fake_get_note(note_guid):
+        downloads_released.wait()
+
+        return Note(
+            guid=note_guid,
+            title="test",
+            content="test",
+            notebookGuid="nbid1",
+            contentLength=100,
+            active=True,
+        )
+
+    mock_get_note = mocker.patch(
+        "evernote_backup.evernote_client_sync.EvernoteClientSync.get_note",
+        side_effect=fake_get_note,
+    )
+
+    result = cli_invoker("sync", "--database", "fake_db", "--pipelined")
+
+    result_notes = list(fake_storage.notes.iter_notes("nbid1"))
+    called_guids = sorted(c.args[0] for c in mock_get_note.call_args_list)
+
+    assert result.exit_code == 0
+    assert [n.guid for n in result_notes] == ["id1"]
+    # Updated id1 is rescheduled, stale download and expunged id2 are not written
+    assert called_guids == ["id1", "id1", "id2"]
+    assert "Updated or added notes: 1" in result.output
+    assert fake_storage.config.get_config_value("USN") == "100"
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_sync_pipelined_exception_while_download(
+    cli_invoker, mock_evernote_client, fake_storage, mocker
+):
+    mock_evernote_client.fake_notebooks.append(Notebook(guid="nbid1", name="name1"))
+
+    test_notes = [Note(guid=f"id{i}", title="test") for i in range(10)]
+
+    mock_evernote_client.fake_notes.extend(test_notes)
+
+    def fake_get_note(note_guid):
+        if note_guid == "id3":
+            raise struct.error
+
+        return Note(
+            guid=note_guid,
+            title="test",
+            content="test",
+            notebookGuid="nbid1",
+            contentLength=100,
+            active=True,
+        )
+
+    mock_get_note = mocker.patch(
+        "evernote_backup.evernote_client_sync.EvernoteClientSync.get_note",
+        side_effect=fake_get_note,
+    )
+
+    result = cli_invoker("sync", "--database", "fake_db", "--pipelined")
+
+    result_notes = list(fake_storage.notes.iter_notes("nbid1"))
+
+    assert result.exit_code == 0
+    assert len(result_notes) == 9
+    # Failed note is not retried again by catch-up pass
+    assert mock_get_note.call_count == 9 + 5
+    assert "Failed to download note [id3] after 5 attempts!" in result.output
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_sync_pipelined_unknown_exception_while_download(
+    cli_invoker, mock_evernote_client, fake_storage, mocker
+):
+    mock_evernote_client.fake_notebooks.append(Notebook(guid="nbid1", name="name1"))
+    mock_evernote_client.fake_notes.append(Note(guid="id1", title="test"))
+
+    mocker.patch(
+        "evernote_backup.note_synchronizer.NoteClientWorker.__call__",
+        side_effect=RuntimeError("Test error"),
+    )
+
+    result = cli_invoker("sync", "--database", "fake_db", "--pipelined")
+
+    assert result.exit_code == 1
+    assert "Aborting, please wait..." in result.output
+    assert "Unknown exception caught while downloading note 'test'!" in result.output
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_sync_pipelined_async_engine(cli_invoker, mock_evernote_client, fake_storage):
+    result = cli_invoker(
+        "sync", "--database", "fake_db", "--pipelined", "--engine", "asyncio"
+    )
+
+    assert result.exit_code == 1
+    assert "'--pipelined' sync is only supported with 'threads' engine!" in (
+        result.output
+    )
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_sync_chunk_prefetch(cli_invoker, mock_evernote_client, fake_storage, mocker):
+    mock_evernote_client.fake_usn = 3
+
+    test_notebooks = [Notebook(guid="nbid1", name="name1")]
+    test_notes = [
+        Note(
+            guid=f"id{i}",
+            title="test",
+            content="test",
+            notebookGuid="nbid1",
+            contentLength=100,
+            active=True,
+        )
+        for i in range(3)
+    ]
+
+    mock_evernote_client.fake_notes.extend(test_notes)
+
+    def fake_get_sync_chunk(self, afterUSN, maxEntries, filter):
+        return SyncChunk(
+            currentTime=0,
+            chunkHighUSN=afterUSN + 1,
+            updateCount=3,
+            notebooks=test_notebooks if afterUSN == 0 else None,
+            notes=[test_notes[afterUSN]],
+        )
+
+    mocker.patch(
+        "tests.conftest.FakeEvernoteNoteStore.getFilteredSyncChunk",
+        new=fake_get_sync_chunk,
+    )
+
+    result = cli_invoker(
+        "sync",
+        "--database",
+        "fake_db",
+        "--chunk-prefetch-depth",
+        "2",
+    )
+
+    result_notes = list(fake_storage.notes.iter_notes("nbid1"))
+
+    assert result.exit_code == 0
+    assert sorted(n.guid for n in result_notes) == ["id0", "id1", "id2"]
+    assert fake_storage.config.get_config_value("USN") == "3"
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_sync_linked_notebooks_skip_unchanged(
+    cli_invoker, mock_evernote_client, fake_storage, mocker
+):
+    mock_evernote_client.fake_l_notebooks.append(Notebook(guid="nbid1", name="name1"))
+    mock_evernote_client.fake_linked_notebooks.extend(
+        [LinkedNotebook(guid=f"id{i}", shardId="s100") for i in range(5)]
+    )
+    mock_evernote_client.fake_l_usn = 123
+
+    spy_get_chunk = mocker.spy(
+        conftest.FakeEvernoteNoteStore, "getLinkedNotebookSyncChunk"
+    )
+
+    result = cli_invoker("sync", "--database", "fake_db")
+
+    assert result.exit_code == 0
+    assert spy_get_chunk.call_count == 5
+    assert all(
+        fake_storage.notebooks.get_linked_notebook_usn(f"id{i}") == 123
+        for i in range(5)
+    )
+
+    spy_get_chunk.reset_mock()
+
+    result = cli_invoker("sync", "--database", "fake_db")
+
+    assert result.exit_code == 0
+    assert spy_get_chunk.call_count == 0
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_sync_linked_notebooks_exception(
+    cli_invoker, mock_evernote_client, fake_storage, mocker
+):
+    mock_evernote_client.fake_l_notebooks.append(Notebook(guid="nbid1", name="name1"))
+    mock_evernote_client.fake_linked_notebooks.extend(
+        [LinkedNotebook(guid=f"id{i}", shardId="s100") for i in range(5)]
+    )
+    mock_evernote_client.fake_l_usn = 123
+
+    mocker.patch(
+        "tests.conftest.FakeEvernoteNoteStore.getLinkedNotebookSyncChunk",
+        side_effect=RuntimeError("Test error"),
+    )
+
+    result = cli_invoker("sync", "--database", "fake_db")
+
+    assert result.exit_code == 1
+    assert "Test error" in result.output
+    assert all(
+        fake_storage.notebooks.get_linked_notebook_usn(f"id{i}") == 0 for i in range(5)
+    )
+
+
+def _make_synced_note(**kwargs):
+    note_fields = {
+        "guid": "id1",
+        "title": "title1",
+        "content": "body1",
+        "notebookGuid": "nbid1",
+        "active": True,
+        "contentLength": 100,
+        "contentHash": b"hash1",
+        "updateSequenceNum": 10,
+        "resources": [
+            Resource(
+                guid="rid1",
+                data=Data(body=b"res_body", bodyHash=b"rhash1", size=8),
+            )
+        ],
+    }
+    note_fields.update(kwargs)
+
+    return Note(**note_fields)
+
+
+def _make_chunk_note(note):
+    """Sync chunk returns notes without content and resource bodies"""
+
+    chunk_note = Note(**vars(note))
+    chunk_note.content = None
+    chunk_note.resources = [
+        Resource(guid=r.guid, data=Data(bodyHash=r.data.bodyHash, size=r.data.size))
+        for r in note.resources or []
+    ]
+
+    return chunk_note
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_sync_note_metadata_only_change(
+    cli_invoker, mock_evernote_client, fake_storage, mocker
+):
+    mock_evernote_client.fake_notebooks.append(Notebook(guid="nbid1", name="name1"))
+    mock_evernote_client.fake_tags = [Tag(guid="tid1", name="tag1")]
+
+    fake_storage.notes.add_note(_make_synced_note())
+
+    updated_note = _make_synced_note(
+        title="title2",
+        active=False,
+        tagGuids=["tid1"],
+        updateSequenceNum=11,
+    )
+    mock_evernote_client.fake_notes.append(_make_chunk_note(updated_note))
+
+    mock_get_note = mocker.patch(
+        "evernote_backup.evernote_client_sync.EvernoteClientSync.get_note"
+    )
+
+    result = cli_invoker("sync", "--database", "fake_db")
+
+    result_note = fake_storage.notes.get_note("id1")
+
+    assert result.exit_code == 0
+    mock_get_note.assert_not_called()
+    assert result_note.title == "title2"
+    assert result_note.active is False
+    assert result_note.tagNames == ["tag1"]
+    assert result_note.content == "body1"
+    assert result_note.resources[0].data.body == b"res_body"
+    assert fake_storage.notes.get_notes_sync_state(["id1"])["id1"].usn == 11
+    assert "Updated notes metadata: 1" in result.output
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_sync_note_same_usn_skipped(
+    cli_invoker, mock_evernote_client, fake_storage, mocker
+):
+    mock_evernote_client.fake_notebooks.append(Notebook(guid="nbid1", name="name1"))
+
+    fake_storage.notes.add_note(_make_synced_note())
+
+    mock_evernote_client.fake_notes.append(
+        _make_chunk_note(_make_synced_note(title="title2"))
+    )
+
+    mock_get_note = mocker.patch(
+        "evernote_backup.evernote_client_sync.EvernoteClientSync.get_note"
+    )
+
+    result = cli_invoker("sync", "--database", "fake_db")
+
+    assert result.exit_code == 0
+    mock_get_note.assert_not_called()
+    assert fake_storage.notes.get_note("id1").title == "title1"
+
+
+@pytest.mark.parametrize(
+    "changed_fields",
+    [
+        {"contentHash": b"hash2"},
+        {
+            "resources": [
+                Resource(
+                    guid="rid2", data=Data(body=b"res_body", bodyHash=b"rhash2", size=8)
+                )
+            ]
+        },
+    ],
+)
+@pytest.mark.usefixtures("fake_init_db")
+def test_sync_note_content_change(
+    cli_invoker, mock_evernote_client, fake_storage, changed_fields
+):
+    mock_evernote_client.fake_notebooks.append(Notebook(guid="nbid1", name="name1"))
+
+    fake_storage.notes.add_note(_make_synced_note())
+
+    updated_note = _make_synced_note(
+        content="body2", updateSequenceNum=11, **changed_fields
+    )
+    mock_evernote_client.fake_notes.append(updated_note)
+
+    result = cli_invoker("sync", "--database", "fake_db")
+
+    assert result.exit_code == 0
+    assert fake_storage.notes.get_note("id1").content == "body2"
+    assert "Updated or added notes: 1" in result.output
+
+
+@pytest.mark.parametrize("engine", ["threads", "asyncio"])
+@pytest.mark.usefixtures("fake_init_db")
+def test_sync_note_reuse_stored_resources(
+    cli_invoker, mock_evernote_client, fake_storage, engine
+):
+    mock_evernote_client.fake_notebooks.append(Notebook(guid="nbid1", name="name1"))
+
+    fake_storage.notes.add_note(_make_synced_note())
+
+    new_resource = Resource(
+        guid="rid2", data=Data(body=b"new_body", bodyHash=b"rhash2", size=8)
+    )
+
+    updated_note = _make_synced_note(
+        content="body2",
+        contentHash=b"hash2",
+        updateSequenceNum=11,
+        resources=[_make_synced_note().resources[0], new_resource],
+    )
+    mock_evernote_client.fake_notes.append(updated_note)
+
+    result = cli_invoker("sync", "--database", "fake_db", "--engine", engine)
+
+    result_note = fake_storage.notes.get_note("id1")
+
+    assert result.exit_code == 0
+    assert mock_evernote_client.fake_note_spec_calls == ["id1"]
+    assert mock_evernote_client.fake_resource_calls == ["rid2"]
+    assert result_note.content == "body2"
+    assert [r.data.body for r in result_note.resources] == [b"res_body", b"new_body"]
+    assert fake_storage.notes.get_known_resource_hashes("id1") == frozenset()
+
+
+@pytest.mark.parametrize("engine", ["threads", "asyncio"])
+@pytest.mark.usefixtures("fake_init_db")
+def test_sync_note_reuse_resources_of_other_note(
+    cli_invoker, mock_evernote_client, fake_storage, engine
+):
+    mock_evernote_client.fake_notebooks.append(Notebook(guid="nbid1", name="name1"))
+
+    stored_note = _make_synced_note()
+    stored_note.resources[0].recognition = Data(body=b"res_reco")
+    fake_storage.notes.add_note(stored_note)
+
+    new_note = _make_synced_note(
+        guid="id2",
+        resources=[
+            Resource(
+                guid="rid2", data=Data(body=b"res_body", bodyHash=b"rhash1", size=8)
+            )
+        ],
+    )
+    mock_evernote_client.fake_notes.append(new_note)
+
+    result = cli_invoker("sync", "--database", "fake_db", "--engine", engine)
+
+    result_note = fake_storage.notes.get_note("id2")
+
+    assert result.exit_code == 0
+    assert mock_evernote_client.fake_note_spec_calls == ["id2"]
+    assert mock_evernote_client.fake_resource_calls == []
+    assert result_note.resources[0].guid == "rid2"
+    assert result_note.resources[0].data.body == b"res_body"
+    assert result_note.resources[0].recognition.body == b"res_reco"
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_sync_note_reuse_stored_resources_corrupt(
+    cli_invoker, mock_evernote_client, fake_storage
+):
+    mock_evernote_client.fake_notebooks.append(Notebook(guid="nbid1", name="name1"))
+
+    fake_storage.notes.add_note(_make_synced_note())
+
+    updated_note = _make_synced_note(
+        content="body2", contentHash=b"hash2", updateSequenceNum=11
+    )
+    mock_evernote_client.fake_notes.append(updated_note)
+
+    fake_storage.notes.add_notes_for_sync([updated_note])
+
+    with fake_storage.db as con:
+        con.execute("update notes_stash set raw_note=? where guid=?", (b"123", "id1"))
+
+    result = cli_invoker("sync", "--database", "fake_db")
+
+    assert result.exit_code == 0
+    assert fake_storage.notes.get_note("id1") is None
+    assert "Failed to restore stored resources of note 'title1' [id1]" in result.output
+    assert fake_storage.notes.get_known_resource_hashes("id1") == frozenset()
+
+
+def test_note_writer_batches(fake_storage, mocker):
+    mocker.patch.object(note_synchronizer, "WRITER_BATCH_NOTES", 2)
+    add_notes_spy = mocker.spy(fake_storage.notes.__class__, "add_encoded_notes")
+
+    test_notes = [
+        Note(guid=f"id{i}", title="test", notebookGuid="nbid1", active=True)
+        for i in range(5)
+    ]
+
+    writer = note_synchronizer.NoteWriter(fake_storage)
+
+    for note in test_notes:
+        writer.submit(note)
+
+    writer.close()
+
+    written_guids = [[n.guid for n in c.args[1]] for c in add_notes_spy.call_args_list]
+
+    assert written_guids == [["id0", "id1"], ["id2", "id3"], ["id4"]]
+    assert writer.count_commits == 3
+    assert writer.max_queue_depth >= 1
+    assert [fake_storage.notes.get_note(n.guid) for n in test_notes] == test_notes
+
+
+def test_note_writer_skips_stored_resources(fake_storage, mocker):
+    test_resource = Resource(data=Data(bodyHash=b"\x01", body=b"test"))
+    test_note = Note(guid="id1", title="test", resources=[test_resource])
+
+    fake_storage.notes.add_note(
+        Note(guid="id2", title="test", resources=[test_resource])
+    )
+
+    add_notes_spy = mocker.spy(fake_storage.notes.__class__, "add_encoded_notes")
+
+    writer = note_synchronizer.NoteWriter(fake_storage)
+    writer.submit(test_note)
+    writer.close()
+
+    encoded_note = add_notes_spy.call_args.args[1][0]
+
+    assert encoded_note.resources == {b"\x01": None}
+    assert fake_storage.notes.get_note("id1") == test_note
+
+
+def _count_stored_resources(storage):
+    with storage.db as con:
+        resources_count = con.execute("select count(*) from resources").fetchone()[0]
+        links_count = con.execute("select count(*) from note_resources").fetchone()[0]
+
+    return resources_count, links_count
+
+
+def test_note_writer_resource_dropped_in_batch(fake_storage):
+    test_resource = Resource(data=Data(bodyHash=b"\x01", body=b"test"))
+
+    fake_storage.notes.add_note(
+        Note(guid="id1", title="test", resources=[test_resource])
+    )
+
+    # First note drops its only link to resource, second one reuses it
+    test_notes = [
+        Note(guid="id1", title="test", resources=[]),
+        Note(guid="id2", title="test", resources=[test_resource]),
+    ]
+
+    writer = note_synchronizer.NoteWriter(fake_storage)
+    for note in test_notes:
+        writer.submit(note)
+    writer.close()
+
+    assert writer.count_commits == 1
+    assert fake_storage.notes.get_note("id2") == test_notes[1]
+    assert _count_stored_resources(fake_storage) == (1, 1)
+
+
+def test_add_encoded_notes_resource_dropped_before_write(fake_storage):
+    test_resource = Resource(data=Data(bodyHash=b"\x01", body=b"test"))
+
+    fake_storage.notes.add_note(
+        Note(guid="id1", title="test", resources=[test_resource])
+    )
+
+    notes = fake_storage.notes
+    codec = notes.get_write_codec()
+
+    encoded_notes = [
+        note_storage.encode_note(note, codec, notes.get_stored_resource_hashes(note))
+        for note in (
+            Note(guid="id1", title="test", resources=[]),
+            Note(guid="id2", title="test", resources=[test_resource]),
+        )
+    ]
+
+    assert encoded_notes[1].resources == {b"\x01": None}
+
+    notes.add_encoded_notes(encoded_notes[:1])
+    notes.add_encoded_notes(encoded_notes[1:])
+
+    assert notes.get_note("id2").resources == [test_resource]
+    assert _count_stored_resources(fake_storage) == (1, 1)
+
+
+@pytest.mark.usefixtures("fake_init_db")
+def test_sync_chunk_atomic(cli_invoker, mock_evernote_client, fake_storage, mocker):
+    mock_evernote_client.fake_notebooks.append(Notebook(guid="nbid1", name="name1"))
+    mock_evernote_client.fake_notes.append(
+        Note(guid="id1", title="test", notebookGuid="nbid1")
+    )
+
+    mock_add_notes = mocker.patch(
+        "evernote_backup.note_storage.NoteStorage.add_notes_for_sync"
+    )
+    mock_add_notes.side_effect = RuntimeError("Test error")
+
+    result = cli_invoker("sync", "--database", "fake_db")
+
+    assert result.exit_code == 1
+    assert list(fake_storage.notebooks.iter_notebooks()) == []
+    assert fake_storage.config.get_config_value("USN") == "0"